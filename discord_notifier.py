@@ -6,16 +6,16 @@ def send_discord(webhook_url=None, content=None):
         webhook_url = os.getenv('DISCORD_WEBHOOK_URL')
         if not webhook_url:
             try:
-                import yaml
-                with open('config.yaml') as f:
-                    cfg = yaml.safe_load(f)
-                    webhook_url = cfg.get('discord_webhook_url')
-            except:
+                from src.config import get_settings
+                settings = get_settings()
+                webhook_url = settings.discord_webhook_url if settings else None
+            except Exception:
                 pass
     if not webhook_url:
         print("No Discord webhook URL configured")
         return False
-    data = {"content": content, "username": "Income Bot"}
+    from src.security import scrub
+    data = {"content": scrub(content) if content else content, "username": "Income Bot"}
     try:
         resp = requests.post(webhook_url, json=data, timeout=10)
         if resp.status_code == 204:
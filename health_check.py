@@ -2,14 +2,35 @@
 import os
 import json
 import subprocess
+import threading
+import time
 from datetime import datetime, timedelta
-import yaml
+
+# name -> {'func': callable(ctx) -> result dict, 'timeout': seconds, 'cacheable': bool}
+CHECKS = {}
+DEFAULT_TIMEOUT = 10
+CACHE_PATH = 'data/health_cache.json'
+CACHE_TTL = 300  # seconds; bounds staleness of time-dependent checks
+
+
+def register_check(name, func=None, timeout=DEFAULT_TIMEOUT, cacheable=False):
+    """Register a health check. func(ctx) returns {"name", "status", "details"}.
+
+    ctx holds 'config', 'repo_path' and 'db_path'. Cacheable checks must only
+    depend on the site repo: their results are reused while its HEAD, git
+    index and _posts directories are unchanged. Usable as a decorator.
+    """
+    def decorator(f):
+        CHECKS[name] = {'func': f, 'timeout': timeout, 'cacheable': cacheable}
+        return f
+    return decorator(func) if func else decorator
 
 def load_config(config_path='config.yaml'):
-    if os.path.exists(config_path):
-        with open(config_path) as f:
-            return yaml.safe_load(f)
-    return {}
+    from src.config import load_config as load_shared
+    try:
+        return load_shared(config_path)
+    except FileNotFoundError:
+        return {}
 
 def check_github_pages(repo_path):
     result = {"name": "GitHub Pages", "status": "UNKNOWN"}
@@ -69,11 +90,11 @@ def check_affiliate_links(repo_path):
         result["details"] = str(e)
     return result
 
-def check_recent_activity(repo_path):
+def check_recent_activity(repo_path, timeout=DEFAULT_TIMEOUT):
     result = {"name": "Recent Activity", "status": "UNKNOWN"}
     try:
         cmd = ['git', 'log', '--since="7 days ago"', '--oneline']
-        out = subprocess.check_output(cmd, cwd=repo_path, stderr=subprocess.STDOUT, text=True)
+        out = subprocess.check_output(cmd, cwd=repo_path, stderr=subprocess.STDOUT, text=True, timeout=timeout)
         lines = out.strip().split('\n')
         if lines and lines[0]:
             result["status"] = "GREEN"
@@ -86,15 +107,173 @@ def check_recent_activity(repo_path):
         result["details"] = f"Git error: {e}"
     return result
 
-def run_health_check():
-    config = load_config()
+def check_database_size(db_path, warn_mb=500):
+    result = {"name": "Database Size", "status": "GREEN"}
+    try:
+        size_mb = os.path.getsize(db_path) / (1024 * 1024)
+        result["details"] = f"{size_mb:.1f} MB"
+        if size_mb > warn_mb:
+            result["status"] = "YELLOW"
+            result["details"] += f" (over {warn_mb} MB, run: python run.py --compact)"
+    except OSError as e:
+        result["status"] = "RED"
+        result["details"] = str(e)
+    return result
+
+def check_queue_depth(db_path, warn_depth=100):
+    result = {"name": "Queue Depth", "status": "GREEN"}
+    try:
+        import sqlite3
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=2)
+        try:
+            jobs = conn.execute("SELECT COUNT(*) FROM job_queue WHERE status = 'pending'").fetchone()[0]
+            keywords = conn.execute("SELECT COUNT(*) FROM keywords WHERE status = 'pending'").fetchone()[0]
+        finally:
+            conn.close()
+        result["details"] = f"{jobs} pending jobs, {keywords} pending keywords"
+        if jobs > warn_depth:
+            result["status"] = "YELLOW"
+        elif keywords == 0:
+            result["status"] = "YELLOW"
+            result["details"] += " (keyword queue empty)"
+    except Exception as e:
+        result["status"] = "RED"
+        result["details"] = str(e)
+    return result
+
+def check_circuit_breakers(db_path):
+    """Breaker states the bot last persisted; an OPEN breaker past its recovery timeout counts as HALF_OPEN."""
+    result = {"name": "Circuit Breakers", "status": "GREEN"}
+    try:
+        import sqlite3
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=2)
+        try:
+            rows = conn.execute("SELECT name, state, last_failure_time, recovery_timeout "
+                                "FROM circuit_breaker_state").fetchall()
+        finally:
+            conn.close()
+    except Exception as e:
+        result["status"] = "RED"
+        result["details"] = str(e)
+        return result
+    if not rows:
+        result["details"] = "No breaker has tripped"
+        return result
+    states = {}
+    for name, state, last_failure, recovery in rows:
+        if state == "OPEN" and last_failure and time.time() - last_failure >= (recovery or 0):
+            state = "HALF_OPEN"
+        states[name] = state
+    result["details"] = ", ".join(f"{name}={state}" for name, state in sorted(states.items()))
+    if any(state == "OPEN" for state in states.values()):
+        result["status"] = "RED"
+    elif any(state == "HALF_OPEN" for state in states.values()):
+        result["status"] = "YELLOW"
+    return result
+
+register_check('github_pages', lambda ctx: check_github_pages(ctx['repo_path']), cacheable=True)
+register_check('affiliate_links', lambda ctx: check_affiliate_links(ctx['repo_path']), cacheable=True)
+register_check('recent_activity', lambda ctx: check_recent_activity(ctx['repo_path'], ctx['timeout']), cacheable=True)
+register_check('database_size', lambda ctx: check_database_size(ctx['db_path']))
+register_check('queue_depth', lambda ctx: check_queue_depth(ctx['db_path']))
+register_check('circuit_breakers', lambda ctx: check_circuit_breakers(ctx['db_path']))
+
+def repo_state(repo_path):
+    """(HEAD commit, git index mtime, newest _posts/** directory mtime), without spawning git.
+
+    Posts live under _posts/<category>/, so adding or removing one changes
+    its category directory's mtime, not that of _posts itself.
+    """
+    head = None
+    try:
+        git_dir = os.path.join(repo_path, '.git')
+        with open(os.path.join(git_dir, 'HEAD')) as f:
+            head = f.read().strip()
+        if head.startswith('ref: '):
+            ref = head[5:]
+            ref_path = os.path.join(git_dir, ref)
+            if os.path.exists(ref_path):
+                with open(ref_path) as f:
+                    head = f.read().strip()
+            else:
+                with open(os.path.join(git_dir, 'packed-refs')) as f:
+                    head = next((line.split()[0] for line in f if line.rstrip().endswith(' ' + ref)), head)
+    except OSError:
+        pass
+    try:
+        index_mtime = os.stat(os.path.join(repo_path, '.git', 'index')).st_mtime_ns
+    except OSError:
+        index_mtime = None
+    posts_mtime = None
+    for root, _dirs, _files in os.walk(os.path.join(repo_path, '_posts')):
+        mtime = os.stat(root).st_mtime_ns
+        posts_mtime = mtime if posts_mtime is None else max(posts_mtime, mtime)
+    return head, index_mtime, posts_mtime
+
+def _load_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(path, cache):
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+def _run_check(func, ctx, outcome):
+    try:
+        outcome['result'] = func(ctx)
+    except Exception as e:
+        outcome['error'] = e
+
+def run_health_check(config=None, checks=None, use_cache=True):
+    """Run registered checks concurrently, each bounded by its own timeout."""
+    config = config if config is not None else load_config()
+    health = config.get('health') or {}
     repo_path = config.get('repo_path', os.getcwd())
-    results = [
-        check_github_pages(repo_path),
-        check_affiliate_links(repo_path),
-        check_recent_activity(repo_path),
-    ]
-    return results
+    cache_path = health.get('cache_path', CACHE_PATH)
+    ttl = health.get('cache_ttl', CACHE_TTL)
+    names = [n for n in (checks or CHECKS) if n in CHECKS]
+    key = list(repo_state(repo_path))
+    cache = _load_cache(cache_path) if use_cache else {}
+    now = time.time()
+
+    results = {}
+    pending = {}
+    for name in names:
+        spec = CHECKS[name]
+        hit = cache.get(name)
+        if spec['cacheable'] and hit and hit['key'] == key and now - hit['time'] < ttl:
+            results[name] = hit['result']
+            continue
+        timeout = health.get('timeouts', {}).get(name, spec['timeout'])
+        ctx = {'config': config, 'repo_path': repo_path,
+               'db_path': config.get('db_path', 'data/income_bot.db'), 'timeout': timeout}
+        # Daemon threads: a hung check can neither block the probe nor process exit
+        outcome = {}
+        thread = threading.Thread(target=_run_check, args=(spec['func'], ctx, outcome), daemon=True)
+        thread.start()
+        pending[name] = (thread, outcome, time.monotonic() + timeout, timeout)
+    for name, (thread, outcome, deadline, timeout) in pending.items():
+        thread.join(max(0, deadline - time.monotonic()))
+        if thread.is_alive():
+            results[name] = {"name": name, "status": "RED", "details": f"Timed out after {timeout}s"}
+        elif 'error' in outcome:
+            results[name] = {"name": name, "status": "RED", "details": f"Check failed: {outcome['error']}"}
+        else:
+            results[name] = outcome['result']
+            if CHECKS[name]['cacheable'] and use_cache:
+                cache[name] = {'key': key, 'time': now, 'result': results[name]}
+    if use_cache and pending:
+        _save_cache(cache_path, cache)
+    return [results[name] for name in names]
 
 if __name__ == '__main__':
     results = run_health_check()
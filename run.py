@@ -8,11 +8,21 @@ Modes:
   --health       Run health check and exit
   --test         Run integration test with mock data
   --setup        First-time setup: create DB, seed keywords, etc.
+  --expand [N]   Generate long-tail keyword variants from seeds (near-duplicates suppressed)
+  --reindex      Rebuild the article manifest, sitemap, category and tag pages from _posts
+  --stats        Print per-stage latency percentiles (use --since/--until for a time range)
+  --compact      Archive and delete audit_log/job_queue rows past retention, then vacuum
+  --logs         Search the structured logs (--level, --module, --keyword, --grep, --since/--until)
+  --models       Show the model catalog, the router's current choice and per-model call stats
+  --profile      Run under cProfile and write reports/profile-<run_id>-<keyword>[-<outcome>].*
+                 (outcome is failed, skipped or duplicate when the article wasn't published)
+                 (add --profile-memory for a tracemalloc allocation report)
 """
 
 import argparse
 import sys
 import os
+import time
 from datetime import datetime
 from src.database import Database
 from src.logger import StructuredLogger
@@ -21,52 +31,82 @@ from src.circuit_breaker import CircuitBreaker
 from src.retry_handler import retry, RetryConfig
 from src.job_queue import JobQueue
 from src.cache import TTLCache
-from src.parallel import parallel_map
 from src.security import ConfigSecurity
-from scheduler import load_config, ContentGenerator, Publisher, KeywordResearcher, ProductFetcher, ImageFetcher
+from src.timing import StageTimer, stage_stats, parse_since, new_run_id
+from src.niches import load_niches, niche_config, NicheScheduler
+from src.dedup import DuplicateContentError
+from src.profile_tags import tag_run
+from scheduler import (load_config, apply_product_placeholders, ContentGenerator, Publisher, KeywordResearcher,
+                       ProductFetcher, ImageFetcher, ModelRouter, build_key_pool)
 
-def run_once(config, db, logger, metrics):
-    """Generate and publish one article."""
-    logger.info('run_once', 'Starting single article generation')
+def run_once(config, db, logger, metrics, run_id=None):
+    """Generate and publish one article. Returns the keyword processed, if any."""
+    timer = StageTimer(db, run_id=run_id)
+    logger.info('run_once', 'Starting single article generation', run_id=timer.run_id)
+    start = time.perf_counter()
     try:
-        kr = KeywordResearcher(config, db)
+        niches = load_niches(config)
+        fair = NicheScheduler(niches, db)
+        for n in niches:
+            KeywordResearcher(niche_config(config, n), db, niche=n.name)  # seeds a new niche
+        niche = fair.pick() or niches[0]
+        scoped = niche_config(config, niche)
+        kr = KeywordResearcher(scoped, db, niche=niche.name)
         pf = ProductFetcher(config)
-        cg = ContentGenerator(config)
+        # Same key pool and router as scheduler.main, so usage, model calls and the catalog are kept
+        key_pool = build_key_pool(config, db)
+        router = ModelRouter(config, db)
+        if router.catalog.stale:
+            router.refresh_catalog(key_pool.any_client())
+        cg = ContentGenerator(scoped, db, key_pool=key_pool, router=router)
         img = ImageFetcher(config)
-        pub = Publisher(config, db)
+        pub = Publisher(config, db, timer=timer)
 
-        keywords = kr.get_next_keywords(1)
+        with timer.stage('keyword_claim'):
+            keywords = kr.get_next_keywords(1)
         if not keywords:
             logger.warning('run_once', 'No pending keywords')
             print("No pending keywords to process.")
             return
 
         keyword = keywords[0]
-        logger.info('run_once', f'Processing keyword: {keyword}')
+        tag_run(keyword)
+        logger.info('run_once', f'Processing keyword: {keyword}', keyword=keyword)
         print(f"Processing: {keyword}")
 
-        products = pf.fetch_products(keyword)
+        with timer.stage('product_fetch'):
+            products = pf.fetch_products_batch(keywords).get(keyword) or []
         if not products:
-            logger.warning('run_once', f'No products for {keyword}, skipping')
-            kr.mark_keyword_failed(keyword)
+            logger.warning('run_once', f'No products for {keyword}, skipping', keyword=keyword)
+            kr.mark_failed(keyword, 'No products found')
+            tag_run(keyword, 'skipped')
             return
 
-        article_md = cg.generate_article(keyword, products)
+        with timer.stage('generate'):
+            article_md = cg.generate_article(keyword, products)
+        fair.charge(niche, cg.last_tokens_used)
         # Fetch images (parallel for each product)
         product_names = [p['name'] for p in products]
-        image_urls = parallel_map(lambda name: img.fetch_image(name), product_names, max_workers=2)
-        for p, img_url in zip(products, image_urls):
-            placeholder = f'![{p["name"]}](image_url)'
-            article_md = article_md.replace(placeholder, f'![{p["name"]}]({img_url})')
-            link_placeholder = f'[AMAZON_LINK_{p["name"].upper().replace(" ", "_")}]'
-            if p.get('url'):
-                article_md = article_md.replace(link_placeholder, p['url'])
+        with timer.stage('images'):
+            images = img.resolve_images(product_names)
+        image_files = [f for image in images for f in image['files']]
+        article_md = apply_product_placeholders(article_md, products, images)
 
         filename = keyword.lower().replace(' ', '-') + '.md'
-        commit_sha = pub.publish_article(filename, article_md, category='pet-care')
-        metrics.record_article_published(tokens_used=cg.last_tokens_used)
-        logger.info('run_once', f'Published article: {filename}', commit=commit_sha)
+        try:
+            with timer.stage('publish'):
+                commit_sha = pub.publish_article(filename, article_md, category=niche.category, extra_files=image_files)
+        except DuplicateContentError as e:
+            logger.warning('run_once', str(e), keyword=keyword, duplicate_of=e.match)
+            kr.mark_failed(keyword, str(e))
+            tag_run(keyword, 'duplicate')
+            return
+        kr.mark_completed(keyword)
+        metrics.record_article_published(tokens_used=cg.last_tokens_used, niche=niche.name, model=cg.last_model)
+        logger.info('run_once', f'Published article: {filename}', keyword=keyword, commit=commit_sha,
+                    tokens=cg.last_tokens_used, tokens_cached=cg.last_cached_tokens)
         print(f"[OK] Published: {filename}")
+        return keyword
     except Exception as e:
         import traceback
         logger.error('run_once', 'Failed', exception=traceback.format_exc())
@@ -74,11 +114,21 @@ def run_once(config, db, logger, metrics):
         print(f"[ERROR] Error: {e}")
         print(traceback.format_exc())
         raise
+    finally:
+        timer.record('total', time.perf_counter() - start)
+        try:
+            timer.flush()
+        except Exception:
+            pass  # timing must never fail a run
+        try:
+            metrics.write_dashboard_snapshot(config.get('dashboard_snapshot', 'dashboard_data.json'))
+        except Exception:
+            pass
 
 def run_health_check(config, db, logger):
     """Run health checks and output status."""
     from health_check import run_health_check as hc
-    results = hc()
+    results = hc(config)
     print("\n=== HEALTH CHECK ===")
     for r in results:
         symbol = "[OK]" if r['status'] == 'GREEN' else "[WARN]" if r['status'] == 'YELLOW' else "[ERROR]"
@@ -107,14 +157,122 @@ def run_test(config, db, logger):
 def setup_database(config, db, logger):
     """First-time setup: create tables, seed initial keywords."""
     logger.info('setup', 'Initializing database and seeding keywords')
-    seed_keywords = config.get('niche', {}).get('seed_keywords', [])
     count = 0
-    for kw in seed_keywords:
-        db.add_keyword(kw)
-        count += 1
+    for niche in load_niches(config):
+        for kw in niche.seed_keywords:
+            db.add_keyword(kw, niche.name)
+            count += 1
     logger.info('setup', f'Seeded {count} keywords')
     print(f"[OK] Database initialized with {count} seed keywords")
 
+def expand_keywords(config, db, logger, limit=None):
+    """Queue long-tail variants of the seed keywords of every niche."""
+    accepted = []
+    for niche in load_niches(config):
+        kr = KeywordResearcher(niche_config(config, niche), db, niche=niche.name)
+        accepted += kr.expand_keywords(limit=limit)
+    logger.info('expand', f'Queued {len(accepted)} expanded keywords')
+    print(f"[OK] Queued {len(accepted)} new keywords")
+    for kw in accepted[:10]:
+        print(f"  - {kw}")
+    if len(accepted) > 10:
+        print(f"  ... and {len(accepted) - 10} more")
+    return accepted
+
+def reindex_site(config, db, logger):
+    """Full rebuild of the article manifest and listing pages (normally maintained by Publisher)."""
+    from src.site_index import SiteIndex
+    from src.related import RelatedIndex
+    written = SiteIndex(config, db).rebuild()
+    related = RelatedIndex(config, db).sync()
+    logger.info('reindex', f'Site index rebuilt, {len(written)} pages written', related_indexed=related)
+    print(f"[OK] Site index rebuilt ({len(written)} pages written, {related} posts added to related index)")
+    return written
+
+def report_duplicates(config, db, logger):
+    """Index _posts/** and print clusters of near-duplicate posts."""
+    from src.dedup import DuplicateIndex
+    index = DuplicateIndex(config, db)
+    changed = index.sync()
+    clusters = index.clusters()
+    logger.info('duplicates', f'{len(clusters)} near-duplicate clusters', reindexed=changed,
+                posts=sum(len(c) for c in clusters))
+    print(f"[OK] Fingerprint index synced ({changed} posts reindexed)")
+    if not clusters:
+        print("No near-duplicate posts.")
+    for i, cluster in enumerate(clusters, 1):
+        print(f"\nCluster {i} ({len(cluster)} posts):")
+        for post in cluster:
+            print(f"  - {post['path']}")
+    return clusters
+
+def print_stats(db, since=None, until=None):
+    """Print per-stage latency percentiles recorded by StageTimer."""
+    stats = stage_stats(db, parse_since(since), parse_since(until))
+    if not stats:
+        print("No timing samples recorded for this range.")
+        return stats
+    print(f"\n=== STAGE TIMINGS ({stats[0]['runs']} runs) ===")
+    print(f"{'stage':<16}{'count':>7}{'p50 ms':>11}{'p90 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'max ms':>11}")
+    for s in stats:
+        print(f"{s['stage']:<16}{s['count']:>7}{s['p50']:>11.1f}{s['p90']:>11.1f}"
+              f"{s['p95']:>11.1f}{s['p99']:>11.1f}{s['max']:>11.1f}")
+    return stats
+
+def compact_database(config, db, logger):
+    """Apply retention policies now, regardless of the automatic interval."""
+    from src.retention import Compactor
+    compactor = Compactor(config, db)
+    archived = compactor.compact()
+    logger.info('retention', 'Compaction finished', archived=archived)
+    for table, count in archived.items():
+        print(f"[OK] {table}: {count} rows archived to {compactor.archive_dir}")
+    return archived
+
+def search_logs(config, logger, since=None, until=None, level=None, module=None, keyword=None,
+                text=None, limit=50):
+    """Query logs/*.jsonl through the incrementally updated sidecar index."""
+    from src.log_index import LogIndex
+    logger.flush()
+    index = LogIndex(logger.log_dir, (config.get('logging') or {}).get('index_path'))
+    try:
+        index.refresh()
+        rows = index.query(parse_since(since), parse_since(until), level, module, keyword, text, limit)
+    finally:
+        index.close()
+    if not rows:
+        print("No matching log entries.")
+        return rows
+    for r in reversed(rows):
+        line = f"{r['ts'][:19]} {r['level']:<8} {r['module'] or '-':<14} {r['message'] or ''}"
+        if r['extra']:
+            line += f"  {r['extra']}"
+        print(line)
+    return rows
+
+def show_models(config, db, since=None):
+    """Print the cached model catalog, the current routing decision and per-model stats."""
+    from src.model_router import ModelRouter, model_call_stats
+    router = ModelRouter(config, db)
+    offered = router.catalog.models
+    if offered is None:
+        print("Model catalog not fetched yet (refreshed by scheduler.py or list_models.py)")
+    else:
+        print(f"Catalog: {len(offered)} models, fetched {router.catalog.fetched_at[:19]}")
+    print("\n=== CONFIGURED MODELS ===")
+    for m in router.models:
+        available = '' if offered is None or m['name'] in offered else '  (not in catalog)'
+        print(f"  tier {m['tier']}: {m['name']}{available}")
+    model, reason = router.choose()
+    print(f"\nNext request -> {model} ({reason})")
+    stats = model_call_stats(db, parse_since(since))
+    if stats:
+        print(f"\n{'model':<28}{'calls':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'tokens':>10}")
+        for s in stats:
+            print(f"{s['model']:<28}{s['calls']:>7}{s['error_rate']:>8.0%}{s['p50_ms']:>10.0f}"
+                  f"{s['p95_ms']:>10.0f}{s['tokens']:>10}")
+    return stats
+
 def main():
     parser = argparse.ArgumentParser(description='Income Bot Automation')
     parser.add_argument('--once', action='store_true', default=True, help='Generate one article (default)')
@@ -122,6 +280,23 @@ def main():
     parser.add_argument('--health', action='store_true', help='Run health check')
     parser.add_argument('--test', action='store_true', help='Run integration test')
     parser.add_argument('--setup', action='store_true', help='First-time setup')
+    parser.add_argument('--expand', nargs='?', type=int, const=0, default=None, metavar='N',
+                        help='Expand seed keywords into long-tail variants (optionally cap at N)')
+    parser.add_argument('--reindex', action='store_true', help='Rebuild sitemap, category and tag pages from _posts')
+    parser.add_argument('--duplicates', action='store_true', help='Report clusters of near-duplicate posts in _posts')
+    parser.add_argument('--stats', action='store_true', help='Show per-stage timing percentiles')
+    parser.add_argument('--compact', action='store_true', help='Archive and delete rows past retention, then vacuum')
+    parser.add_argument('--logs', action='store_true', help='Search structured logs (newest matches last)')
+    parser.add_argument('--models', action='store_true', help='Show model catalog, routing choice and per-model stats')
+    parser.add_argument('--level', help='With --logs, minimum level (info, warning, error, critical)')
+    parser.add_argument('--module', help='With --logs, only entries from this module')
+    parser.add_argument('--keyword', help='With --logs, only entries tagged with this keyword')
+    parser.add_argument('--grep', metavar='TEXT', help='With --logs, full-text search in messages and fields')
+    parser.add_argument('--limit', type=int, default=50, help='With --logs, maximum entries shown (default 50)')
+    parser.add_argument('--since', default='7d', help='Start of --stats/--logs/--models range: 24h, 7d, or ISO date (default 7d)')
+    parser.add_argument('--until', default=None, help='End of --stats/--logs range (default now)')
+    parser.add_argument('--profile', action='store_true', help='Profile the run with cProfile (reports/ directory)')
+    parser.add_argument('--profile-memory', action='store_true', help='With --profile, also trace allocations')
     args = parser.parse_args()
 
     # Load config
@@ -140,6 +315,21 @@ def main():
     try:
         if args.setup:
             setup_database(config, db, logger)
+        elif args.expand is not None:
+            expand_keywords(config, db, logger, limit=args.expand or None)
+        elif args.stats:
+            print_stats(db, args.since, args.until)
+        elif args.compact:
+            compact_database(config, db, logger)
+        elif args.logs:
+            search_logs(config, logger, args.since, args.until, args.level, args.module, args.keyword,
+                        args.grep, args.limit)
+        elif args.models:
+            show_models(config, db, args.since)
+        elif args.reindex:
+            reindex_site(config, db, logger)
+        elif args.duplicates:
+            report_duplicates(config, db, logger)
         elif args.health:
             run_health_check(config, db, logger)
         elif args.test:
@@ -147,7 +337,13 @@ def main():
             sys.exit(0 if success else 1)
         else:
             # Default: run once
-            run_once(config, db, logger, metrics)
+            run_id = new_run_id()
+            if args.profile:
+                from src.profiler import profile_call
+                profile_call(lambda: run_once(config, db, logger, metrics, run_id=run_id),
+                             run_id, memory=args.profile_memory)
+            else:
+                run_once(config, db, logger, metrics, run_id=run_id)
     except KeyboardInterrupt:
         logger.warning('main', 'Interrupted by user')
         print("\n[STOP] Stopped")
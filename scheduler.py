@@ -1,26 +1,31 @@
 #!/usr/bin/env python3
 import os
 import sys
-import yaml
+from collections import Counter
 from datetime import datetime
+from src import config as config_service
 from src.database import Database
 from src.keyword_researcher import KeywordResearcher
 from src.product_fetcher import ProductFetcher
-from src.content_generator import ContentGenerator
+from src.content_generator import ContentGenerator, build_key_pool
+from src.model_router import ModelRouter
 from src.image_fetcher import ImageFetcher
 from src.publisher import Publisher
 from src.utils import slugify
 from src.logger import StructuredLogger
 from src.metrics import MetricsCollector
 from src.cache import TTLCache
-from src.parallel import parallel_map
-from src.obsidian_logger import log_to_obsidian
+from src.obsidian_logger import get_journal
+from src.timing import StageTimer
+from src.retention import maybe_compact
+from src.niches import load_niches, niche_config, NicheScheduler
+from src.dedup import DuplicateContentError
+from src.profile_tags import tag_run
+from src.concurrency import limiter_stats
 
 def load_config(config_path='config.yaml'):
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(f"Config file {config_path} not found")
-    with open(config_path) as f:
-        return yaml.safe_load(f)
+    """Shared, validated config snapshot; re-parsed only when the file changes."""
+    return config_service.load_config(config_path)
 
 def _validate_article(content, filename, logger):
     """Check article meets quality standards before publishing."""
@@ -37,11 +42,21 @@ def _validate_article(content, filename, logger):
     else:
         logger.info('validation', 'Article validated', filename=filename)
 
+def apply_product_placeholders(article_md, products, images):
+    """Substitute image and affiliate-link placeholders for each product."""
+    for p, image in zip(products, images):
+        placeholder = f'![{p["name"]}](image_url)'
+        article_md = article_md.replace(placeholder, image['markup'])
+        link_placeholder = f'[AMAZON_LINK_{p["name"].upper().replace(" ", "_")}]'
+        if p.get('url'):
+            article_md = article_md.replace(link_placeholder, p['url'])
+    return article_md
+
 def _log_to_obsidian(config, entry):
     try:
         vault_path = config.get('obsidian_vault_path') or os.getenv('OBSIDIAN_VAULT_PATH')
         if vault_path:
-            log_to_obsidian(vault_path=vault_path, entry=entry, category='IncomeBot')
+            get_journal(vault_path, 'IncomeBot', config.get('obsidian')).write(entry)
     except Exception:
         pass
 
@@ -57,83 +72,160 @@ def _write_daily_report(metrics):
         f.write(f"- Articles today: {data['totals']['articles_published']}\n")
         f.write(f"- API calls: {data['totals']['api_calls']}\n")
         f.write(f"- Tokens used: {data['totals']['tokens_used']}\n")
+        f.write(f"- Prompt tokens served from context cache: {data['totals']['tokens_cached']}\n")
         f.write(f"- Errors: {data['totals']['errors']}\n")
 
-def main():
+def _process_keyword(niche, keyword, products, kr, cg, img, pub, config, logger, metrics, timer):
+    """Run one claimed keyword of `niche` through the pipeline. Returns the keyword if it was published."""
+    logger.info('scheduler', f'Processing keyword: {keyword}', keyword=keyword, niche=niche.name)
+    print(f"Processing: {keyword} [{niche.name}]")
+    tag_run(keyword)
+
+    if not products:
+        logger.warning('scheduler', f'No products found for {keyword}', keyword=keyword)
+        kr.mark_failed(keyword, 'No products found')
+        tag_run(keyword, 'skipped')
+        return None
+
+    try:
+        with timer.stage('generate'):
+            article_md = cg.generate_article(keyword, products)
+    except Exception as e:
+        logger.error('scheduler', 'Content generation failed', keyword=keyword, error=str(e))
+        kr.mark_failed(keyword, str(e))
+        tag_run(keyword, 'failed')
+        return None
+
+    product_names = [p['name'] for p in products]
+    with timer.stage('images'):
+        images = img.resolve_images(product_names)
+    image_files = [f for image in images for f in image['files']]
+    article_md = apply_product_placeholders(article_md, products, images)
+
+    filename = slugify(keyword) + '.md'
+    with timer.stage('validate'):
+        _validate_article(article_md, filename, logger)
+
+    try:
+        with timer.stage('publish'):
+            commit_sha = pub.publish_article(filename, article_md, category=niche.category, extra_files=image_files)
+    except DuplicateContentError as e:
+        logger.warning('scheduler', str(e), keyword=keyword, duplicate_of=e.match)
+        kr.mark_failed(keyword, str(e))
+        tag_run(keyword, 'duplicate')
+        return None
+    except Exception as e:
+        logger.error('scheduler', 'Publish failed', keyword=keyword, error=str(e))
+        kr.mark_failed(keyword, str(e))
+        tag_run(keyword, 'failed')
+        return None
+
+    kr.mark_completed(keyword)
+    tag_run(keyword, 'published')
+    metrics.record_article_published(tokens_used=cg.last_tokens_used, niche=niche.name, model=cg.last_model)
+    logger.info('scheduler', 'Run completed successfully', keyword=keyword, niche=niche.name,
+                commit=commit_sha, tokens=cg.last_tokens_used, tokens_cached=cg.last_cached_tokens)
+    print(f"✅ Completed: {filename}")
+    _log_to_obsidian(config, f"Published {filename} for keyword '{keyword}'\nCommit: {commit_sha}")
+    return keyword
+
+def main(run_id=None, count=1):
+    """Process up to `count` keywords, sharing them across niches by weight.
+
+    Returns the last keyword published, or None if nothing was published.
+    """
     start_time = datetime.now()
     config = load_config()
     db = Database()
     logger = StructuredLogger(config, db)
     metrics = MetricsCollector(db)
     cache = TTLCache(ttl_seconds=86400)
+    timer = StageTimer(db, run_id=run_id)
+    keyword = None
+    usage = {'tokens_used': 0, 'tokens_cached': 0}
 
-    logger.info('scheduler', 'Starting Income Bot run')
+    logger.info('scheduler', 'Starting Income Bot run', run_id=timer.run_id)
 
     try:
-        kr = KeywordResearcher(config, db)
         pf = ProductFetcher(config, cache)
-        cg = ContentGenerator(config, db)
         img = ImageFetcher(config)
-        pub = Publisher(config, db)
-
-        keywords = kr.get_next_keywords(1)
-        if not keywords:
+        pub = Publisher(config, db, timer=timer)
+        niches = load_niches(config)
+        fair = NicheScheduler(niches, db)
+        key_pool = build_key_pool(config, db)
+        router = ModelRouter(config, db)
+        if router.catalog.stale:
+            router.refresh_catalog(key_pool.any_client())
+        # Per-niche components share the fetchers, publisher, key pool and database above
+        researchers = {n.name: KeywordResearcher(niche_config(config, n), db, niche=n.name) for n in niches}
+        generators = {}
+
+        # Claim the whole batch up front so its products come from one provider lookup
+        with timer.stage('keyword_claim'):
+            plan = fair.plan(count)
+            wanted = Counter(n.name for n in plan)
+            claimed = {name: researchers[name].get_next_keywords(k) for name, k in wanted.items()}
+            batch = [(n, claimed[n.name].pop(0)) for n in plan if claimed[n.name]]
+        if not batch:
             logger.warning('scheduler', 'No pending keywords available')
             print("No pending keywords to process.")
-            return
-
-        keyword = keywords[0]
-        logger.info('scheduler', f'Processing keyword: {keyword}')
-        print(f"Processing: {keyword}")
-
-        products = pf.fetch_products(keyword)
-        if not products:
-            logger.warning('scheduler', f'No products found for {keyword}')
-            kr.mark_failed('No products found')
-            return
-
-        try:
-            article_md = cg.generate_article(keyword, products)
-        except Exception as e:
-            logger.error('scheduler', 'Content generation failed', keyword=keyword, error=str(e))
-            kr.mark_failed(str(e))
-            return
-
-        product_names = [p['name'] for p in products]
-        image_urls = parallel_map(lambda name: img.fetch_image(name), product_names, max_workers=2)
-        for p, img_url in zip(products, image_urls):
-            placeholder = f'![{p["name"]}](image_url)'
-            article_md = article_md.replace(placeholder, f'![{p["name"]}]({img_url})')
-            link_placeholder = f'[AMAZON_LINK_{p["name"].upper().replace(" ", "_")}]'
-            if p.get('url'):
-                article_md = article_md.replace(link_placeholder, p['url'])
-
-        filename = slugify(keyword) + '.md'
-        _validate_article(article_md, filename, logger)
-
-        try:
-            commit_sha = pub.publish_article(filename, article_md, category=config['niche']['name'].lower().replace(' ', '-'))
-        except Exception as e:
-            logger.error('scheduler', 'Publish failed', keyword=keyword, error=str(e))
-            kr.mark_failed(str(e))
-            return
-
-        kr.mark_completed(keyword)
-        metrics.record_article_published(tokens_used=cg.last_tokens_used)
-        logger.info('scheduler', 'Run completed successfully', keyword=keyword, commit=commit_sha, tokens=cg.last_tokens_used)
-        print(f"✅ Completed: {filename}")
-        _log_to_obsidian(config, f"Published {filename} for keyword '{keyword}'\nCommit: {commit_sha}")
+        with timer.stage('product_fetch'):
+            products = pf.fetch_products_batch([kw for _n, kw in batch]) if batch else {}
+
+        for niche, kw in batch:
+            if niche.name not in generators:
+                generators[niche.name] = ContentGenerator(niche_config(config, niche), db, key_pool=key_pool,
+                                                          router=router)
+            cg = generators[niche.name]
+            cg.last_tokens_used = 0
+            cg.last_cached_tokens = 0
+            done = _process_keyword(niche, kw, products.get(kw) or [], researchers[niche.name], cg, img, pub,
+                                    config, logger, metrics, timer)
+            fair.charge(niche, cg.last_tokens_used)
+            usage['tokens_used'] += cg.last_tokens_used
+            usage['tokens_cached'] += cg.last_cached_tokens
+            keyword = done or keyword
 
     except Exception as e:
         logger.critical('scheduler', 'Unhandled exception in main loop', exception=str(e))
         print(f"❌ Critical error: {e}")
         raise
     finally:
-        db.close()
         elapsed = (datetime.now() - start_time).total_seconds()
-        logger.info('scheduler', f'Run finished in {elapsed:.2f}s')
+        timer.record('total', elapsed)
+        logger.info('scheduler', f'Run finished in {elapsed:.2f}s', run_id=timer.run_id, stages=timer.summary(),
+                    concurrency={name: {k: v for k, v in s.items() if k != 'decisions'}
+                                 for name, s in limiter_stats().items()}, **usage)
+        try:
+            timer.flush()
+        except Exception:
+            pass  # timing must never fail a run
+        try:
+            _write_daily_report(metrics)
+            metrics.write_dashboard_snapshot(config.get('dashboard_snapshot', 'dashboard_data.json'))
+        except Exception:
+            pass
+        try:
+            archived = maybe_compact(config, db)
+            if archived:
+                logger.info('retention', 'Compaction finished', archived=archived)
+        except Exception as e:
+            logger.warning('retention', 'Compaction failed', error=str(e))
+        db.close()
 
-    _write_daily_report(metrics)
+    return keyword
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description='Income Bot scheduler run')
+    parser.add_argument('--count', type=int, default=1, help='Keywords to process in this run, shared across niches by weight')
+    parser.add_argument('--profile', action='store_true', help='Profile the run with cProfile (reports/ directory)')
+    parser.add_argument('--profile-memory', action='store_true', help='With --profile, also trace allocations')
+    args = parser.parse_args()
+    if args.profile:
+        from src.profiler import profile_call
+        from src.timing import new_run_id
+        run_id = new_run_id()
+        profile_call(lambda: main(run_id=run_id, count=args.count), run_id, memory=args.profile_memory)
+    else:
+        main(count=args.count)
\ No newline at end of file
@@ -33,6 +33,10 @@ class CircuitBreaker:
             self._on_failure()
             raise e
 
+    def allows_request(self) -> bool:
+        """False while OPEN and still inside the recovery timeout."""
+        return self.state != CircuitState.OPEN or self._should_attempt_reset()
+
     def _should_attempt_reset(self) -> bool:
         if self.last_failure_time is None:
             return False
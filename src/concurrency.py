@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from .key_pool import classify_error
+
+# name -> (initial, min, max) concurrency
+DEFAULT_LIMITS = {
+    'gemini': (2, 1, 8),
+    'images': (4, 1, 16),
+    'products': (2, 1, 8),
+}
+_TIMEOUT_MARKERS = ('timed out', 'timeout', 'deadline exceeded', 'deadline_exceeded')
+
+
+def classify_outcome(error: Exception) -> str:
+    """'throttled', 'timeout' or 'error' for an exception raised by an upstream call."""
+    text = str(error)
+    if classify_error(error) == 'quota' or '429' in text or 'Too Many Requests' in text:
+        return 'throttled'
+    if isinstance(error, TimeoutError) or any(m in text.lower() for m in _TIMEOUT_MARKERS) \
+            or type(error).__name__.endswith('Timeout'):
+        return 'timeout'
+    return 'error'
+
+
+class AdaptiveLimiter:
+    """AIMD limit on concurrent calls to one upstream service.
+
+    While every slot is in use, the limit grows by one for every `limit`
+    calls that succeed at normal latency (about one step per round of
+    requests) up to max_limit. It is
+    multiplied by `backoff` after a 429, a timeout, or a call slower than
+    latency_tolerance times the baseline latency (an EWMA of unthrottled
+    calls of the same kind, e.g. outline vs. full article), never going
+    below min_limit. Only calls started after the last decrease can move the
+    limit again, so a burst of failures from one round backs off once and
+    its stragglers don't undo the back-off.
+    Other errors leave the limit unchanged.
+    """
+    def __init__(self, name: str, initial: int = 2, min_limit: int = 1, max_limit: int = 8,
+                 backoff: float = 0.5, latency_tolerance: float = 2.0, smoothing: float = 0.2):
+        self.name = name
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(max(int(initial), self.min_limit), self.max_limit))
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.baselines: Dict[str, float] = {}  # call kind -> seconds
+        self.inflight = 0
+        self.counts = {'ok': 0, 'throttled': 0, 'timeout': 0, 'slow': 0, 'error': 0, 'increases': 0, 'decreases': 0}
+        self.decisions = deque(maxlen=50)
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    def acquire(self) -> float:
+        """Wait for a free slot. Returns the call's start time for release()."""
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight += 1
+            return time.monotonic()
+
+    def release(self, started: float, outcome: str = 'ok', kind: str = 'default'):
+        """Free the slot and adjust the limit from the call's outcome and latency."""
+        latency = time.monotonic() - started
+        with self._cond:
+            saturated = self.inflight >= int(self.limit)
+            self.inflight -= 1
+            baseline = self.baselines.get(kind)
+            if outcome == 'ok' and baseline and latency > baseline * self.latency_tolerance:
+                outcome = 'slow'
+            self.counts[outcome] += 1
+            if outcome in ('throttled', 'timeout', 'slow'):
+                if started >= self._last_decrease:
+                    self._decrease(outcome, latency, baseline)
+            elif outcome == 'ok':
+                self.baselines[kind] = latency if baseline is None else baseline + self.smoothing * (latency - baseline)
+                if saturated and self.limit < self.max_limit and started >= self._last_decrease:
+                    before = int(self.limit)
+                    self.limit = min(self.max_limit, self.limit + 1 / int(self.limit))
+                    if int(self.limit) > before:
+                        self.counts['increases'] += 1
+                        self._decide('increase', f'latency {latency * 1000:.0f}ms stable')
+            self._cond.notify_all()
+
+    def _decrease(self, reason: str, latency: float, baseline: Optional[float]):
+        self.limit = max(float(self.min_limit), float(int(self.limit * self.backoff)))
+        self._last_decrease = time.monotonic()
+        self.counts['decreases'] += 1
+        detail = f'latency {latency * 1000:.0f}ms vs baseline {baseline * 1000:.0f}ms' if reason == 'slow' else reason
+        self._decide('decrease', detail)
+
+    def _decide(self, action: str, reason: str):
+        self.decisions.append({'time': datetime.now().isoformat(timespec='seconds'), 'action': action,
+                               'limit': int(self.limit), 'reason': reason})
+
+    def call(self, func: Callable, *args, kind: str = 'default', **kwargs) -> Any:
+        """Run func within the limit, classifying any exception before re-raising it."""
+        started = self.acquire()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.release(started, classify_outcome(e), kind)
+            raise
+        self.release(started, 'ok', kind)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'limit': int(self.limit),
+                'min': self.min_limit,
+                'max': self.max_limit,
+                'inflight': self.inflight,
+                'baseline_ms': {k: round(v * 1000, 1) for k, v in sorted(self.baselines.items())},
+                **self.counts,
+                'decisions': list(self.decisions)[-10:],
+            }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str, config: Dict[str, Any] = None) -> AdaptiveLimiter:
+    """Per-process limiter for one upstream, built from concurrency.<name> on first use.
+
+    Every caller of the same upstream shares it, so the limit reflects all
+    traffic the process sends there.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            settings = (config or {}).get('concurrency') or {}
+            opts = settings.get(name) or {}
+            initial, low, high = DEFAULT_LIMITS.get(name, (2, 1, 8))
+            if name == 'images':  # images.max_workers predates the limiter
+                high = ((config or {}).get('images') or {}).get('max_workers', high)
+            limiter = _limiters[name] = AdaptiveLimiter(
+                name, opts.get('initial', initial), opts.get('min', low), opts.get('max', high),
+                float(settings.get('backoff', 0.5)), float(settings.get('latency_tolerance', 2.0)))
+        return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of every limiter created in this process."""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.snapshot() for name, limiter in sorted(limiters.items())}
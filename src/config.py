@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import yaml
+from .utils import slugify
+
+# Top-level keys with a known type; anything else passes through unchecked.
+SCHEMA = {
+    'gemini_api_key': str,
+    'gemini_backup_api_key': str,
+    'gemini_api_keys': list,
+    'gemini_base_url': str,
+    'gemini_stream': bool,
+    'repo_path': str,
+    'site': dict,
+    'niche': dict,
+    'niches': list,
+    'amazon_tracking_id': str,
+    'product_provider': dict,
+    'discord_webhook_url': str,
+    'images': dict,
+    'dedup': dict,
+    'related': dict,
+    'concurrency': dict,
+    'models': dict,
+    'generation': dict,
+    'logging': dict,
+    'retention': dict,
+    'health': dict,
+    'dashboard_snapshot': str,
+    'obsidian_vault_path': str,
+    'obsidian': dict,
+    'free_tier_limits': dict,
+    'encrypt_config': bool,
+    'fernet_key': str,
+}
+
+
+class ConfigError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Typed view of the settings shared across modules."""
+    gemini_api_key: Optional[str]
+    gemini_base_url: Optional[str]
+    gemini_stream: bool
+    repo_path: Optional[str]
+    niche_name: Optional[str]
+    seed_keywords: List[str]
+    amazon_tracking_id: Optional[str]
+    discord_webhook_url: Optional[str]
+    obsidian_vault_path: Optional[str]
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> 'Settings':
+        niche = config.get('niche') or (config.get('niches') or [{}])[0]
+        return cls(
+            gemini_api_key=config.get('gemini_api_key') or os.getenv('GEMINI_API_KEY'),
+            gemini_base_url=config.get('gemini_base_url') or os.getenv('GEMINI_BASE_URL'),
+            gemini_stream=bool(config.get('gemini_stream', False)),
+            repo_path=config.get('repo_path'),
+            niche_name=niche.get('name'),
+            seed_keywords=list(niche.get('seed_keywords') or []),
+            amazon_tracking_id=config.get('amazon_tracking_id'),
+            discord_webhook_url=config.get('discord_webhook_url') or os.getenv('DISCORD_WEBHOOK_URL'),
+            obsidian_vault_path=config.get('obsidian_vault_path') or os.getenv('OBSIDIAN_VAULT_PATH'),
+        )
+
+
+def validate(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Type-check known keys. Raises ConfigError listing every problem."""
+    if not isinstance(config, dict):
+        raise ConfigError("config.yaml must contain a mapping")
+    problems = []
+    for key, expected in SCHEMA.items():
+        value = config.get(key)
+        if value is not None and not isinstance(value, expected):
+            problems.append(f"{key}: expected {expected.__name__}, got {type(value).__name__}")
+    seeds = (config.get('niche') or {}).get('seed_keywords') if isinstance(config.get('niche'), dict) else None
+    if seeds is not None and not isinstance(seeds, list):
+        problems.append("niche.seed_keywords: expected a list")
+    names, categories = set(), set()
+    niches = config.get('niches') if isinstance(config.get('niches'), list) else []
+    for i, block in enumerate(niches):
+        if not isinstance(block, dict) or not block.get('name'):
+            problems.append(f"niches[{i}]: expected a mapping with a name")
+            continue
+        if block['name'] in names:
+            problems.append(f"niches[{i}]: duplicate name {block['name']!r}")
+        names.add(block['name'])
+        # Post keys and _posts/<category>/ directories are per category
+        category = block.get('category') or slugify(block['name'])
+        if category in categories:
+            problems.append(f"niches[{i}]: duplicate category {category!r}")
+        categories.add(category)
+        weight = block.get('weight', 1)
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+            problems.append(f"niches[{i}].weight: expected a positive number")
+        if block.get('seed_keywords') is not None and not isinstance(block['seed_keywords'], list):
+            problems.append(f"niches[{i}].seed_keywords: expected a list")
+    if problems:
+        raise ConfigError("Invalid config: " + "; ".join(problems))
+    return config
+
+
+def parse(text: str) -> Dict[str, Any]:
+    """Parse YAML and, with encrypt_config: true, merge in the decrypted `encrypted` blob.
+
+    The blob is ConfigSecurity.encrypt_config() output; the key comes from
+    FERNET_KEY or fernet_key.
+    """
+    config = yaml.safe_load(text) or {}
+    if isinstance(config, dict) and config.get('encrypt_config') and config.get('encrypted'):
+        from .security import ConfigSecurity
+        key = os.getenv('FERNET_KEY') or config.get('fernet_key')
+        if not key:
+            raise ConfigError("encrypt_config is set but no FERNET_KEY or fernet_key was provided")
+        secrets = ConfigSecurity.decrypt_config(str(config.pop('encrypted')).encode(), key)
+        config.update(secrets or {})
+    return validate(config)
+
+
+class ConfigService:
+    """Parses, decrypts and validates config.yaml once per change.
+
+    get() returns the current snapshot; every check_interval seconds it
+    stats the file and, if the mtime or size changed, builds a new snapshot
+    and swaps it in with one reference assignment. A file that fails to
+    parse or validate is reported and the previous snapshot stays live.
+    Snapshots are shared between callers and must be treated as read-only.
+    """
+    def __init__(self, path: str = 'config.yaml', check_interval: float = 2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self.last_error: Optional[Exception] = None
+        self._lock = threading.Lock()
+        self._config: Optional[Dict[str, Any]] = None
+        self._settings: Optional[Settings] = None
+        self._stamp = None
+        self._checked = 0.0
+
+    def get(self) -> Dict[str, Any]:
+        if self._config is None or time.monotonic() - self._checked >= self.check_interval:
+            self._maybe_reload()
+        return self._config
+
+    @property
+    def settings(self) -> Settings:
+        self.get()
+        return self._settings
+
+    def _maybe_reload(self):
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                if self._config is None:
+                    raise FileNotFoundError(f"Config file {self.path} not found")
+                return
+            stamp = (st.st_mtime_ns, st.st_size)
+            if stamp == self._stamp:
+                return
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    config = parse(f.read())
+            except Exception as e:
+                self.last_error = e
+                if self._config is None:
+                    raise
+                print(f"[WARN] Keeping previous config; reload of {self.path} failed: {e}")
+                self._stamp = stamp  # don't retry until the file changes again
+                return
+            settings = Settings.from_dict(config)
+            from .security import install_scrubber
+            install_scrubber(config)
+            self._config, self._settings, self._stamp = config, settings, stamp
+            self.version += 1
+            self.last_error = None
+
+
+_services: Dict[str, ConfigService] = {}
+_services_lock = threading.Lock()
+
+
+def get_config_service(path: str = 'config.yaml') -> ConfigService:
+    key = os.path.abspath(path)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = _services[key] = ConfigService(path)
+        return service
+
+
+def load_config(path: str = 'config.yaml') -> Dict[str, Any]:
+    """Current config snapshot for `path` (parsed at most once per file change)."""
+    return get_config_service(path).get()
+
+
+def get_settings(path: str = 'config.yaml') -> Optional[Settings]:
+    """Typed settings, or None when the config file doesn't exist."""
+    try:
+        return get_config_service(path).settings
+    except FileNotFoundError:
+        return None
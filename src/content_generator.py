@@ -1,71 +1,155 @@
 import os
+import time
 from datetime import datetime
 import google.genai as genai
 import yaml
 from .retry_handler import retry, RetryConfig
-from .circuit_breaker import CircuitBreaker
 from .database import get_or_create_keyword
+from .concurrency import AdaptiveLimiter, get_limiter
+from .key_pool import KeyPool
+from .model_router import ModelRouter
+from .prompts import ContextCache, PromptSet
+from .section_generator import SectionGenerator
+
+def gemini_client_factory(config):
+    """Callable building a genai.Client for one API key."""
+    # gemini_base_url points the SDK at a compatible endpoint (e.g. tests/gemini_stub_server.py)
+    base_url = config.get('gemini_base_url') or os.getenv('GEMINI_BASE_URL')
+    if base_url:
+        return lambda api_key: genai.Client(api_key=api_key, http_options={'base_url': base_url})
+    return lambda api_key: genai.Client(api_key=api_key)
+
+def build_key_pool(config, db: 'Database' = None) -> KeyPool:
+    """Key pool from gemini_api_keys / gemini_api_key / gemini_backup_api_key or GEMINI_API_KEY."""
+    return KeyPool.from_config(config, gemini_client_factory(config), db, env_key=os.getenv('GEMINI_API_KEY'))
+
+def estimate_tokens(prompt, text):
+    """Rough token count of one request (about 4 characters per token)."""
+    return (len(prompt) + len(text)) // 4
 
 class ContentGenerator:
-    def __init__(self, config, db: 'Database' = None):
+    def __init__(self, config, db: 'Database' = None, key_pool: KeyPool = None, router: ModelRouter = None,
+                 limiter: AdaptiveLimiter = None):
         self.config = config
-        api_key = config.get('gemini_api_key') or os.getenv('GEMINI_API_KEY')
-        if not api_key:
-            raise ValueError("Gemini API key not provided in config or environment")
-        self.client = genai.Client(api_key=api_key)
+        # Pass one pool and router to every generator in a process so they share
+        # each key's limits and each model's latency/error history
+        self.keys = key_pool or build_key_pool(config, db)
+        self.router = router or ModelRouter(config, db)
+        # Concurrent generate calls, adapted to Gemini's latency and 429s
+        self.limiter = limiter or get_limiter('gemini', config)
+        self.stream = config.get('gemini_stream', False)
         self.db = db
-        self.circuit_breaker = CircuitBreaker('gemini_api', failure_threshold=5, recovery_timeout=120)
         self.last_tokens_used = 0
+        self.last_cached_tokens = 0
+        self.last_model = None
+        self.niche = (config.get('niche') or {}).get('name')
+        # Shared instructions (rendered once per niche) and the per-keyword template
+        self.prompts = PromptSet(config)
+        settings = config.get('prompts') or {}
+        self.context_cache = None
+        if settings.get('context_cache', True):
+            self.context_cache = ContextCache(db, int(settings.get('cache_ttl', 3600)),
+                                              int(settings.get('min_cache_tokens', 1024)))
+        # generation.mode: sections -> outline first, then the sections concurrently
+        self.sections = None
+        if (config.get('generation') or {}).get('mode') == 'sections':
+            self.sections = SectionGenerator(self, config)
 
     @retry(exceptions=(Exception,), config=RetryConfig(max_attempts=3, base_delay=2))
     def generate_article(self, keyword, products):
-        prompt = self._build_prompt(keyword, products)
         try:
-            response = self.circuit_breaker.call(
-                lambda: self.client.models.generate_content(
-                    model='gemma-3-4b-it',
-                    contents=prompt
-                )
-            )
-            article_md = response.text
-            # Estimate token usage (roughly 4 chars per token)
-            self.last_tokens_used = len(prompt) + len(article_md) // 4
+            if self.sections:
+                article_md, self.last_tokens_used, cached = self.sections.generate(
+                    keyword, products, self._products_text(products))
+                calls = self.sections.last_calls
+            else:
+                prompt = self._build_prompt(keyword, products)
+                article_md, cached = self._generate_routed(prompt)
+                self.last_tokens_used = estimate_tokens(self.prompts.system + prompt, article_md) - cached
+                calls = 1
+            self.last_cached_tokens = cached
             if self.db:
                 kw_id = get_or_create_keyword(self.db, keyword)
-                self.db.increment_metric(api_calls=1, tokens_used=self.last_tokens_used)
+                self.db.increment_metric(niche=self.niche, model=self.last_model, api_calls=calls,
+                                         tokens_used=self.last_tokens_used, tokens_cached=cached)
         except Exception as e:
             article_md = self._generate_stub(keyword, products, error=str(e))
-            self.last_tokens_used = 0
+            self.last_tokens_used = self.last_cached_tokens = 0
             if self.db:
-                self.db.record_error()
+                self.db.record_error(niche=self.niche, model=self.last_model)
                 self.db.log('content_generator', 'generate_article_failed', f'Keyword: {keyword}, Error: {e}', level='error')
         return self._add_front_matter(keyword, article_md)
 
-    def _build_prompt(self, keyword, products):
-        products_text = "\n".join([f"- {p['name']}: ${p['price']:.2f}, rating {p['rating']}/5" for p in products])
-        return f"""You are an experienced pet care specialist writing a comprehensive, honest review for dog owners.
-
-Write a 2000-word article comparing these products for {keyword.replace('_', ' ')}.
-
-Products to compare:
-{products_text}
-
-Structure:
-1. Introduction (hook with anecdote)
-2. Why this need matters for dog owners
-3. Detailed comparison table (markdown)
-4. In-depth review of each product with pros and cons
-5. Testing methodology (simulate hands-on testing)
-6. Frequently asked questions (FAQ)
-7. Conclusion with recommendation and call-to-action
+    def _generate_routed(self, prompt, kind='article'):
+        """Call the router's model; after a failure, try its next choice once. Returns (text, cached tokens).
+
+        kind labels the request (article, outline, section) for the limiter's latency baselines.
+        """
+        tried = []
+        while True:
+            model, reason = self.router.choose(exclude=tried)
+            self.last_model = model
+            start = time.perf_counter()
+            try:
+                text, cached = self.keys.call(lambda client: self._call_model(client, model, prompt, kind),
+                                              tokens=lambda r: estimate_tokens(prompt, r[0]))
+            except Exception:
+                self.router.record(model, time.perf_counter() - start, False, 0, reason)
+                tried.append(model)
+                if len(tried) >= min(2, len(self.router.models)):
+                    raise
+                continue
+            self.router.record(model, time.perf_counter() - start, True, estimate_tokens(prompt, text), reason)
+            return text, cached
+
+    def _supports_system_instruction(self, model):
+        """Gemma models reject system instructions (and so context caching) unless configured otherwise."""
+        for entry in self.router.models:
+            if entry['name'] == model and 'system_instruction' in entry:
+                return bool(entry['system_instruction'])
+        return not model.startswith('gemma')
+
+    def _call_model(self, client, model, prompt, kind='article'):
+        """One generate-content request. Returns (text, prompt tokens served from the context cache).
+
+        The shared instructions go in a cached context when one is available,
+        else as the system instruction, else (models without system
+        instructions) ahead of the prompt. With gemini_stream the streamed
+        chunks are joined.
+        """
+        contents, config, cache_name = prompt, None, None
+        if not self._supports_system_instruction(model):
+            contents = f"{self.prompts.system}\n\n{prompt}"
+        else:
+            if self.context_cache:
+                key_id = next((k.key_id for k in self.keys.keys if k.client is client), '')
+                cache_name = self.context_cache.get(client, key_id, model, self.prompts.system)
+            config = {'cached_content': cache_name} if cache_name else {'system_instruction': self.prompts.system}
+        text, usage = self.limiter.call(self._request, client, model, contents, config, kind=kind)
+        # Implicit caching is reported the same way, so use the API's count when there is one
+        cached = getattr(usage, 'cached_content_token_count', None)
+        if cached is None:
+            cached = estimate_tokens(self.prompts.system, '') if cache_name else 0
+        return text, cached
+
+    def _request(self, client, model, contents, config):
+        """(text, usage metadata) of one request, joining the chunks with gemini_stream."""
+        if self.stream:
+            text, usage = [], None
+            for chunk in client.models.generate_content_stream(model=model, contents=contents, config=config):
+                text.append(chunk.text or '')
+                usage = getattr(chunk, 'usage_metadata', None) or usage
+            return ''.join(text), usage
+        response = client.models.generate_content(model=model, contents=contents, config=config)
+        return response.text, getattr(response, 'usage_metadata', None)
+
+    @staticmethod
+    def _products_text(products):
+        return "\n".join([f"- {p['name']}: ${p['price']:.2f}, rating {p['rating']}/5" for p in products])
 
-Tone: Warm, trustworthy, E-E-A-T compliant. Include personal experience simulation.
-Keyword: {keyword}. For each product, include an affiliate link placeholder: [AMAZON_LINK_PRODUCT_NAME] where PRODUCT_NAME is the product name with spaces replaced by underscores.
-
-Use Markdown formatting. Include image placeholders like `![product name](image_url)` for each product.
-
-Word count: approximately 2000 words.
-"""
+    def _build_prompt(self, keyword, products):
+        """Per-keyword part of the prompt; the niche's shared instructions are sent separately."""
+        return self.prompts.render(keyword, self._products_text(products))
 
     def _add_front_matter(self, keyword, content):
         date_str = datetime.now().strftime('%Y-%m-%d')
@@ -1,7 +1,13 @@
 import sqlite3
 import os
+import threading
 from datetime import datetime
 from typing import Optional, List, Dict, Any
+from .security import scrub
+
+METRIC_COLUMNS = ('articles_published', 'api_calls', 'tokens_used', 'errors', 'earnings_estimate', 'tokens_cached')
+# Rollup period -> strftime format of its bucket key
+ROLLUP_PERIODS = {'week': '%G-W%V', 'month': '%Y-%m'}
 
 class Database:
     def __init__(self, db_path='data/income_bot.db'):
@@ -9,6 +15,10 @@ class Database:
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+        # Held by writers that may run on worker threads (model router, key pool, prompt cache)
+        self.lock = threading.RLock()
+        # Only takes effect on a new database; Compactor.vacuum() converts existing ones
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
         self._init_schema()
 
     def _init_schema(self):
@@ -18,14 +28,22 @@ class Database:
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS keywords (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                keyword TEXT UNIQUE NOT NULL,
+                keyword TEXT NOT NULL,
                 status TEXT DEFAULT 'pending',
                 added_date TEXT,
                 assigned_date TEXT,
                 completed_date TEXT,
-                error TEXT
+                error TEXT,
+                niche TEXT,
+                UNIQUE (niche, keyword)
             )
         ''')
+        # Keywords belong to one niche; NULL rows predate multi-niche support
+        self._ensure_column('keywords', 'niche', 'TEXT')
+        self._migrate_keyword_namespace()
+        # UNIQUE (niche, keyword) lets NULLs repeat; keywords added without a niche must stay unique too
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_keywords_unscoped ON keywords (COALESCE(niche, ''), keyword)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_keywords_niche_status ON keywords (niche, status, added_date)")
         # Articles table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS articles (
@@ -64,6 +82,24 @@ class Database:
                 earnings_estimate REAL DEFAULT 0.0
             )
         ''')
+        # Weekly/monthly totals, overall ('all') and per niche / per model
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS metric_rollups (
+                period TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                dimension TEXT NOT NULL,
+                value TEXT NOT NULL DEFAULT '',
+                articles_published INTEGER DEFAULT 0,
+                api_calls INTEGER DEFAULT 0,
+                tokens_used INTEGER DEFAULT 0,
+                errors INTEGER DEFAULT 0,
+                earnings_estimate REAL DEFAULT 0.0,
+                PRIMARY KEY (period, bucket, dimension, value)
+            )
+        ''')
+        # Prompt tokens served from a context cache instead of being billed at the full rate
+        self._ensure_column('metrics', 'tokens_cached', 'INTEGER DEFAULT 0')
+        self._ensure_column('metric_rollups', 'tokens_cached', 'INTEGER DEFAULT 0')
         # Audit log
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS audit_log (
@@ -89,6 +125,225 @@ class Database:
                 error TEXT
             )
         ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_timestamp ON audit_log (timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_job_queue_completed ON job_queue (completed_at)")
+        # Article manifest for incremental sitemap/category/tag generation
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS article_manifest (
+                slug TEXT PRIMARY KEY,
+                title TEXT,
+                date TEXT,
+                category TEXT,
+                tags TEXT,
+                path TEXT,
+                hash TEXT,
+                updated_at TEXT
+            )
+        ''')
+        # One row per Gemini call: latency, outcome and why the router chose the model
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS model_calls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                model TEXT NOT NULL,
+                latency_ms REAL,
+                ok INTEGER,
+                tokens INTEGER,
+                reason TEXT
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_model_calls_timestamp ON model_calls (timestamp)")
+        # Gemini cachedContents holding each niche's shared instructions
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS prompt_caches (
+                key_id TEXT NOT NULL,
+                model TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                name TEXT,
+                expires_at REAL,
+                PRIMARY KEY (key_id, model, digest)
+            )
+        ''')
+        # Daily usage per Gemini key (key_id is a hash prefix, never the key)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS api_key_usage (
+                key_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                requests INTEGER DEFAULT 0,
+                tokens_used INTEGER DEFAULT 0,
+                PRIMARY KEY (key_id, date)
+            )
+        ''')
+        # Last known state of each circuit breaker, for the out-of-process health check
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS circuit_breaker_state (
+                name TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                failure_count INTEGER DEFAULT 0,
+                last_failure_time REAL,
+                recovery_timeout REAL,
+                updated_at TEXT
+            )
+        ''')
+        # Weighted fair-share state per niche (see src/niches.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS niche_schedule (
+                niche TEXT PRIMARY KEY,
+                vstart REAL DEFAULT 0,
+                vtime REAL DEFAULT 0,
+                runs INTEGER DEFAULT 0,
+                tokens_used INTEGER DEFAULT 0
+            )
+        ''')
+        # SimHash of every post, and its bands for near-duplicate lookups (see src/dedup.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS post_fingerprints (
+                slug TEXT PRIMARY KEY,
+                path TEXT,
+                hash TEXT,
+                simhash INTEGER NOT NULL,
+                updated_at TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS fingerprint_bands (
+                band INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                slug TEXT NOT NULL,
+                PRIMARY KEY (band, value, slug)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_fingerprint_bands_slug ON fingerprint_bands (slug)")
+        # Hashed term vectors for related-article links (see src/related.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS related_docs (
+                slug TEXT PRIMARY KEY,
+                title TEXT,
+                category TEXT,
+                terms TEXT,
+                updated_at TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS related_terms (
+                term INTEGER PRIMARY KEY,
+                df INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS related_postings (
+                term INTEGER NOT NULL,
+                slug TEXT NOT NULL,
+                weight REAL NOT NULL,
+                PRIMARY KEY (term, slug)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_related_postings_slug ON related_postings (slug)")
+        # Commit that last published the manifest hash (NULL until pushed)
+        self._ensure_column('article_manifest', 'commit_sha', 'TEXT')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_manifest_category ON article_manifest (category, date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_manifest_date ON article_manifest (date)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS article_tags (
+                slug TEXT NOT NULL,
+                tag TEXT NOT NULL,
+                PRIMARY KEY (tag, slug)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_article_tags_slug ON article_tags (slug)")
+        # Latest manifest update per month, for the sitemap index (kept by SiteIndex.update)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sitemap_months (
+                month TEXT PRIMARY KEY,
+                lastmod TEXT NOT NULL
+            )
+        ''')
+        # Per-stage timing samples (unix seconds, microsecond durations)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stage_timings (
+                run_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                duration_us INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_stage_timings_ts ON stage_timings (ts)")
+        # Last run time of periodic maintenance tasks (e.g. compaction)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS maintenance_runs (
+                task TEXT PRIMARY KEY,
+                last_run TEXT
+            )
+        ''')
+        self._migrate_post_keys()
+        self._backfill_sitemap_months()
+        self.conn.commit()
+
+    def _ensure_column(self, table: str, column: str, decl: str):
+        """Add a column to a table created by an older version of this schema."""
+        columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+    def _migrate_keyword_namespace(self):
+        """Rebuild a keywords table from before UNIQUE (niche, keyword), when keyword alone was unique."""
+        row = self.conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'keywords'").fetchone()
+        if 'UNIQUE (niche, keyword)' in row[0]:
+            return
+        columns = 'id, keyword, status, added_date, assigned_date, completed_date, error, niche'
+        self.conn.executescript(f'''
+            BEGIN;
+            CREATE TABLE keywords_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                keyword TEXT NOT NULL,
+                status TEXT DEFAULT 'pending',
+                added_date TEXT,
+                assigned_date TEXT,
+                completed_date TEXT,
+                error TEXT,
+                niche TEXT,
+                UNIQUE (niche, keyword)
+            );
+            INSERT INTO keywords_new ({columns}) SELECT {columns} FROM keywords;
+            DROP TABLE keywords;
+            ALTER TABLE keywords_new RENAME TO keywords;
+            COMMIT;
+        ''')
+
+    def _migrate_post_keys(self):
+        """Prefix post keys written before they were namespaced by category (slug -> category/slug)."""
+        if self.get_maintenance_run('post_keys'):
+            return
+        cursor = self.conn.cursor()
+        cursor.execute("UPDATE article_tags SET slug = (SELECT m.category || '/' || m.slug FROM article_manifest m "
+                       "WHERE m.slug = article_tags.slug) WHERE slug NOT LIKE '%/%'")
+        cursor.execute("UPDATE article_manifest SET slug = category || '/' || slug WHERE slug NOT LIKE '%/%'")
+        # _posts/<category>/<slug>.md -> <category>/<slug>
+        cursor.execute("UPDATE fingerprint_bands SET slug = (SELECT substr(p.path, 8, length(p.path) - 10) "
+                       "FROM post_fingerprints p WHERE p.slug = fingerprint_bands.slug) WHERE slug NOT LIKE '%/%'")
+        cursor.execute("UPDATE post_fingerprints SET slug = substr(path, 8, length(path) - 10) WHERE slug NOT LIKE '%/%'")
+        cursor.execute("UPDATE related_postings SET slug = (SELECT d.category || '/' || d.slug FROM related_docs d "
+                       "WHERE d.slug = related_postings.slug) WHERE slug NOT LIKE '%/%'")
+        cursor.execute("UPDATE related_docs SET slug = category || '/' || slug WHERE slug NOT LIKE '%/%'")
+        self.set_maintenance_run('post_keys', datetime.now().isoformat())
+
+    def _backfill_sitemap_months(self):
+        """Fill sitemap_months from a manifest written before it existed (one aggregate, once)."""
+        if self.get_maintenance_run('sitemap_months'):
+            return
+        self.conn.execute("INSERT OR REPLACE INTO sitemap_months (month, lastmod) "
+                          "SELECT substr(date, 1, 7), substr(MAX(updated_at), 1, 10) FROM article_manifest "
+                          "GROUP BY substr(date, 1, 7)")
+        self.set_maintenance_run('sitemap_months', datetime.now().isoformat())
+
+    def get_maintenance_run(self, task: str) -> Optional[str]:
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT last_run FROM maintenance_runs WHERE task = ?", (task,))
+        row = cursor.fetchone()
+        return row['last_run'] if row else None
+
+    def set_maintenance_run(self, task: str, when: str):
+        self.conn.execute("INSERT OR REPLACE INTO maintenance_runs (task, last_run) VALUES (?, ?)", (task, when))
         self.conn.commit()
 
     def log(self, module: str, action: str, details: str = "", level: str = "info"):
@@ -96,36 +351,62 @@ class Database:
         cursor = self.conn.cursor()
         cursor.execute(
             "INSERT INTO audit_log (timestamp, module, action, details, level) VALUES (?, ?, ?, ?, ?)",
-            (datetime.now().isoformat(), module, action, details, level)
+            (datetime.now().isoformat(), module, scrub(action), scrub(details), level)
         )
         self.conn.commit()
 
-    def add_keyword(self, keyword: str) -> int:
+    def add_keyword(self, keyword: str, niche: str = None) -> int:
         """Insert a new keyword if not exists. Returns keyword ID."""
         cursor = self.conn.cursor()
         try:
             cursor.execute(
-                "INSERT OR IGNORE INTO keywords (keyword, status, added_date) VALUES (?, ?, ?)",
-                (keyword, 'pending', datetime.now().isoformat())
+                "INSERT OR IGNORE INTO keywords (keyword, status, added_date, niche) VALUES (?, ?, ?, ?)",
+                (keyword, 'pending', datetime.now().isoformat(), niche)
             )
             self.conn.commit()
             if cursor.lastrowid:
                 return cursor.lastrowid
             # If already exists, fetch its ID
-            cursor.execute("SELECT id FROM keywords WHERE keyword = ?", (keyword,))
+            cursor.execute("SELECT id FROM keywords WHERE keyword = ? AND niche IS ?", (keyword, niche))
             row = cursor.fetchone()
             return row['id'] if row else None
         except Exception as e:
             self.log('database', 'add_keyword', f'Error: {e}', 'error')
             raise
 
-    def get_next_keywords(self, n: int) -> List[Dict[str, Any]]:
-        """Get up to n pending keywords, mark them as assigned."""
+    def add_keywords(self, keywords: List[str], niche: str = None) -> int:
+        """Bulk-insert keywords in one transaction. Returns number of new rows."""
         cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT * FROM keywords WHERE status = 'pending' ORDER BY added_date LIMIT ?",
-            (n,)
+        now = datetime.now().isoformat()
+        before = self.conn.total_changes
+        cursor.executemany(
+            "INSERT OR IGNORE INTO keywords (keyword, status, added_date, niche) VALUES (?, 'pending', ?, ?)",
+            ((kw, now, niche) for kw in keywords)
         )
+        self.conn.commit()
+        return self.conn.total_changes - before
+
+    def get_all_keyword_texts(self, niche: str = None) -> List[str]:
+        cursor = self.conn.cursor()
+        if niche is None:
+            cursor.execute("SELECT keyword FROM keywords")
+        else:
+            cursor.execute("SELECT keyword FROM keywords WHERE niche = ?", (niche,))
+        return [row[0] for row in cursor.fetchall()]
+
+    def get_next_keywords(self, n: int, niche: str = None) -> List[Dict[str, Any]]:
+        """Get up to n pending keywords (optionally of one niche), mark them as assigned."""
+        cursor = self.conn.cursor()
+        if niche is None:
+            cursor.execute(
+                "SELECT * FROM keywords WHERE status = 'pending' ORDER BY added_date LIMIT ?",
+                (n,)
+            )
+        else:
+            cursor.execute(
+                "SELECT * FROM keywords WHERE status = 'pending' AND niche = ? ORDER BY added_date LIMIT ?",
+                (niche, n)
+            )
         rows = cursor.fetchall()
         keyword_ids = []
         for row in rows:
@@ -138,18 +419,47 @@ class Database:
         self.conn.commit()
         return [dict(row) for row in rows if row['id'] in keyword_ids]
 
-    def mark_keyword_completed(self, keyword: str):
-        """Mark keyword as completed."""
+    def count_keywords(self, niche: str = None) -> int:
         cursor = self.conn.cursor()
-        cursor.execute(
-            "UPDATE keywords SET status = 'completed', completed_date = ? WHERE keyword = ?",
-            (datetime.now().isoformat(), keyword)
-        )
+        if niche is None:
+            cursor.execute("SELECT COUNT(*) FROM keywords")
+        else:
+            cursor.execute("SELECT COUNT(*) FROM keywords WHERE niche = ?", (niche,))
+        return cursor.fetchone()[0]
+
+    def count_pending_by_niche(self) -> Dict[Optional[str], int]:
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT niche, COUNT(*) FROM keywords WHERE status = 'pending' GROUP BY niche")
+        return {row[0]: row[1] for row in cursor.fetchall()}
+
+    def assign_unscoped_keywords(self, niche: str) -> int:
+        """Move keywords added before multi-niche support into `niche`."""
+        cursor = self.conn.cursor()
+        cursor.execute("UPDATE keywords SET niche = ? WHERE niche IS NULL", (niche,))
+        self.conn.commit()
+        return cursor.rowcount
+
+    def mark_keyword_completed(self, keyword: str, niche: str = None):
+        """Mark keyword (of one niche, if given) as completed."""
+        cursor = self.conn.cursor()
+        if niche is None:
+            cursor.execute(
+                "UPDATE keywords SET status = 'completed', completed_date = ? WHERE keyword = ?",
+                (datetime.now().isoformat(), keyword)
+            )
+        else:
+            cursor.execute(
+                "UPDATE keywords SET status = 'completed', completed_date = ? WHERE keyword = ? AND niche = ?",
+                (datetime.now().isoformat(), keyword, niche)
+            )
         self.conn.commit()
 
-    def get_keyword_by_text(self, keyword: str) -> Optional[Dict[str, Any]]:
+    def get_keyword_by_text(self, keyword: str, niche: str = None) -> Optional[Dict[str, Any]]:
         cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM keywords WHERE keyword = ?", (keyword,))
+        if niche is None:
+            cursor.execute("SELECT * FROM keywords WHERE keyword = ?", (keyword,))
+        else:
+            cursor.execute("SELECT * FROM keywords WHERE keyword = ? AND niche = ?", (keyword, niche))
         row = cursor.fetchone()
         return dict(row) if row else None
 
@@ -170,31 +480,33 @@ class Database:
         )
         self.conn.commit()
 
-    def increment_metric(self, date: str = None, **kwargs):
-        """Update metrics for a given date (defaults to today)."""
+    def increment_metric(self, date: str = None, niche: str = None, model: str = None, **kwargs):
+        """Update metrics for a given date (defaults to today) and the weekly/monthly rollups.
+
+        Rollups are kept overall and, when given, per niche and per model.
+        """
         if date is None:
             date = datetime.now().strftime('%Y-%m-%d')
+        if not kwargs:
+            return
+        cols = list(kwargs.keys())
+        values = list(kwargs.values())
+        updates = ', '.join(f"{c} = {c} + excluded.{c}" for c in cols)
         cursor = self.conn.cursor()
-        # Check if row exists
-        cursor.execute("SELECT * FROM metrics WHERE date = ?", (date,))
-        row = cursor.fetchone()
-        if row:
-            updates = []
-            params = []
-            for key, value in kwargs.items():
-                updates.append(f"{key} = {key} + ?")
-                params.append(value)
-            params.append(date)
-            cursor.execute(f"UPDATE metrics SET {', '.join(updates)} WHERE date = ?", params)
-        else:
-            # Insert new row
-            cols = ['date'] + list(kwargs.keys())
-            placeholders = ['?'] * (1 + len(kwargs))
-            values = [date] + list(kwargs.values())
-            cursor.execute(
-                f"INSERT INTO metrics ({', '.join(cols)}) VALUES ({', '.join(placeholders)})",
-                values
-            )
+        cursor.execute(
+            f"INSERT INTO metrics (date, {', '.join(cols)}) VALUES (?{', ?' * len(cols)}) "
+            f"ON CONFLICT(date) DO UPDATE SET {updates}",
+            [date] + values
+        )
+        day = datetime.strptime(date, '%Y-%m-%d')
+        dims = [('all', '')] + [(d, v) for d, v in (('niche', niche), ('model', model)) if v]
+        cursor.executemany(
+            f"INSERT INTO metric_rollups (period, bucket, dimension, value, {', '.join(cols)}) "
+            f"VALUES (?, ?, ?, ?{', ?' * len(cols)}) "
+            f"ON CONFLICT(period, bucket, dimension, value) DO UPDATE SET {updates}",
+            [[period, day.strftime(fmt), dim, value] + values
+             for period, fmt in ROLLUP_PERIODS.items() for dim, value in dims]
+        )
         self.conn.commit()
 
     def get_recent_metrics(self, days: int = 7) -> List[Dict[str, Any]]:
@@ -206,9 +518,52 @@ class Database:
         rows = cursor.fetchall()
         return [dict(row) for row in rows]
 
-    def record_error(self):
+    def get_metric_totals(self, days: int = 7) -> Dict[str, Any]:
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"SELECT {', '.join(f'COALESCE(SUM({c}), 0) AS {c}' for c in METRIC_COLUMNS)} "
+            "FROM metrics WHERE date >= date('now', ?)",
+            (f'-{days} days',)
+        )
+        return dict(cursor.fetchone())
+
+    def get_rollups(self, period: str, dimension: str = 'all', limit: int = 12, bucket: str = None) -> List[Dict[str, Any]]:
+        """Most recent `limit` buckets of a rollup, oldest first (or every value in one bucket)."""
+        cursor = self.conn.cursor()
+        if bucket:
+            cursor.execute(
+                "SELECT * FROM metric_rollups WHERE period = ? AND dimension = ? AND bucket = ? ORDER BY value",
+                (period, dimension, bucket)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT * FROM metric_rollups WHERE period = ? AND dimension = ? ORDER BY bucket DESC, value LIMIT ?",
+            (period, dimension, limit)
+        )
+        return [dict(row) for row in reversed(cursor.fetchall())]
+
+    def rebuild_rollups(self):
+        """Recompute the overall weekly/monthly rollups from the daily metrics table."""
+        totals: Dict[tuple, List[float]] = {}
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT date, {', '.join(METRIC_COLUMNS)} FROM metrics")
+        for row in cursor.fetchall():
+            day = datetime.strptime(row['date'], '%Y-%m-%d')
+            for period, fmt in ROLLUP_PERIODS.items():
+                acc = totals.setdefault((period, day.strftime(fmt)), [0] * len(METRIC_COLUMNS))
+                for i, col in enumerate(METRIC_COLUMNS):
+                    acc[i] += row[col] or 0
+        cursor.execute("DELETE FROM metric_rollups WHERE dimension = 'all'")
+        cursor.executemany(
+            f"INSERT INTO metric_rollups (period, bucket, dimension, value, {', '.join(METRIC_COLUMNS)}) "
+            f"VALUES (?, ?, 'all', ''{', ?' * len(METRIC_COLUMNS)})",
+            [[period, bucket] + acc for (period, bucket), acc in totals.items()]
+        )
+        self.conn.commit()
+
+    def record_error(self, niche: str = None, model: str = None):
         """Increment error count for today."""
-        self.increment_metric(errors=1)
+        self.increment_metric(niche=niche, model=model, errors=1)
 
     def close(self):
         self.conn.close()
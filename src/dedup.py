@@ -0,0 +1,174 @@
+import hashlib
+import os
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from .related import strip_related
+from .site_index import FRONT_MATTER_RE, content_hash, parse_front_matter, post_key
+
+BITS = 64
+WORD_RE = re.compile(r'[a-z0-9]+')
+TOPIC = '<topic>'  # stands in for the post's own title or slug in its body
+
+
+class DuplicateContentError(Exception):
+    """Raised by Publisher when an article is a near-duplicate of a published post."""
+    def __init__(self, slug: str, match: str, distance: int):
+        super().__init__(f"{slug} is a near-duplicate of {match} ({distance} of {BITS} bits differ)")
+        self.slug = slug
+        self.match = match
+        self.distance = distance
+
+
+def _mask_topic(words: List[str], phrases: List[List[str]]) -> List[str]:
+    """words with every occurrence of one of phrases (longest first) replaced by one placeholder."""
+    phrases = sorted((p for p in phrases if p), key=len, reverse=True)
+    out, i = [], 0
+    while i < len(words):
+        for phrase in phrases:
+            if words[i:i + len(phrase)] == phrase:
+                out.append(TOPIC)
+                i += len(phrase)
+                break
+        else:
+            out.append(words[i])
+            i += 1
+    return out
+
+
+def simhash(content: str, shingle: int = 3) -> int:
+    """64-bit SimHash of the article body (front matter and related links excluded) over word shingles.
+
+    The post's title and slug are masked in the body first, so two articles
+    that differ only in their keyword (placeholder articles, templated
+    filler) hash alike.
+    """
+    fm = parse_front_matter(content)
+    phrases = [WORD_RE.findall(str(fm.get(key) or '').lower().replace('_', ' ')) for key in ('title', 'slug')]
+    body = strip_related(FRONT_MATTER_RE.sub('', content, count=1))
+    words = _mask_topic(WORD_RE.findall(body.lower()), phrases)
+    grams = Counter(' '.join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1)))
+    weights = [0] * BITS
+    for gram, count in grams.items():
+        h = int.from_bytes(hashlib.blake2b(gram.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(BITS):
+            weights[bit] += count if h >> bit & 1 else -count
+    return sum(1 << bit for bit, w in enumerate(weights) if w > 0)
+
+
+def _signed(value: int) -> int:
+    """SQLite integers are signed 64-bit."""
+    return value - (1 << BITS) if value >= 1 << (BITS - 1) else value
+
+
+class DuplicateIndex:
+    """SimHash fingerprints of every post under _posts/**, for near-duplicate checks.
+
+    Fingerprints live in post_fingerprints and are split into
+    max_distance + 1 bands in fingerprint_bands: two fingerprints within
+    max_distance bits of each other agree exactly on at least one band, so a
+    query is one indexed lookup per band plus a popcount on the few
+    candidates, independent of corpus size. Publisher adds each post as it
+    is published; sync() picks up posts changed outside the bot.
+    """
+    def __init__(self, config: Dict[str, Any], db: 'Database'):
+        settings = config.get('dedup') or {}
+        self.db = db
+        self.repo_path = config['repo_path']
+        self.max_distance = int(settings.get('max_distance', 3))
+        self.shingle = int(settings.get('shingle', 3))
+        self.bands = self.max_distance + 1
+        self.width = BITS // self.bands
+        self._ensure_bands()
+
+    def _band_values(self, fp: int) -> List[Tuple[int, int]]:
+        mask = (1 << self.width) - 1
+        # The last band takes the bits left over when BITS isn't a multiple of the band count
+        return [(b, _signed(fp >> (b * self.width) & (mask if b < self.bands - 1 else -1))) for b in range(self.bands)]
+
+    def _ensure_bands(self):
+        """Re-band stored fingerprints when max_distance changed since they were written."""
+        row = self.db.conn.execute("SELECT MAX(band) FROM fingerprint_bands").fetchone()
+        if row[0] is None or row[0] == self.bands - 1:
+            return
+        rows = self.db.conn.execute("SELECT slug, simhash FROM post_fingerprints").fetchall()
+        self.db.conn.execute("DELETE FROM fingerprint_bands")
+        self.db.conn.executemany("INSERT INTO fingerprint_bands (band, value, slug) VALUES (?, ?, ?)",
+                                 [(b, v, r['slug']) for r in rows for b, v in self._band_values(r['simhash'] % (1 << BITS))])
+        self.db.conn.commit()
+
+    def fingerprint(self, content: str) -> int:
+        return simhash(content, self.shingle)
+
+    def query(self, fp: int, exclude: str = None) -> List[Tuple[str, int]]:
+        """(slug, distance) of indexed posts within max_distance bits of fp, closest first."""
+        sql = ' UNION '.join(["SELECT slug FROM fingerprint_bands WHERE band = ? AND value = ?"] * self.bands)
+        params = [x for pair in self._band_values(fp) for x in pair]
+        cursor = self.db.conn.cursor()
+        cursor.execute(f"SELECT slug, simhash FROM post_fingerprints WHERE slug IN ({sql})", params)
+        matches = []
+        for row in cursor.fetchall():
+            distance = bin((row['simhash'] % (1 << BITS)) ^ fp).count('1')
+            if distance <= self.max_distance and row['slug'] != exclude:
+                matches.append((row['slug'], distance))
+        return sorted(matches, key=lambda m: (m[1], m[0]))
+
+    def check(self, slug: str, content: str) -> Optional[Tuple[str, int]]:
+        """Closest published post that content near-duplicates, other than slug itself."""
+        matches = self.query(self.fingerprint(content), exclude=slug)
+        return matches[0] if matches else None
+
+    def add(self, slug: str, path: str, content: str, fp: int = None):
+        fp = self.fingerprint(content) if fp is None else fp
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO post_fingerprints (slug, path, hash, simhash, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (slug, path, content_hash(content), _signed(fp), datetime.now().isoformat())
+        )
+        cursor.execute("DELETE FROM fingerprint_bands WHERE slug = ?", (slug,))
+        cursor.executemany("INSERT INTO fingerprint_bands (band, value, slug) VALUES (?, ?, ?)",
+                           [(b, v, slug) for b, v in self._band_values(fp)])
+        self.db.conn.commit()
+
+    def sync(self) -> int:
+        """Index new or changed posts under _posts/** and drop removed ones. Returns posts (re)indexed."""
+        known = {r['slug']: r['hash'] for r in self.db.conn.execute("SELECT slug, hash FROM post_fingerprints")}
+        posts_dir = os.path.join(self.repo_path, '_posts')
+        seen, changed = set(), 0
+        for root, _dirs, files in os.walk(posts_dir):
+            for name in sorted(files):
+                if not name.endswith('.md'):
+                    continue
+                slug = post_key(os.path.relpath(root, posts_dir).replace(os.sep, '/'), os.path.splitext(name)[0])
+                seen.add(slug)
+                full = os.path.join(root, name)
+                with open(full, encoding='utf-8') as f:
+                    content = f.read()
+                if known.get(slug) != content_hash(content):
+                    self.add(slug, os.path.relpath(full, self.repo_path).replace(os.sep, '/'), content)
+                    changed += 1
+        gone = [(slug,) for slug in known if slug not in seen]
+        self.db.conn.executemany("DELETE FROM post_fingerprints WHERE slug = ?", gone)
+        self.db.conn.executemany("DELETE FROM fingerprint_bands WHERE slug = ?", gone)
+        self.db.conn.commit()
+        return changed
+
+    def clusters(self) -> List[List[Dict[str, Any]]]:
+        """Groups of posts linked by near-duplicate pairs, largest first."""
+        rows = self.db.conn.execute("SELECT slug, path, simhash FROM post_fingerprints ORDER BY slug").fetchall()
+        parent = {r['slug']: r['slug'] for r in rows}
+
+        def find(s):
+            while parent[s] != s:
+                parent[s] = parent[parent[s]]
+                s = parent[s]
+            return s
+
+        for r in rows:
+            for other, _distance in self.query(r['simhash'] % (1 << BITS), exclude=r['slug']):
+                parent[find(other)] = find(r['slug'])
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for r in rows:
+            groups.setdefault(find(r['slug']), []).append({'slug': r['slug'], 'path': r['path']})
+        return sorted((g for g in groups.values() if len(g) > 1), key=lambda g: (-len(g), g[0]['slug']))
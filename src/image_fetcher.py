@@ -1,9 +1,153 @@
+import hashlib
+import io
+import json
+import os
+from threading import Lock
+from typing import Any, Dict, List, Optional
+from .concurrency import get_limiter
+from .parallel import parallel_map
+
+POLLINATIONS_URL = "https://image.pollinations.ai/prompt/{query}?width=800&height=600&noStore=true"
+
+
 class ImageFetcher:
-    def __init__(self, config):
+    """Resolves product images for articles.
+
+    By default returns hot-linked pollinations.ai URLs. With images.local
+    enabled, images are downloaded over a pooled session, stored
+    content-addressed under the site repo as resized WebP variants, and
+    rendered as <img srcset> markup; the files are returned so Publisher can
+    commit them with the article.
+    """
+    def __init__(self, config, session=None):
         self.config = config
+        opts = config.get('images') or {}
+        self.local = opts.get('local', False)
+        self.widths = sorted(opts.get('widths', [400, 800]))
+        self.quality = opts.get('quality', 80)
+        self.source_url = opts.get('source_url', POLLINATIONS_URL)
+        self.asset_dir = opts.get('asset_dir', 'assets/images')
+        self.base_url = opts.get('base_url', '/').rstrip('/')
+        # Downloads in flight adapt to the image host's latency and 429s (concurrency.images)
+        self.limiter = get_limiter('images', config)
+        self.max_workers = self.limiter.max_limit
+        self.timeout = opts.get('timeout', 30)
+        self.repo_path = config.get('repo_path') or '.'
+        self._session = session
+        self._index_lock = Lock()
+        self._index: Optional[Dict[str, Any]] = None
 
     def fetch_image(self, product_name):
         # Use pollinations.ai free text-to-image endpoint
         query = product_name.replace(' ', '+')
-        url = f"https://image.pollinations.ai/prompt/{query}?width=800&height=600&noStore=true"
-        return url
\ No newline at end of file
+        return self.source_url.format(query=query)
+
+    # --- local pipeline -------------------------------------------------
+
+    @property
+    def session(self):
+        with self._index_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+            return self._session
+
+    def _asset_root(self):
+        return os.path.join(self.repo_path, self.asset_dir)
+
+    def _index_path(self):
+        return os.path.join(self._asset_root(), 'index.json')
+
+    def _load_index(self) -> Dict[str, Any]:
+        if self._index is None:
+            try:
+                with open(self._index_path(), encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self._asset_root(), exist_ok=True)
+        tmp = self._index_path() + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, indent=1, sort_keys=True)
+        os.replace(tmp, self._index_path())
+
+    def _variant_relpath(self, digest: str, width: int) -> str:
+        return f"{self.asset_dir}/{digest[:2]}/{digest}-{width}.webp"
+
+    def _encode_variants(self, data: bytes, digest: str) -> List[Dict[str, Any]]:
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as src:
+            src = src.convert('RGB')
+            widths = [w for w in self.widths if w <= src.width] or [src.width]
+            variants = []
+            for width in widths:
+                rel = self._variant_relpath(digest, width)
+                path = os.path.join(self.repo_path, rel)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    height = round(src.height * width / src.width)
+                    img = src if width == src.width else src.resize((width, height), Image.LANCZOS)
+                    img.save(path, 'WEBP', quality=self.quality, method=4)
+                variants.append({'width': width, 'path': rel})
+        return variants
+
+    def _cached_entry(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._index_lock:
+            entry = self._load_index().get(url)
+        if entry and all(os.path.exists(os.path.join(self.repo_path, v['path'])) for v in entry['variants']):
+            return entry
+        return None
+
+    def fetch_local(self, product_name) -> Dict[str, Any]:
+        """Download (unless cached) and encode one product image. Returns its index entry."""
+        url = self.fetch_image(product_name)
+        entry = self._cached_entry(url)
+        if entry:
+            return dict(entry, cached=True)
+        resp = self.limiter.call(self._download, url)
+        digest = hashlib.sha256(resp.content).hexdigest()[:32]
+        entry = {'hash': digest, 'variants': self._encode_variants(resp.content, digest)}
+        with self._index_lock:
+            self._load_index()[url] = entry
+            self._save_index()
+        return dict(entry, cached=False)
+
+    def _download(self, url):
+        resp = self.session.get(url, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp
+
+    def render(self, alt: str, entry: Dict[str, Any]) -> str:
+        variants = entry['variants']
+        srcset = ', '.join(f"{self.base_url}/{v['path']} {v['width']}w" for v in variants)
+        largest = variants[-1]
+        alt = alt.replace('"', '&quot;')
+        return (f'<img src="{self.base_url}/{largest["path"]}" srcset="{srcset}" '
+                f'sizes="(max-width: {largest["width"]}px) 100vw, {largest["width"]}px" '
+                f'alt="{alt}" loading="lazy">')
+
+    def resolve_images(self, product_names: List[str]) -> List[Dict[str, Any]]:
+        """Resolve images for every product concurrently.
+
+        Returns one {'markup', 'files'} dict per product, in order. Falls back to the
+        remote URL for any image that cannot be fetched or encoded.
+        """
+        if not self.local:
+            return [{'markup': f'![{name}]({self.fetch_image(name)})', 'files': []} for name in product_names]
+        # parallel_map yields None for items whose fetch raised
+        entries = parallel_map(self.fetch_local, product_names, max_workers=self.max_workers)
+        resolved = []
+        for name, entry in zip(product_names, entries):
+            if entry is None:
+                resolved.append({'markup': f'![{name}]({self.fetch_image(name)})', 'files': []})
+            else:
+                files = [os.path.join(self.repo_path, v['path']) for v in entry['variants']]
+                resolved.append({'markup': self.render(name, entry), 'files': files + [self._index_path()]})
+        return resolved
@@ -0,0 +1,251 @@
+import hashlib
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from .circuit_breaker import CircuitBreaker
+
+DEFAULT_RPM = 15
+DEFAULT_TOKENS_PER_DAY = 1000000
+QUOTA_COOLDOWN = 60.0  # seconds a key sits out after a 429 without Retry-After
+
+_AUTH_MARKERS = ('API_KEY_INVALID', 'PERMISSION_DENIED', 'UNAUTHENTICATED', 'API key not valid')
+_QUOTA_MARKERS = ('RESOURCE_EXHAUSTED', 'Quota exceeded', 'rate limit')
+
+
+class NoKeyAvailable(Exception):
+    """Every key is out of quota, cooling down, broken or rejected."""
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def classify_error(error: Exception) -> str:
+    """'quota', 'auth' or 'error' for an exception raised by the Gemini client."""
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    text = str(error)
+    if code == 429 or any(m in text for m in _QUOTA_MARKERS):
+        return 'quota'
+    if code in (401, 403) or any(m in text for m in _AUTH_MARKERS):
+        return 'auth'
+    return 'error'
+
+
+class ApiKey:
+    """One key with its own per-minute window, daily token budget and breaker."""
+    def __init__(self, key: str, rpm: int = DEFAULT_RPM, tokens_per_day: int = DEFAULT_TOKENS_PER_DAY):
+        self.key = key
+        # Stable, non-secret identifier used in logs, metrics and the usage table
+        self.key_id = hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]
+        self.rpm = rpm
+        self.tokens_per_day = tokens_per_day
+        self.breaker = CircuitBreaker(f'gemini_key_{self.key_id}', failure_threshold=3, recovery_timeout=120)
+        self.client = None
+        self.requests = deque()  # monotonic start times within the last minute
+        self.day = datetime.now().strftime('%Y-%m-%d')
+        self.tokens_today = 0
+        self.cooldown_until = 0.0
+        self.rejected = False
+
+    def _roll(self, now: float):
+        while self.requests and now - self.requests[0] >= 60:
+            self.requests.popleft()
+        today = datetime.now().strftime('%Y-%m-%d')
+        if today != self.day:
+            self.day, self.tokens_today = today, 0
+
+    def available(self, now: float) -> bool:
+        return not self.rejected and now >= self.cooldown_until and self.breaker.allows_request()
+
+    def capacity(self, now: float) -> float:
+        """Fraction of this minute's requests and today's tokens still unused (the smaller of the two)."""
+        self._roll(now)
+        if not self.available(now):
+            return 0.0
+        return min(1 - len(self.requests) / self.rpm, 1 - self.tokens_today / self.tokens_per_day)
+
+    def status(self, now: float = None) -> Dict[str, Any]:
+        now = time.monotonic() if now is None else now
+        self._roll(now)
+        return {
+            'key_id': self.key_id,
+            'requests_last_minute': len(self.requests),
+            'rpm': self.rpm,
+            'tokens_today': self.tokens_today,
+            'tokens_per_day': self.tokens_per_day,
+            'breaker': self.breaker.state.value,
+            'cooldown': max(0.0, self.cooldown_until - now),
+            'rejected': self.rejected,
+        }
+
+
+class KeyPool:
+    """Routes Gemini requests across several API keys.
+
+    acquire() hands out the key with the most remaining capacity (per-minute
+    requests and daily tokens, each relative to that key's quota), so the
+    pool's throughput is the sum of its keys'. A 429 benches the key for the
+    Retry-After delay (QUOTA_COOLDOWN by default), an auth failure removes it
+    until the next config load, and other errors feed the key's breaker.
+    call() retries on the next key after quota and auth errors and, when
+    every key is only rate-limited, waits up to max_wait seconds for a slot
+    instead of failing. Daily token use is kept in the api_key_usage table
+    when a database is given, so budgets hold across scheduler runs, and
+    breaker changes in circuit_breaker_state for the health check.
+    """
+    def __init__(self, keys: List[ApiKey], client_factory: Callable[[str], Any], db: 'Database' = None,
+                 max_wait: float = 0.0):
+        if not keys:
+            raise ValueError("Gemini API key not provided in config or environment")
+        self.keys = keys
+        self.client_factory = client_factory
+        self.db = db
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        if db:
+            self._load_usage()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], client_factory: Callable[[str], Any], db: 'Database' = None,
+                    env_key: str = None) -> 'KeyPool':
+        """Keys from gemini_api_keys, then gemini_api_key / gemini_backup_api_key (or env_key)."""
+        limits = config.get('free_tier_limits') or {}
+        default_tpd = int(limits.get('gemini_daily_tokens') or DEFAULT_TOKENS_PER_DAY)
+        default_rpm = int(limits.get('gemini_rpm') or DEFAULT_RPM)
+        entries = list(config.get('gemini_api_keys') or [])
+        entries += [config.get('gemini_api_key') or env_key, config.get('gemini_backup_api_key')]
+        keys, seen = [], set()
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {'key': entry}
+            if not entry or not entry.get('key') or entry['key'] in seen:
+                continue
+            seen.add(entry['key'])
+            keys.append(ApiKey(entry['key'], int(entry.get('rpm', default_rpm)),
+                               int(entry.get('tokens_per_day', default_tpd))))
+        return cls(keys, client_factory, db, float(limits.get('gemini_max_key_wait', 60)))
+
+    def _load_usage(self):
+        cursor = self.db.conn.cursor()
+        for key in self.keys:
+            cursor.execute("SELECT tokens_used FROM api_key_usage WHERE key_id = ? AND date = ?", (key.key_id, key.day))
+            row = cursor.fetchone()
+            key.tokens_today = row[0] if row else 0
+
+    def acquire(self) -> ApiKey:
+        """Reserve one request on the key with the most headroom, waiting up to max_wait for one."""
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            try:
+                return self._try_acquire()
+            except NoKeyAvailable as e:
+                remaining = deadline - time.monotonic()
+                if e.retry_after is None or e.retry_after > remaining:
+                    raise
+                time.sleep(max(e.retry_after, 0.01))
+
+    def _try_acquire(self) -> ApiKey:
+        with self._lock:
+            now = time.monotonic()
+            best = max(self.keys, key=lambda k: k.capacity(now))
+            if best.capacity(now) <= 0:
+                raise NoKeyAvailable(f"All {len(self.keys)} Gemini keys are exhausted or unavailable",
+                                     self._next_free(now))
+            best.requests.append(now)
+            if best.client is None:
+                best.client = self.client_factory(best.key)
+            return best
+
+    def any_client(self):
+        """Client of a usable key without reserving a request (for calls outside the quota, e.g. models.list).
+
+        None when every key is benched, rejected or behind an open breaker.
+        """
+        with self._lock:
+            now = time.monotonic()
+            key = next((k for k in self.keys if k.available(now)), None)
+            if key is None:
+                return None
+            if key.client is None:
+                key.client = self.client_factory(key.key)
+            return key.client
+
+    def _next_free(self, now: float) -> Optional[float]:
+        waits = []
+        for k in self.keys:
+            if k.rejected or k.tokens_today >= k.tokens_per_day:
+                continue
+            wait = max(k.cooldown_until - now, 0.0)
+            if not k.breaker.allows_request():
+                wait = max(wait, k.breaker.recovery_timeout - (time.time() - k.breaker.last_failure_time))
+            if len(k.requests) >= k.rpm:
+                wait = max(wait, 60 - (now - k.requests[0]))
+            waits.append(wait)
+        return min(waits) if waits else None
+
+    def report_success(self, key: ApiKey, tokens: int = 0):
+        with self._lock:
+            key.tokens_today += tokens
+        if self.db:
+            with self.db.lock:
+                self.db.conn.execute(
+                    "INSERT INTO api_key_usage (key_id, date, requests, tokens_used) VALUES (?, ?, 1, ?) "
+                    "ON CONFLICT(key_id, date) DO UPDATE SET requests = requests + 1, tokens_used = tokens_used + ?",
+                    (key.key_id, key.day, tokens, tokens)
+                )
+                self.db.conn.commit()
+
+    def _save_breaker(self, key: ApiKey, before):
+        """Persist the key's breaker when a call changed it, so health_check.py can see it."""
+        breaker = key.breaker
+        if not self.db or (breaker.state, breaker.failure_count) == before:
+            return
+        with self.db.lock:
+            self.db.conn.execute(
+                "INSERT OR REPLACE INTO circuit_breaker_state "
+                "(name, state, failure_count, last_failure_time, recovery_timeout, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (breaker.name, breaker.state.value, breaker.failure_count, breaker.last_failure_time,
+                 breaker.recovery_timeout, datetime.now().isoformat())
+            )
+            self.db.conn.commit()
+
+    def report_failure(self, key: ApiKey, error: Exception) -> str:
+        """Apply the error to the key. Returns its classification."""
+        kind = classify_error(error)
+        with self._lock:
+            if kind == 'quota':
+                retry_after = getattr(error, 'retry_after', None)
+                key.cooldown_until = time.monotonic() + float(retry_after or QUOTA_COOLDOWN)
+            elif kind == 'auth':
+                key.rejected = True
+        return kind
+
+    def call(self, func: Callable[[Any], Any], tokens: Callable[[Any], int] = None):
+        """Run func(client) on the best key, moving to the next key after quota or auth errors."""
+        last_error = None
+        for _ in range(len(self.keys)):
+            try:
+                key = self.acquire()
+            except NoKeyAvailable:
+                if last_error:
+                    raise last_error
+                raise
+            before = (key.breaker.state, key.breaker.failure_count)
+            try:
+                result = key.breaker.call(func, key.client)
+            except Exception as e:
+                self._save_breaker(key, before)
+                if self.report_failure(key, e) == 'error':
+                    raise
+                last_error = e
+                continue
+            self._save_breaker(key, before)
+            self.report_success(key, tokens(result) if tokens else 0)
+            return result
+        raise last_error
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [k.status(now) for k in self.keys]
@@ -0,0 +1,268 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+# Default expansion vocabulary; override via niche.expansion in config.yaml
+DEFAULT_MODIFIERS = ['best', 'affordable', 'natural', 'vet recommended', 'organic', 'chewable']
+DEFAULT_BREEDS = [
+    'german shepherds', 'golden retrievers', 'labradors', 'pitbulls', 'bulldogs',
+    'beagles', 'poodles', 'rottweilers', 'boxers', 'dachshunds', 'huskies',
+    'great danes', 'corgis', 'border collies', 'chihuahuas', 'yorkies',
+    'senior dogs', 'puppies', 'large breeds', 'small breeds', 'rescue dogs',
+]
+DEFAULT_TEMPLATES = [
+    '{topic} for {breed}',
+    '{modifier} {topic} for {breed}',
+]
+
+_SPLIT_RE = re.compile(r'[^a-z0-9]+')
+STOPWORDS = {'for', 'the', 'a', 'an', 'and', 'of', 'to', 'with', 'in', 'on', 'my', 'your'}
+
+
+def _tokens(text: str) -> List[str]:
+    """Normalize a keyword or slug into stemmed tokens (plural 's' stripped, stopwords dropped)."""
+    words = _SPLIT_RE.split(text.lower())
+    out = []
+    for w in words:
+        if not w or w in STOPWORDS:
+            continue
+        if len(w) > 3 and w.endswith('s') and not w.endswith('ss'):
+            w = w[:-1]
+        out.append(w)
+    return out
+
+
+def shingles(text: str, toks: List[str] = None) -> Set[str]:
+    """Word unigrams plus adjacent bigrams of the normalized keyword."""
+    if toks is None:
+        toks = _tokens(text)
+    result = set(toks)
+    result.update(f"{a} {b}" for a, b in zip(toks, toks[1:]))
+    return result
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _ceil(x: float) -> int:
+    return math.ceil(x - 1e-9)
+
+
+class PrefixIndex:
+    """Exact Jaccard near-duplicate lookup by prefix filtering (PPJoin).
+
+    Shingles are ranked rarest first. Two sets with Jaccard >= t share at
+    least a = t/(1+t) * (|x| + |y|) shingles, so they share one among the
+    first |s| - a + 1 of each: a set is posted only under that prefix and a
+    query verifies just the sets sharing one of its prefix shingles (for
+    keyword variants, the rare words that tell them apart rather than the
+    topic they all share). Against queries at least as large as the set,
+    a >= 2t/(1+t) * |s|, so the set is posted under that shorter prefix for
+    them and under the full |s| - t*|s| + 1 only for smaller queries.
+
+    Ranks come from rank(); a shingle first seen later ranks before every
+    known one, which leaves the prefixes of indexed sets unchanged. Sets are
+    only compared within the same group.
+    """
+    def __init__(self, threshold: float = 0.6):
+        self.threshold = threshold
+        self._rank: Dict[str, int] = {}
+        self._next = 0  # every new rank is below this
+        # (group, shingle) -> set size -> ids; _long holds the part of the
+        # full prefix past the short one, looked up by smaller queries only
+        self._short: Dict[tuple, Dict[int, List[int]]] = {}
+        self._long: Dict[tuple, Dict[int, List[int]]] = {}
+        self._shingles: List[frozenset] = []
+        self._labels: List[str] = []
+
+    def __len__(self):
+        return len(self._labels)
+
+    def rank(self, counts: Dict[str, int]):
+        """Rank shingles not seen yet by their frequency in counts (rarest first)."""
+        for sh in sorted((s for s in counts if s not in self._rank), key=lambda s: (counts[s], s), reverse=True):
+            self._next -= 1
+            self._rank[sh] = self._next
+
+    def _order(self, sh: Set[str]) -> List[str]:
+        rank = self._rank
+        for s in sh:
+            if s not in rank:
+                self._next -= 1
+                rank[s] = self._next
+        return sorted(sh, key=rank.__getitem__)
+
+    def query(self, sh: Set[str], group: tuple = (), ordered: List[str] = None) -> Optional[str]:
+        """Return the label of an indexed item of the group at or above the threshold, if any."""
+        if ordered is None:
+            ordered = self._order(sh)
+        t = self.threshold
+        n = len(ordered)
+        lo, hi = t * n - 1e-9, n / t + 1e-9
+        shingles = self._shingles
+        seen = set()
+        for s in ordered[:n - _ceil(t * n) + 1]:
+            key = (group, s)
+            for postings, larger_only in ((self._short, False), (self._long, True)):
+                for m, ids in postings.get(key, {}).items():
+                    if m < lo or m > hi or (larger_only and m <= n):
+                        continue
+                    for idx in ids:
+                        if idx in seen:
+                            continue
+                        seen.add(idx)
+                        inter = len(sh & shingles[idx])
+                        # Jaccard >= t  <=>  inter >= t * |union|
+                        if inter >= t * (n + m - inter) - 1e-9:
+                            return self._labels[idx]
+        return None
+
+    def add(self, label: str, sh: Set[str], group: tuple = (), ordered: List[str] = None):
+        if ordered is None:
+            ordered = self._order(sh)
+        t = self.threshold
+        m = len(ordered)
+        idx = len(self._labels)
+        self._labels.append(label)
+        self._shingles.append(frozenset(sh))
+        short = m - _ceil(2 * t / (1 + t) * m) + 1
+        for i, s in enumerate(ordered[:m - _ceil(t * m) + 1]):
+            postings = self._short if i < short else self._long
+            postings.setdefault((group, s), {}).setdefault(m, []).append(idx)
+
+    def add_if_new(self, label: str, sh: Set[str], group: tuple = ()) -> Optional[str]:
+        """Index label unless a near-duplicate exists; returns the duplicate's label or None."""
+        ordered = self._order(sh)
+        dup = self.query(sh, group, ordered)
+        if dup is None:
+            self.add(label, sh, group, ordered)
+        return dup
+
+
+class KeywordExpander:
+    """Generates long-tail keyword variants from seeds and suppresses near-duplicates.
+
+    Existing keywords and already-published slugs are indexed first, so a
+    candidate that would cannibalize a live article is never queued.
+    """
+    def __init__(self, config, threshold: float = None):
+        self.config = config
+        niche = config.get('niche', {}) or {}
+        exp = niche.get('expansion', {}) or {}
+        self.modifiers = exp.get('modifiers', DEFAULT_MODIFIERS)
+        self.breeds = exp.get('breeds', DEFAULT_BREEDS)
+        self.templates = exp.get('templates', DEFAULT_TEMPLATES)
+        self.seeds = niche.get('seed_keywords', [])
+        self.threshold = threshold if threshold is not None else exp.get('similarity_threshold', 0.6)
+        self.index = PrefixIndex(threshold=self.threshold)
+        self._modifier_tokens = {tuple(_tokens(m)) for m in self.modifiers} - {()}
+        self._modifier_lens = sorted({len(m) for m in self._modifier_tokens})
+        self._exact: Set[tuple] = set()
+        self._pending: List[tuple] = []  # existing keywords, indexed once shingle ranks are known
+        self.suppressed = 0
+
+    def _split(self, toks: List[str]):
+        """Split toks into its modifiers and the remaining tokens.
+
+        Modifier variants are only compared with keywords carrying the same
+        modifiers, and on the remaining tokens, so the modifier words they
+        share don't make every variant a duplicate of the plain phrase or of
+        each other.
+        """
+        found = set()
+        covered = set()
+        for n in self._modifier_lens:
+            for i in range(len(toks) - n + 1):
+                gram = tuple(toks[i:i + n])
+                if gram in self._modifier_tokens:
+                    found.add(gram)
+                    covered.update(range(i, i + n))
+        if not found:
+            return (), toks
+        return tuple(sorted(found)), [t for i, t in enumerate(toks) if i not in covered]
+
+    @staticmethod
+    def split_seed(seed: str):
+        """Split 'hip_supplements_for_german_shepherds' into ('hip supplements', 'german shepherds')."""
+        text = seed.replace('_', ' ').replace('-', ' ').strip()
+        if ' for ' in text:
+            topic, audience = text.split(' for ', 1)
+            return topic.strip(), audience.strip()
+        return text, None
+
+    def add_existing(self, keywords: Iterable[str]):
+        """Index keywords (or slugs) that already exist so candidates are checked against them."""
+        for kw in keywords:
+            toks = _tokens(kw)
+            key = tuple(sorted(toks))
+            if key in self._exact:
+                continue
+            self._exact.add(key)
+            group, rest = self._split(toks)
+            self._pending.append((kw, shingles(kw, rest), group))
+
+    def add_published_slugs(self, repo_path: str, category: str = None):
+        """Treat published posts (of one category, if given) as existing keywords."""
+        posts_dir = os.path.join(repo_path, '_posts', *([category] if category else []))
+        if not os.path.isdir(posts_dir):
+            return
+        slugs = []
+        for root, _dirs, files in os.walk(posts_dir):
+            slugs.extend(os.path.splitext(f)[0] for f in files if f.endswith('.md'))
+        self.add_existing(slugs)
+
+    def generate(self, seeds: List[str] = None) -> Iterable[str]:
+        """Yield candidate keywords in underscore form; unmodified variants come first."""
+        topics = []
+        for seed in seeds if seeds is not None else self.seeds:
+            topic, _ = self.split_seed(seed)
+            if topic not in topics:
+                topics.append(topic)
+        plain = [t for t in self.templates if '{modifier}' not in t]
+        modified = [t for t in self.templates if '{modifier}' in t]
+        for templates, modifiers in ((plain, [None]), (modified, self.modifiers)):
+            for tpl in templates:
+                for topic in topics:
+                    for breed in self.breeds:
+                        for mod in modifiers:
+                            text = tpl.format(topic=topic, breed=breed, modifier=mod or '')
+                            yield '_'.join(text.split())
+
+    def add_candidates(self, candidates: Iterable[str]) -> List[str]:
+        """Return the candidates that are not near-duplicates of anything indexed so far."""
+        items = []
+        counts = Counter()
+        for kw in candidates:
+            toks = _tokens(kw)
+            group, rest = self._split(toks)
+            sh = shingles(kw, rest)
+            counts.update(sh)
+            items.append((kw, toks, sh, group))
+        for _kw, sh, _group in self._pending:
+            counts.update(sh)
+        self.index.rank(counts)
+        for kw, sh, group in self._pending:
+            self.index.add(kw, sh, group)
+        self._pending = []
+
+        accepted = []
+        for kw, toks, sh, group in items:
+            key = tuple(sorted(toks))
+            if key in self._exact:
+                self.suppressed += 1
+                continue
+            self._exact.add(key)
+            if self.index.add_if_new(kw, sh, group) is not None:
+                self.suppressed += 1
+                continue
+            accepted.append(kw)
+        return accepted
+
+    def expand(self, seeds: List[str] = None, limit: int = None) -> List[str]:
+        accepted = self.add_candidates(self.generate(seeds))
+        return accepted[:limit] if limit else accepted
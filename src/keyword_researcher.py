@@ -2,11 +2,15 @@ import json
 import os
 from datetime import datetime
 from .database import Database, get_or_create_keyword
+from .keyword_expander import KeywordExpander
+from .utils import slugify
 
 class KeywordResearcher:
-    def __init__(self, config, db: Database = None):
+    def __init__(self, config, db: Database = None, niche: str = None):
         self.config = config
         self.db = db or Database()
+        # Keyword namespace; None keeps the single-niche behaviour (all keywords)
+        self.niche = niche
         self.cache_file = 'data/keywords_cache.json'
         self.keywords = self._load_keywords()
 
@@ -14,27 +18,46 @@ class KeywordResearcher:
         # Load from database instead of file now
         # Seed keywords come from config on first run
         # Always ensure seed keywords are present
-        cursor = self.db.conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM keywords")
-        count = cursor.fetchone()[0]
+        count = self.db.count_keywords(self.niche)
         if count == 0:
             # Seed from config
             seed = self.config.get('niche', {}).get('seed_keywords', [])
             for kw in seed:
-                self.db.add_keyword(kw)
+                self.db.add_keyword(kw, self.niche)
         return []  # We'll query on demand
 
     def get_next_keywords(self, n):
-        rows = self.db.get_next_keywords(n)
+        rows = self.db.get_next_keywords(n, self.niche)
         self.keywords = [row['keyword'] for row in rows]
         return self.keywords
 
+    def expand_keywords(self, limit: int = None) -> list:
+        """Generate long-tail variants from seeds and queue the ones that won't cannibalize existing content."""
+        expander = KeywordExpander(self.config)
+        expander.add_existing(self.db.get_all_keyword_texts(self.niche))
+        repo_path = self.config.get('repo_path')
+        if repo_path:
+            expander.add_published_slugs(repo_path, self._category())
+        accepted = expander.expand(limit=limit)
+        added = self.db.add_keywords(accepted, self.niche)
+        self.db.log('keyword_researcher', 'expand_keywords',
+                    f'Queued {added} new keywords, suppressed {expander.suppressed} near-duplicates')
+        return accepted
+
+    def _category(self):
+        """Posts directory of this researcher's niche; None (all of _posts) without one."""
+        block = self.config.get('niche') or {}
+        if self.niche is None:
+            return None
+        return block.get('category') or slugify(block.get('name') or self.niche)
+
     def mark_completed(self, keyword: str):
-        self.db.mark_keyword_completed(keyword)
+        self.db.mark_keyword_completed(keyword, self.niche)
         self.db.log('keyword_researcher', 'mark_completed', f'Keyword {keyword} completed')
 
     def mark_failed(self, keyword: str, error: str = None):
-        kw_id = self.db.get_keyword_by_text(keyword)['id'] if self.db.get_keyword_by_text(keyword) else None
+        row = self.db.get_keyword_by_text(keyword, self.niche)
+        kw_id = row['id'] if row else None
         if kw_id:
             cursor = self.db.conn.cursor()
             cursor.execute(
@@ -0,0 +1,211 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+LOG_FILE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}(\.\d+)?\.jsonl(\.gz)?$')
+LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
+CORE_FIELDS = ('timestamp', 'level', 'module', 'message')
+
+
+class LogIndex:
+    """SQLite sidecar index over logs/*.jsonl (and rotated .jsonl.gz parts).
+
+    Each source file is tracked by a hash of its first line plus the byte
+    offset ingested so far, so refresh() only reads bytes appended since the
+    last run and a file that was renamed or gzipped by rotation is picked up
+    where it left off. Messages and extra fields go into an FTS5 table when
+    the SQLite build has it (LIKE scans otherwise).
+    """
+    def __init__(self, log_dir: str = 'logs', index_path: str = None):
+        self.log_dir = log_dir
+        self.index_path = index_path or os.path.join(log_dir, 'index.db')
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.index_path)
+        self.conn.row_factory = sqlite3.Row
+        self.fts = True
+        self._init_schema()
+
+    def _init_schema(self):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS log_sources (
+                head TEXT PRIMARY KEY,
+                name TEXT,
+                offset INTEGER DEFAULT 0,
+                complete INTEGER DEFAULT 0
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_sources_name ON log_sources(name)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS log_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts TEXT,
+                level TEXT,
+                module TEXT,
+                keyword TEXT,
+                message TEXT,
+                extra TEXT
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_entries_ts ON log_entries(ts)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_entries_level ON log_entries(level, ts)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_entries_module ON log_entries(module, ts)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_entries_keyword ON log_entries(keyword, ts)")
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5(
+                    message, extra, content='log_entries', content_rowid='id'
+                )
+            ''')
+        except sqlite3.OperationalError:
+            self.fts = False  # SQLite built without FTS5
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    # --- ingestion ------------------------------------------------------
+
+    def refresh(self) -> int:
+        """Ingest new lines from every log file. Returns the number of entries added."""
+        if not os.path.isdir(self.log_dir):
+            return 0
+        added = 0
+        for name in sorted(os.listdir(self.log_dir)):
+            if LOG_FILE_RE.match(name):
+                added += self._ingest_file(name)
+        return added
+
+    def _ingest_file(self, name: str) -> int:
+        gz = name.endswith('.gz')
+        cursor = self.conn.cursor()
+        if gz:
+            # Compressed parts never change; skip them once fully read.
+            cursor.execute("SELECT 1 FROM log_sources WHERE name = ? AND complete = 1", (name,))
+            if cursor.fetchone():
+                return 0
+        path = os.path.join(self.log_dir, name)
+        try:
+            f = gzip.open(path, 'rb') if gz else open(path, 'rb')
+        except OSError:
+            return 0
+        with f:
+            try:
+                first = f.readline()
+            except (OSError, EOFError):
+                return 0  # gzip still being written
+            if not first.endswith(b'\n'):
+                return 0
+            head = hashlib.sha1(first).hexdigest()
+            cursor.execute("SELECT offset, complete FROM log_sources WHERE head = ?", (head,))
+            row = cursor.fetchone()
+            offset = row['offset'] if row else 0
+            if row and row['complete']:
+                cursor.execute("UPDATE log_sources SET name = ? WHERE head = ?", (name, head))
+                self.conn.commit()
+                return 0
+            try:
+                if gz:
+                    f.seek(offset)  # decompresses and discards what was already indexed
+                    data = f.read()
+                else:
+                    if os.fstat(f.fileno()).st_size == offset:
+                        return 0
+                    f.seek(offset)
+                    data = f.read()
+            except (OSError, EOFError):
+                return 0
+        end = data.rfind(b'\n') + 1  # leave a partially written last line for next time
+        rows = [r for r in (self._parse(line) for line in data[:end].splitlines()) if r]
+        self._insert(rows)
+        cursor.execute(
+            "INSERT OR REPLACE INTO log_sources (head, name, offset, complete) VALUES (?, ?, ?, ?)",
+            (head, name, offset + end, 1 if gz else 0)
+        )
+        self.conn.commit()
+        return len(rows)
+
+    @staticmethod
+    def _parse(line: bytes) -> Optional[tuple]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(entry, dict):
+            return None
+        extra = {k: v for k, v in entry.items() if k not in CORE_FIELDS}
+        keyword = extra.get('keyword')
+        return (
+            str(entry.get('timestamp', '')),
+            str(entry.get('level', '')).upper(),
+            entry.get('module'),
+            keyword if isinstance(keyword, str) else None,
+            entry.get('message'),
+            json.dumps(extra, default=str) if extra else '',
+        )
+
+    def _insert(self, rows: List[tuple]):
+        if not rows:
+            return
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM log_entries")
+        first_id = cursor.fetchone()[0] + 1
+        cursor.executemany(
+            "INSERT INTO log_entries (id, ts, level, module, keyword, message, extra) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(first_id + i, *row) for i, row in enumerate(rows)]
+        )
+        if self.fts:
+            cursor.executemany(
+                "INSERT INTO log_fts (rowid, message, extra) VALUES (?, ?, ?)",
+                [(first_id + i, row[4], row[5]) for i, row in enumerate(rows)]
+            )
+
+    # --- queries --------------------------------------------------------
+
+    def query(self, since: datetime = None, until: datetime = None, level: str = None,
+              module: str = None, keyword: str = None, text: str = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Newest-first entries matching all given filters. `level` is a minimum severity."""
+        where, params = [], []
+        if since:
+            where.append("e.ts >= ?")
+            params.append(since.isoformat())
+        if until:
+            where.append("e.ts < ?")
+            params.append(until.isoformat())
+        if level:
+            level = level.upper()
+            allowed = LEVELS[LEVELS.index(level):] if level in LEVELS else [level]
+            where.append(f"e.level IN ({','.join('?' * len(allowed))})")
+            params.extend(allowed)
+        if module:
+            where.append("e.module = ?")
+            params.append(module)
+        if keyword:
+            where.append("e.keyword = ?")
+            params.append(keyword)
+        sql = "SELECT e.ts, e.level, e.module, e.keyword, e.message, e.extra FROM log_entries e"
+        if text and self.fts:
+            sql += " JOIN log_fts ON log_fts.rowid = e.id"
+            where.append("log_fts MATCH ?")
+            params.append(text)
+        elif text:
+            where.append("(e.message LIKE ? OR e.extra LIKE ?)")
+            params.extend([f'%{text}%'] * 2)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY e.ts DESC, e.id DESC LIMIT ?"
+        params.append(limit)
+        try:
+            rows = self.conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            if not (text and self.fts):
+                raise
+            # Not valid FTS syntax (e.g. stray quotes or operators): search it as a phrase
+            params[params.index(text)] = '"' + text.replace('"', '""') + '"'
+            rows = self.conn.execute(sql, params).fetchall()
+        return [dict(r) for r in rows]
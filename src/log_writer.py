@@ -0,0 +1,193 @@
+import atexit
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from .security import get_scrubber
+
+try:
+    import orjson
+except ImportError:  # optional fast serializer
+    orjson = None
+
+ROTATED_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})(\.\d+)?\.jsonl$')
+WRITER_OPTIONS = ('buffer_bytes', 'flush_interval', 'max_bytes', 'compress', 'serializer')
+
+
+def get_serializer(name: str = 'auto') -> Callable[[Dict[str, Any]], bytes]:
+    """'orjson', 'json' or 'auto' (orjson when installed). Returns entry -> line bytes."""
+    if name in ('auto', 'orjson') and orjson is not None:
+        opts = orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS
+        return lambda entry: orjson.dumps(entry, default=str, option=opts)
+    if name == 'orjson':
+        raise ImportError("orjson is not installed")
+    return lambda entry: (json.dumps(entry, default=str) + '\n').encode('utf-8')
+
+
+class JsonlWriter:
+    """Buffered, rotating writer for logs/<date>.jsonl.
+
+    Keeps one append handle open, buffers serialized lines and writes them in
+    a single write() when the buffer fills, on a background timer, or on
+    close/exit. All writes happen under one lock, so lines from concurrent
+    threads never interleave. Files roll over at midnight and when they pass
+    max_bytes; rolled files are gzipped by a background thread.
+    """
+    def __init__(self, log_dir: str = 'logs', buffer_bytes: int = 64 * 1024, flush_interval: float = 1.0,
+                 max_bytes: int = 50 * 1024 * 1024, compress: bool = True, serializer: str = 'auto'):
+        self.log_dir = os.path.abspath(log_dir)  # flushes may run after the cwd changed
+        self.buffer_bytes = buffer_bytes
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.serialize = get_serializer(serializer)
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._buffered = 0
+        self._file = None
+        self._date = None
+        self._size = 0
+        self._closed = False
+        self._compress_lock = threading.Lock()
+        self._compress_threads = []
+        self._stop = threading.Event()
+        os.makedirs(log_dir, exist_ok=True)
+        if compress:
+            self._compress_async(self._stale_files())
+        if flush_interval and flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name='jsonl-flusher', daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+
+    def write(self, entry: Dict[str, Any]):
+        line = get_scrubber().scrub_bytes(self.serialize(entry))
+        with self._lock:
+            if self._closed:
+                return
+            self._buffer.append(line)
+            self._buffered += len(line)
+            if self._buffered >= self.buffer_bytes:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._closed:
+                return
+            try:
+                self._flush_locked()
+            except OSError:
+                pass  # e.g. log directory removed before exit
+            self._closed = True
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    # --- internals ------------------------------------------------------
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                pass  # logging failure shouldn't crash the app
+
+    def _path(self, date_str: str) -> str:
+        return os.path.join(self.log_dir, f'{date_str}.jsonl')
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        data = b''.join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        date_str = datetime.now().strftime('%Y-%m-%d')
+        if self._file is None or date_str != self._date:
+            self._open(date_str)
+        elif self.max_bytes and self._size + len(data) > self.max_bytes and self._size > 0:
+            self._rotate_by_size()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+    def _open(self, date_str: str):
+        previous = self._date
+        if self._file:
+            self._file.close()
+        self._date = date_str
+        path = self._path(date_str)
+        self._file = open(path, 'ab')
+        self._size = self._file.tell()
+        if previous and previous != date_str:
+            self._compress_async([self._path(previous)])
+
+    def _rotate_by_size(self):
+        self._file.close()
+        path = self._path(self._date)
+        n = 1
+        while os.path.exists(os.path.join(self.log_dir, f'{self._date}.{n}.jsonl')) or \
+                os.path.exists(os.path.join(self.log_dir, f'{self._date}.{n}.jsonl.gz')):
+            n += 1
+        rotated = os.path.join(self.log_dir, f'{self._date}.{n}.jsonl')
+        os.replace(path, rotated)
+        self._file = open(path, 'ab')
+        self._size = 0
+        self._compress_async([rotated])
+
+    def _stale_files(self):
+        """Uncompressed logs from previous days, plus any size-rotated parts."""
+        today = datetime.now().strftime('%Y-%m-%d')
+        stale = []
+        for name in os.listdir(self.log_dir):
+            m = ROTATED_RE.match(name)
+            if m and (m.group(1) < today or m.group(2)):
+                stale.append(os.path.join(self.log_dir, name))
+        return sorted(stale)
+
+    def _compress_async(self, paths):
+        if not self.compress or not paths:
+            return
+        t = threading.Thread(target=self._compress, args=(list(paths),), name='jsonl-gzip', daemon=True)
+        self._compress_threads = [th for th in self._compress_threads if th.is_alive()] + [t]
+        t.start()
+
+    def _compress(self, paths):
+        with self._compress_lock:
+            for path in paths:
+                try:
+                    gz_path = path + '.gz'
+                    tmp = gz_path + '.tmp'
+                    with open(path, 'rb') as src, gzip.open(tmp, 'wb', compresslevel=6) as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                    os.replace(tmp, gz_path)
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def wait_for_compression(self):
+        """Block until background gzip jobs started so far have finished."""
+        for t in list(self._compress_threads):
+            t.join()
+
+
+_writers: Dict[str, JsonlWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(log_dir: str = 'logs', options: Optional[Dict[str, Any]] = None) -> JsonlWriter:
+    """One shared writer per log directory, so every StructuredLogger in a process uses the same handle."""
+    key = os.path.abspath(log_dir)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None or writer._closed:
+            kwargs = {k: v for k, v in (options or {}).items() if k in WRITER_OPTIONS}
+            writer = _writers[key] = JsonlWriter(log_dir, **kwargs)
+        return writer
@@ -3,24 +3,30 @@ import os
 from datetime import datetime
 from typing import Dict, Any, Optional
 import yaml
+from .log_writer import get_writer
+from .security import install_scrubber, scrub
 
 class StructuredLogger:
     def __init__(self, config: Dict[str, Any], db: 'Database'):
         self.config = config
         self.db = db
+        # Every sink (JSONL, audit_log, Obsidian, Discord) masks this config's secrets
+        self.scrubber = install_scrubber(config)
         self.log_dir = 'logs'
         os.makedirs(self.log_dir, exist_ok=True)
+        # Shared buffered writer; tune via the `logging:` block in config.yaml
+        self.writer = get_writer(self.log_dir, (config or {}).get('logging'))
 
     def _write_json_log(self, entry: Dict[str, Any]):
-        """Write JSON log to daily file."""
-        date_str = datetime.now().strftime('%Y-%m-%d')
-        log_file = os.path.join(self.log_dir, f'{date_str}.jsonl')
+        """Queue JSON log entry for the daily file (flushed by the shared writer)."""
         try:
-            with open(log_file, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(entry) + '\n')
+            self.writer.write(entry)
         except Exception as e:
             pass  # logging failure shouldn't crash the app
 
+    def flush(self):
+        self.writer.flush()
+
     def log(self, level: str, module: str, message: str, **kwargs):
         entry = {
             'timestamp': datetime.now().isoformat(),
@@ -62,7 +68,7 @@ class StructuredLogger:
             content = f"{emoji} **{entry['level']}** in `{entry['module']}`\n{entry['message']}"
             if 'exception' in entry:
                 content += f"\n```\n{entry['exception'][:500]}\n```"
-            data = {"content": content, "username": "Income Bot Alert"}
+            data = {"content": scrub(content), "username": "Income Bot Alert"}
             requests.post(webhook_url, json=data, timeout=5)
         except Exception:
             pass  # Discord failure shouldn't cascade
\ No newline at end of file
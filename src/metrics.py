@@ -1,40 +1,57 @@
+import json
+import os
 from datetime import datetime
 from typing import Dict, Any
-from .database import Database
+from .concurrency import limiter_stats
+from .database import Database, ROLLUP_PERIODS
 
 class MetricsCollector:
     def __init__(self, db: Database):
         self.db = db
+        # Databases from before rollups existed get their overall rollups backfilled once
+        if not self.db.get_maintenance_run('rollups_backfill'):
+            self.db.rebuild_rollups()
+            self.db.set_maintenance_run('rollups_backfill', datetime.now().isoformat())
 
-    def increment(self, **counters: int):
-        """Increment daily metrics counters."""
-        self.db.increment_metric(**counters)
+    def increment(self, niche: str = None, model: str = None, **counters: int):
+        """Increment daily metrics counters (and their weekly/monthly rollups)."""
+        self.db.increment_metric(niche=niche, model=model, **counters)
 
-    def record_article_published(self, tokens_used: int):
-        self.increment(articles_published=1, tokens_used=tokens_used, api_calls=1)
+    def record_article_published(self, tokens_used: int, niche: str = None, model: str = None):
+        self.increment(niche=niche, model=model, articles_published=1, tokens_used=tokens_used, api_calls=1)
 
-    def record_error(self):
-        self.increment(errors=1)
+    def record_error(self, niche: str = None, model: str = None):
+        self.increment(niche=niche, model=model, errors=1)
 
     def get_daily_metrics(self, days: int = 7) -> Dict[str, Any]:
-        rows = self.db.get_recent_metrics(days)
+        totals = self.db.get_metric_totals(days)
         return {
             'period_days': days,
-            'daily': rows,
-            'totals': {
-                'articles_published': sum(r.get('articles_published', 0) for r in rows),
-                'api_calls': sum(r.get('api_calls', 0) for r in rows),
-                'tokens_used': sum(r.get('tokens_used', 0) for r in rows),
-                'errors': sum(r.get('errors', 0) for r in rows),
-            }
+            'daily': self.db.get_recent_metrics(days),
+            'totals': {k: totals[k] for k in ('articles_published', 'api_calls', 'tokens_used', 'tokens_cached', 'errors')},
         }
 
     def generate_dashboard_data(self) -> Dict[str, Any]:
-        """Generate data for health dashboard."""
+        """Generate data for health dashboard from the daily table and the rollups."""
         metrics = self.get_daily_metrics(14)
-        # Add system status
+        month = datetime.now().strftime(ROLLUP_PERIODS['month'])
         return {
             'generated_at': datetime.now().isoformat(),
             'metrics': metrics,
+            'weekly': self.db.get_rollups('week', limit=12),
+            'monthly': self.db.get_rollups('month', limit=12),
+            'by_niche': self.db.get_rollups('month', 'niche', bucket=month),
+            'by_model': self.db.get_rollups('month', 'model', bucket=month),
+            # Current limit, outcome counts and recent decisions of each upstream's limiter
+            'concurrency': limiter_stats(),
             'status': 'HEALTHY' if metrics['totals']['errors'] == 0 else 'DEGRADED'
-        }
\ No newline at end of file
+        }
+
+    def write_dashboard_snapshot(self, path: str = 'dashboard_data.json') -> Dict[str, Any]:
+        """Write generate_dashboard_data() to `path` atomically for health_dashboard.html."""
+        data = self.generate_dashboard_data()
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+        return data
@@ -0,0 +1,203 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .timing import percentile
+
+DEFAULT_MODELS = [{'name': 'gemma-3-4b-it'}]
+
+
+class ModelCatalog:
+    """Model names the API offers, cached in a JSON file and refreshed every refresh_hours."""
+    def __init__(self, path: str = 'data/model_catalog.json', refresh_hours: float = 24):
+        self.path = path
+        self.refresh_hours = refresh_hours
+        self._data = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @property
+    def models(self) -> Optional[List[str]]:
+        """Cached model names, or None if the catalog was never fetched."""
+        return self._data.get('models')
+
+    @property
+    def fetched_at(self) -> Optional[str]:
+        return self._data.get('fetched_at')
+
+    @property
+    def stale(self) -> bool:
+        if not self.fetched_at:
+            return True
+        return datetime.fromisoformat(self.fetched_at) < datetime.now() - timedelta(hours=self.refresh_hours)
+
+    def refresh(self, client) -> List[str]:
+        """Fetch the model list with a genai client and rewrite the cache file."""
+        names = sorted(m.name.split('/', 1)[-1] for m in client.models.list())
+        self._data = {'fetched_at': datetime.now().isoformat(), 'models': names}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, indent=2)
+        os.replace(tmp, self.path)
+        return names
+
+
+class ModelRouter:
+    """Picks the model for each generate call from configured tiers.
+
+    Models are listed under models.tiers in preference order, each with an
+    optional tier number (default: its position), cost_per_1k_tokens and
+    max_p95_ms. A model is healthy while its p95 latency and error rate over
+    the last window_minutes stay within limits (models with fewer than
+    min_samples calls count as healthy, which also lets a benched model be
+    probed again once its bad samples age out). choose() returns the
+    cheapest, then fastest, healthy model of the best tier; if none is
+    healthy it falls back to the model with the lowest error rate and p95.
+    Every call is recorded in model_calls together with why the model was
+    chosen, so decisions can be audited with run.py --models.
+    """
+    def __init__(self, config: Dict[str, Any], db: 'Database' = None, catalog: ModelCatalog = None):
+        settings = config.get('models') or {}
+        self.db = db
+        self.models = []
+        for i, entry in enumerate(settings.get('tiers') or DEFAULT_MODELS):
+            entry = {'name': entry} if isinstance(entry, str) else dict(entry)
+            entry.setdefault('tier', i)
+            self.models.append(entry)
+        self.window = timedelta(minutes=float(settings.get('window_minutes', 30)))
+        self.min_samples = int(settings.get('min_samples', 5))
+        self.max_error_rate = float(settings.get('max_error_rate', 0.3))
+        self.catalog = catalog or ModelCatalog(settings.get('catalog_path', 'data/model_catalog.json'),
+                                               float(settings.get('catalog_refresh_hours', 24)))
+        self._samples: Dict[str, deque] = {m['name']: deque() for m in self.models}  # (unix_ts, latency_ms, ok, tokens)
+        self._lock = threading.Lock()
+        if db:
+            self._load_samples()
+
+    def _load_samples(self):
+        cutoff = (datetime.now() - self.window).isoformat()
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT model, timestamp, latency_ms, ok, tokens FROM model_calls WHERE timestamp >= ? ORDER BY timestamp",
+            (cutoff,)
+        )
+        for row in cursor.fetchall():
+            if row['model'] in self._samples:
+                ts = datetime.fromisoformat(row['timestamp']).timestamp()
+                self._samples[row['model']].append((ts, row['latency_ms'], bool(row['ok']), row['tokens']))
+
+    def stats(self, model: str, now: float = None) -> Dict[str, Any]:
+        """p50/p95 latency (ms), error rate and mean tokens over the window."""
+        now = time.time() if now is None else now
+        samples = self._samples.setdefault(model, deque())
+        while samples and samples[0][0] < now - self.window.total_seconds():
+            samples.popleft()
+        latencies = sorted(s[1] for s in samples if s[2])
+        tokens = [s[3] for s in samples if s[2]]
+        return {
+            'model': model,
+            'calls': len(samples),
+            'errors': sum(1 for s in samples if not s[2]),
+            'error_rate': sum(1 for s in samples if not s[2]) / len(samples) if samples else 0.0,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'mean_tokens': sum(tokens) / len(tokens) if tokens else 0.0,
+        }
+
+    def _health(self, model: Dict[str, Any], stats: Dict[str, Any]) -> Optional[str]:
+        """None when healthy, else the reason the model is benched."""
+        if stats['calls'] < self.min_samples:
+            return None
+        if stats['error_rate'] > self.max_error_rate:
+            return f"error rate {stats['error_rate']:.0%}"
+        limit = model.get('max_p95_ms')
+        if limit and stats['p95_ms'] > float(limit):
+            return f"p95 {stats['p95_ms']:.0f}ms > {float(limit):.0f}ms"
+        return None
+
+    def choose(self, exclude: Iterable[str] = ()) -> Tuple[str, str]:
+        """(model, reason) for the next request."""
+        with self._lock:
+            offered = self.catalog.models
+            candidates = [m for m in self.models if m['name'] not in exclude
+                          and (offered is None or m['name'] in offered)]
+            if not candidates:
+                candidates = [m for m in self.models if m['name'] not in exclude] or self.models
+            now = time.time()
+            scored, benched = [], []
+            for m in candidates:
+                stats = self.stats(m['name'], now)
+                cost = float(m.get('cost_per_1k_tokens', 0)) * stats['mean_tokens'] / 1000
+                problem = self._health(m, stats)
+                if problem:
+                    benched.append((stats['error_rate'], stats['p95_ms'], m['name'], problem))
+                else:
+                    scored.append((m['tier'], cost, stats['p95_ms'], m['name']))
+            if scored:
+                tier, cost, p95, name = min(scored)
+                reason = f"tier {tier}, est. cost {cost:.4f}, p95 {p95:.0f}ms"
+                if benched:
+                    reason += '; benched ' + ', '.join(f"{b[2]} ({b[3]})" for b in sorted(benched, key=lambda b: b[2]))
+                return name, reason
+            _err, _p95, name, problem = min(benched)
+            return name, f"no healthy model, least degraded ({problem})"
+
+    def record(self, model: str, latency: float, ok: bool, tokens: int = 0, reason: str = None):
+        """Add one call's outcome (latency in seconds)."""
+        now = time.time()
+        with self._lock:
+            self._samples.setdefault(model, deque()).append((now, latency * 1000, ok, tokens))
+        if self.db:
+            with self.db.lock:
+                self.db.conn.execute(
+                    "INSERT INTO model_calls (timestamp, model, latency_ms, ok, tokens, reason) VALUES (?, ?, ?, ?, ?, ?)",
+                    (datetime.fromtimestamp(now).isoformat(), model, latency * 1000, int(ok), tokens, reason)
+                )
+                self.db.conn.commit()
+
+    def refresh_catalog(self, client) -> bool:
+        """Refresh the model catalog if it is stale. Returns True if it was fetched.
+
+        With no client (no usable key) the refresh is skipped and the cached catalog kept.
+        """
+        if client is None or not self.catalog.stale:
+            return False
+        try:
+            self.catalog.refresh(client)
+            return True
+        except Exception:
+            return False  # keep routing on the cached (or unfiltered) list
+
+
+def model_call_stats(db: 'Database', since: datetime = None) -> List[Dict[str, Any]]:
+    """Per-model calls, error rate and latency percentiles from model_calls."""
+    cursor = db.conn.cursor()
+    cursor.execute(
+        "SELECT model, latency_ms, ok, tokens FROM model_calls WHERE timestamp >= ? ORDER BY model",
+        ((since or datetime.min).isoformat(),)
+    )
+    grouped: Dict[str, List[Any]] = {}
+    for row in cursor.fetchall():
+        grouped.setdefault(row['model'], []).append(row)
+    results = []
+    for model, rows in grouped.items():
+        latencies = sorted(r['latency_ms'] for r in rows if r['ok'])
+        errors = sum(1 for r in rows if not r['ok'])
+        results.append({
+            'model': model,
+            'calls': len(rows),
+            'error_rate': errors / len(rows),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'tokens': sum(r['tokens'] or 0 for r in rows),
+        })
+    return results
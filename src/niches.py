@@ -0,0 +1,130 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+from .utils import slugify
+
+
+@dataclass(frozen=True)
+class Niche:
+    """One entry of `niches:` (or the legacy single `niche:` block)."""
+    name: str
+    category: str
+    weight: float = 1.0
+    seed_keywords: List[str] = field(default_factory=list)
+    prompt_template: Optional[str] = None
+    settings: Dict[str, Any] = field(default_factory=dict, compare=False)
+
+
+def load_niches(config: Dict[str, Any]) -> List[Niche]:
+    """Niches from config, in declaration order. The first one is the default."""
+    blocks = config.get('niches') or ([config['niche']] if config.get('niche') else [])
+    niches = []
+    for block in blocks:
+        name = block['name']
+        niches.append(Niche(
+            name=name,
+            category=block.get('category') or slugify(name),
+            weight=float(block.get('weight', 1.0)),
+            seed_keywords=list(block.get('seed_keywords') or []),
+            prompt_template=block.get('prompt_template'),
+            settings=block,
+        ))
+    return niches
+
+
+def niche_config(config: Dict[str, Any], niche: Niche) -> Dict[str, Any]:
+    """Copy of config whose `niche` block is this niche, for the per-niche components."""
+    scoped = dict(config)
+    scoped['niche'] = niche.settings
+    return scoped
+
+
+class NicheScheduler:
+    """Weighted fair sharing of runs and Gemini tokens between niches.
+
+    Start-time fair queueing: serving a niche starts at max(its finish time,
+    the virtual clock) and moves its finish time on by cost / weight, where
+    cost is the tokens the run used (at least min_cost, so failed or stubbed
+    runs still count). pick() returns the niche with pending keywords and the
+    earliest start; the clock is the latest start handed out, so a niche that
+    sat idle rejoins at the current clock instead of spending banked credit.
+    State lives in the niche_schedule table, so shares hold across runs.
+    """
+    def __init__(self, niches: List[Niche], db: 'Database', min_cost: int = 1000):
+        if not niches:
+            raise ValueError("No niches configured")
+        self.niches = niches
+        self.db = db
+        self.min_cost = min_cost
+        db.assign_unscoped_keywords(niches[0].name)
+        cursor = db.conn.cursor()
+        cursor.executemany("INSERT OR IGNORE INTO niche_schedule (niche) VALUES (?)", [(n.name,) for n in niches])
+        db.conn.commit()
+
+    def _state(self) -> Dict[str, Dict[str, Any]]:
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT * FROM niche_schedule")
+        return {row['niche']: dict(row) for row in cursor.fetchall()}
+
+    @staticmethod
+    def _clock(state: Dict[str, Dict[str, Any]]) -> float:
+        return max((row['vstart'] for row in state.values()), default=0.0)
+
+    def pick(self, exclude: Iterable[str] = ()) -> Optional[Niche]:
+        """Next niche to serve, or None when no niche has pending keywords."""
+        pending = self.db.count_pending_by_niche()
+        ready = [n for n in self.niches if pending.get(n.name) and n.name not in exclude]
+        if not ready:
+            return None
+        state = self._state()
+        clock = self._clock(state)
+        return min(ready, key=lambda n: (max(state[n.name]['vtime'], clock), -n.weight))
+
+    def plan(self, n: int) -> List[Niche]:
+        """The niches of the next n runs, in order, for claiming a batch of keywords up front.
+
+        Simulates pick() and charge() without writing, costing each run at
+        its niche's average tokens per run so far; callers still charge() the
+        tokens each run actually used.
+        """
+        pending = self.db.count_pending_by_niche()
+        state = self._state()
+        picks = []
+        for _ in range(n):
+            ready = [niche for niche in self.niches if pending.get(niche.name)]
+            if not ready:
+                break
+            clock = self._clock(state)
+            niche = min(ready, key=lambda x: (max(state[x.name]['vtime'], clock), -x.weight))
+            row = state[niche.name]
+            cost = max(row['tokens_used'] / row['runs'] if row['runs'] else 0, self.min_cost)
+            row['vstart'] = max(row['vtime'], clock)
+            row['vtime'] = row['vstart'] + cost / niche.weight
+            pending[niche.name] -= 1
+            picks.append(niche)
+        return picks
+
+    def charge(self, niche: Niche, tokens_used: int = 0):
+        """Account one run of `niche` that consumed tokens_used."""
+        tokens_used = int(tokens_used or 0)
+        state = self._state()
+        start = max(state[niche.name]['vtime'], self._clock(state))
+        self.db.conn.execute(
+            "UPDATE niche_schedule SET vstart = ?, vtime = ?, runs = runs + 1, tokens_used = tokens_used + ? "
+            "WHERE niche = ?",
+            (start, start + max(tokens_used, self.min_cost) / niche.weight, tokens_used, niche.name)
+        )
+        self.db.conn.commit()
+
+    def shares(self) -> List[Dict[str, Any]]:
+        """Runs and tokens per configured niche, with the configured and observed share."""
+        state = self._state()
+        total_weight = sum(n.weight for n in self.niches)
+        total_tokens = sum(state[n.name]['tokens_used'] for n in self.niches) or 1
+        return [{
+            'niche': n.name,
+            'weight': n.weight,
+            'target_share': n.weight / total_weight,
+            'runs': state[n.name]['runs'],
+            'tokens_used': state[n.name]['tokens_used'],
+            'token_share': state[n.name]['tokens_used'] / total_tokens,
+        } for n in self.niches]
@@ -1,29 +1,138 @@
 import os
-import json
+import atexit
+import threading
 from datetime import datetime
-import yaml
+from typing import Any, Dict, Optional
+try:
+    from .security import scrub
+except ImportError:  # run as a script: python src/obsidian_logger.py
+    from security import scrub
 
-def log_to_obsidian(vault_path=None, entry=None, category='IncomeBot'):
-    if not vault_path:
+
+class ObsidianJournal:
+    """Appends entries to <vault>/<category>/<date>.md in batches.
+
+    write() only formats the entry and queues it; a background thread writes
+    queued entries every flush_interval seconds (sooner once max_batch are
+    waiting) through one file handle that is kept open and swapped when the
+    date changes. Pending entries are flushed on close() and at exit.
+    """
+    def __init__(self, vault_path: str, category: str = 'IncomeBot', flush_interval: float = 5.0,
+                 max_batch: int = 50):
+        self.base_dir = os.path.join(vault_path, category)
+        os.makedirs(self.base_dir, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending = []  # (date_str, text)
+        self._lock = threading.Lock()       # guards _pending
+        self._file_lock = threading.Lock()  # guards the handle and write order
+        self._file = None
+        self._date = None
+        self._wake = threading.Event()
+        self._closed = False
+        if flush_interval and flush_interval > 0:
+            self._thread = threading.Thread(target=self._flush_loop, name='obsidian-journal', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, entry: str):
+        now = datetime.now()
+        text = f"## {now.strftime('%H:%M')}\n\n{scrub(str(entry))}\n\n---\n\n"
+        with self._lock:
+            if self._closed:
+                return
+            self._pending.append((now.strftime('%Y-%m-%d'), text))
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._file_lock:  # held while draining so batches land in order
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            i = 0
+            while i < len(batch):
+                date_str = batch[i][0]
+                j = i
+                while j < len(batch) and batch[j][0] == date_str:
+                    j += 1
+                if date_str != self._date or self._file is None:
+                    self._open(date_str)
+                self._file.write(''.join(text for _d, text in batch[i:j]))
+                i = j
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wake.set()
         try:
-            with open('config.yaml') as f:
-                cfg = yaml.safe_load(f)
-                vault_path = cfg.get('obsidian_vault_path')
-        except:
-            vault_path = os.getenv('OBSIDIAN_VAULT_PATH')
+            self.flush()
+            with self._file_lock:
+                if self._file:
+                    self._file.close()
+                    self._file = None
+        except OSError:
+            pass  # journaling must never fail shutdown
+
+    def _open(self, date_str: str):
+        if self._file:
+            self._file.close()
+        self._file = open(os.path.join(self.base_dir, f'{date_str}.md'), 'a', encoding='utf-8')
+        self._date = date_str
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._closed:
+                return
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+
+_journals: Dict[tuple, ObsidianJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(vault_path: str, category: str = 'IncomeBot', options: Optional[Dict[str, Any]] = None) -> ObsidianJournal:
+    """One shared journal per (vault, category) in the process."""
+    key = (os.path.abspath(vault_path), category)
+    with _journals_lock:
+        journal = _journals.get(key)
+        if journal is None or journal._closed:
+            opts = {k: v for k, v in (options or {}).items() if k in ('flush_interval', 'max_batch')}
+            journal = _journals[key] = ObsidianJournal(vault_path, category, **opts)
+        return journal
+
+
+def _resolve_default_vault() -> Optional[str]:
+    """Vault path from the shared config (or OBSIDIAN_VAULT_PATH)."""
+    try:
+        from .config import get_settings
+        settings = get_settings()
+    except Exception:
+        settings = None
+    return settings.obsidian_vault_path if settings else os.getenv('OBSIDIAN_VAULT_PATH')
+
+
+def log_to_obsidian(vault_path=None, entry=None, category='IncomeBot'):
+    """Queue an entry for the daily note. Returns False when no vault is configured."""
+    vault_path = vault_path or _resolve_default_vault()
     if not vault_path:
         print("No Obsidian vault path configured")
         return False
-    base_dir = os.path.join(vault_path, category)
-    os.makedirs(base_dir, exist_ok=True)
-    date_str = datetime.now().strftime('%Y-%m-%d')
-    filepath = os.path.join(base_dir, f'{date_str}.md')
-    timestamp = datetime.now().strftime('%H:%M')
-    content = f"## {timestamp}\n\n{entry}\n\n---\n\n"
-    with open(filepath, 'a', encoding='utf-8') as f:
-        f.write(content)
-    print(f"✅ Logged to Obsidian: {filepath}")
+    get_journal(vault_path, category).write(entry)
     return True
 
 if __name__ == '__main__':
-    log_to_obsidian(entry="Test log from Income Bot")
\ No newline at end of file
+    if log_to_obsidian(entry="Test log from Income Bot"):
+        for journal in list(_journals.values()):
+            journal.close()
+        print(f"✅ Logged to Obsidian: {journal.base_dir}")
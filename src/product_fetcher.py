@@ -1,45 +1,40 @@
+from typing import Dict, List
 from .cache import TTLCache
+from .product_providers import ProductProvider, get_provider
 
 class ProductFetcher:
-    def __init__(self, config, cache: TTLCache = None):
+    def __init__(self, config, cache: TTLCache = None, provider: ProductProvider = None):
         self.config = config
         self.amazon_tracking_id = config.get('amazon_tracking_id')
         self.cache = cache or TTLCache(ttl_seconds=86400)  # cache 24h
+        self.provider = provider or get_provider(config)
 
     def fetch_products(self, keyword):
-        # Check cache first
-        cached = self.cache.get(keyword)
-        if cached:
-            return cached
-        # Generate plausible mock products (in real impl, would call Amazon PA-API or scrape)
-        base = keyword.replace('_', ' ')
-        products = [
-            {
-                'name': f"Best {base} - Premium Choice",
-                'price': 49.99,
-                'rating': 4.7,
-                'asin': f"B{abs(hash(keyword)) % 10000000000}",
-                'url': self._build_amazon_url(f"B{abs(hash(keyword)) % 10000000000}")
-            },
-            {
-                'name': f"{base} Pro Kit",
-                'price': 79.99,
-                'rating': 4.5,
-                'asin': f"B{abs(hash(keyword)+1) % 10000000000}",
-                'url': self._build_amazon_url(f"B{abs(hash(keyword)+1) % 10000000000}")
-            },
-            {
-                'name': f"Value {base}",
-                'price': 29.99,
-                'rating': 4.3,
-                'asin': f"B{abs(hash(keyword)+2) % 10000000000}",
-                'url': self._build_amazon_url(f"B{abs(hash(keyword)+2) % 10000000000}")
-            }
-        ]
-        self.cache.set(keyword, products)
-        return products
+        return self.fetch_products_batch([keyword]).get(keyword, [])
+
+    def fetch_products_batch(self, keywords: List[str]) -> Dict[str, List[dict]]:
+        """Fetch products for many keywords; cache misses go to the provider in batches."""
+        results = {}
+        misses = []
+        for keyword in keywords:
+            cached = self.cache.get(keyword)
+            if cached:
+                results[keyword] = cached
+            elif keyword not in misses:
+                misses.append(keyword)
+        if misses:
+            fetched = self.provider.lookup(misses)
+            for keyword in misses:
+                products = fetched.get(keyword) or []
+                for p in products:
+                    if p.get('asin') and not p.get('url'):
+                        p['url'] = self._build_amazon_url(p['asin'])
+                if products:
+                    self.cache.set(keyword, products)
+                results[keyword] = products
+        return results
 
     def _build_amazon_url(self, asin):
         if self.amazon_tracking_id:
             return f"https://www.amazon.com/dp/{asin}?tag={self.amazon_tracking_id}"
-        return f"https://www.amazon.com/dp/{asin}"
\ No newline at end of file
+        return f"https://www.amazon.com/dp/{asin}"
@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Dict, List
+from .concurrency import AdaptiveLimiter, get_limiter
+from .utils import stable_hash
+
+
+def stable_asin(keyword: str, index: int = 0) -> str:
+    """Deterministic 10-character ASIN-like ID for a keyword/product slot."""
+    return f"B{stable_hash(f'{keyword}#{index}') % 10**9:09d}"
+
+
+class ProductProvider:
+    """Base class for product sources. Subclasses implement fetch_batch()."""
+    def __init__(self, batch_size: int = 10, limiter: AdaptiveLimiter = None):
+        self.batch_size = max(1, batch_size)
+        self.limiter = limiter
+        self.round_trips = 0
+        self._lock = Lock()
+
+    def fetch_batch(self, keywords: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Look up products for up to batch_size keywords in a single request."""
+        raise NotImplementedError
+
+    def lookup(self, keywords: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Look up any number of keywords, chunked into batch_size requests.
+
+        With a limiter, chunks are requested concurrently within its limit.
+        """
+        chunks = [keywords[i:i + self.batch_size] for i in range(0, len(keywords), self.batch_size)]
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        if self.limiter and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.limiter.max_limit, len(chunks))) as executor:
+                for batch in executor.map(self._fetch_chunk, chunks):
+                    results.update(batch)
+        else:
+            for chunk in chunks:
+                results.update(self._fetch_chunk(chunk))
+        return results
+
+    def _fetch_chunk(self, chunk: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            self.round_trips += 1
+        if self.limiter:
+            return self.limiter.call(self.fetch_batch, chunk)
+        return self.fetch_batch(chunk)
+
+    def close(self):
+        pass
+
+
+class StubProductProvider(ProductProvider):
+    """Local, offline provider returning deterministic placeholder products.
+
+    Used until a real affiliate API is configured, and in tests; round_trips
+    counts how many batch requests a real backend would have received.
+    """
+    TEMPLATES = [
+        ("Best {base} - Premium Choice", 49.99, 4.7),
+        ("{base} Pro Kit", 79.99, 4.5),
+        ("Value {base}", 29.99, 4.3),
+    ]
+
+    def fetch_batch(self, keywords):
+        results = {}
+        for keyword in keywords:
+            base = keyword.replace('_', ' ')
+            results[keyword] = [
+                {
+                    'name': name.format(base=base),
+                    'price': price,
+                    'rating': rating,
+                    'asin': stable_asin(keyword, i),
+                }
+                for i, (name, price, rating) in enumerate(self.TEMPLATES)
+            ]
+        return results
+
+
+class HttpProductProvider(ProductProvider):
+    """JSON-over-HTTP provider that sends many keywords per request.
+
+    Expects POST {endpoint} with {"keywords": [...]} and a response of
+    {"results": {keyword: [{"name", "price", "rating", "asin"}, ...]}}.
+    Connections are pooled on a single requests.Session.
+    """
+    def __init__(self, endpoint: str, api_key: str = None, batch_size: int = 10,
+                 timeout: float = 10, pool_size: int = 4, limiter: AdaptiveLimiter = None):
+        super().__init__(batch_size, limiter)
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if api_key:
+            self.session.headers['Authorization'] = f'Bearer {api_key}'
+
+    def fetch_batch(self, keywords):
+        resp = self.session.post(self.endpoint, json={'keywords': keywords}, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json().get('results', {})
+
+    def close(self):
+        self.session.close()
+
+
+def get_provider(config) -> ProductProvider:
+    """Build the provider described by config['product_provider'] (defaults to the stub)."""
+    opts = config.get('product_provider') or {}
+    kind = opts.get('type', 'stub')
+    batch_size = opts.get('batch_size', 10)
+    if kind == 'stub':
+        return StubProductProvider(batch_size=batch_size)
+    if kind == 'http':
+        limiter = get_limiter('products', config)
+        return HttpProductProvider(
+            endpoint=opts['endpoint'],
+            api_key=opts.get('api_key'),
+            batch_size=batch_size,
+            timeout=opts.get('timeout', 10),
+            pool_size=opts.get('pool_size', limiter.max_limit),
+            limiter=limiter,
+        )
+    raise ValueError(f"Unknown product provider type: {kind}")
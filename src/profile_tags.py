@@ -0,0 +1,15 @@
+from typing import Optional
+
+# The RunProfiler of the run being profiled, set by profiler.profile_call. Kept
+# out of src/profiler so the pipeline can tag runs without importing cProfile,
+# pstats and tracemalloc when --profile is off.
+_active = None
+
+
+def tag_run(keyword: str, outcome: Optional[str] = None):
+    """Record the keyword being processed and, once known, its outcome on the run being profiled.
+
+    A no-op unless the run is under profile_call, so the pipeline can call it unconditionally.
+    """
+    if _active is not None:
+        _active.tag(keyword, outcome)
@@ -0,0 +1,160 @@
+import cProfile
+import os
+import pstats
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+from . import profile_tags
+from .utils import slugify
+
+MAX_STACK_DEPTH = 64
+
+
+def _label(func) -> str:
+    filename, line, name = func
+    if filename == '~':
+        return name  # built-ins, e.g. <built-in method time.sleep>
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks(stats: pstats.Stats) -> Dict[str, int]:
+    """Approximate folded stacks ("a;b;c <microseconds>") from cProfile's call graph.
+
+    cProfile records caller->callee edges rather than full stacks, so child
+    time is attributed along each path in proportion to the parent's share of
+    the callee's cumulative time (the same approximation flameprof uses).
+    """
+    raw = stats.stats
+    children = defaultdict(dict)
+    roots = []
+    for func, (_cc, _nc, _tt, _ct, callers) in raw.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            children[caller][func] = (edge[2], edge[3])  # (tottime, cumtime) along this edge
+    folded: Dict[str, int] = defaultdict(int)
+
+    def walk(func, path, on_path, tt, ct):
+        path = path + [_label(func)]
+        if tt > 0:
+            folded[';'.join(path)] += int(tt * 1_000_000)
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        total_ct = raw[func][3]
+        scale = ct / total_ct if total_ct else 0
+        for child, (child_tt, child_ct) in children[func].items():
+            if child in on_path or child_ct * scale < 1e-6:
+                continue
+            walk(child, path, on_path | {child}, child_tt * scale, child_ct * scale)
+
+    for root in roots:
+        walk(root, [], {root}, raw[root][2], raw[root][3])
+    return dict(folded)
+
+
+class RunProfiler:
+    """cProfile (and optionally tracemalloc) around one run, with reports under reports/.
+
+    Only constructed when --profile is passed, so normal runs pay nothing.
+    """
+    def __init__(self, run_id: str, memory: bool = False, report_dir: str = 'reports', top_n: int = 30):
+        self.run_id = run_id
+        self.memory = memory
+        self.report_dir = report_dir
+        self.top_n = top_n
+        self.profile = cProfile.Profile()
+        self._snapshot = None
+        self.tags: List[List[Optional[str]]] = []  # [keyword, outcome] per keyword processed
+
+    def tag(self, keyword: str, outcome: Optional[str] = None):
+        if self.tags and self.tags[-1][0] == keyword:
+            self.tags[-1][1] = outcome or self.tags[-1][1]
+        else:
+            self.tags.append([keyword, outcome])
+
+    def start(self):
+        if self.memory:
+            tracemalloc.start(25)
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        if self.memory and tracemalloc.is_tracing():
+            self._snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+    def write_reports(self, keyword: Optional[str] = None, outcome: Optional[str] = None) -> List[str]:
+        """Write the reports.
+
+        A run of one keyword is named after it and its outcome (unless it was
+        published); a batch after the run alone, marked failed if any keyword
+        failed. The text and allocation reports list every keyword's outcome.
+        """
+        if keyword:
+            self.tag(keyword, outcome)
+        if len(self.tags) == 1:
+            keyword, outcome = self.tags[0]
+        elif self.tags:
+            keyword = None
+            outcome = 'failed' if any(out == 'failed' for _kw, out in self.tags) else None
+        os.makedirs(self.report_dir, exist_ok=True)
+        base = f"profile-{self.run_id}" + (f"-{slugify(keyword)}" if keyword else '')
+        if outcome and outcome != 'published':
+            base += f"-{outcome}"
+        prefix = os.path.join(self.report_dir, base)
+        summary = ', '.join(f"{kw} ({out or 'unknown'})" for kw, out in self.tags) or outcome or 'no keyword'
+        paths = []
+
+        self.profile.dump_stats(prefix + '.pstats')
+        paths.append(prefix + '.pstats')
+
+        stats = pstats.Stats(self.profile)
+        with open(prefix + '.txt', 'w', encoding='utf-8') as f:
+            f.write(f"# Run {self.run_id}: {summary}\n")
+            stats.stream = f
+            stats.sort_stats('cumulative').print_stats(self.top_n)
+        paths.append(prefix + '.txt')
+
+        with open(prefix + '.collapsed', 'w', encoding='utf-8') as f:
+            for stack, us in sorted(collapsed_stacks(stats).items()):
+                f.write(f"{stack} {us}\n")
+        paths.append(prefix + '.collapsed')
+
+        if self._snapshot is not None:
+            top = self._snapshot.statistics('lineno')
+            total = sum(stat.size for stat in top)
+            with open(prefix + '.alloc.txt', 'w', encoding='utf-8') as f:
+                f.write(f"# Top {self.top_n} allocation sites (run {self.run_id}: {summary})\n")
+                f.write(f"# Total traced: {total / 1024:.1f} KiB in {len(top)} sites\n\n")
+                for stat in top[:self.top_n]:
+                    f.write(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {stat.traceback.format()[-1].strip()}\n")
+            paths.append(prefix + '.alloc.txt')
+        return paths
+
+
+def profile_call(func: Callable[[], Any], run_id: str, memory: bool = False,
+                 report_dir: str = 'reports') -> Any:
+    """Run func() under RunProfiler, tagging reports with the keywords func passed to profile_tags.tag_run().
+
+    If func tagged nothing and returns a keyword string, that keyword is
+    tagged as published; if func raises, the keyword it was on (if any) is
+    tagged as failed. Outcomes func tagged itself are kept.
+    """
+    profiler = RunProfiler(run_id, memory=memory, report_dir=report_dir)
+    result = None
+    outcome = 'failed'
+    profile_tags._active = profiler
+    profiler.start()
+    try:
+        result = func()
+        outcome = None
+        return result
+    finally:
+        profiler.stop()
+        profile_tags._active = None
+        if isinstance(result, str) and not profiler.tags:
+            profiler.tag(result, 'published')
+        elif outcome and profiler.tags and not profiler.tags[-1][1]:
+            profiler.tags[-1][1] = outcome
+        paths = profiler.write_reports(outcome=outcome)
+        print(f"[OK] Profile written: {', '.join(paths)}")
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import string
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+PROMPT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'prompts')
+SYSTEM_FIELDS = {'niche'}
+USER_FIELDS = {'keyword', 'topic', 'products', 'niche'}
+
+
+class PromptTemplate:
+    """A str.format template whose placeholders are parsed and checked once."""
+    def __init__(self, text: str, source: str = '<inline>', allowed=USER_FIELDS):
+        self.text = text
+        self.source = source
+        self.fields = {field for _lit, field, _spec, _conv in string.Formatter().parse(text) if field}
+        unknown = self.fields - set(allowed)
+        if unknown:
+            raise ValueError(f"{source}: unknown placeholders {sorted(unknown)} (allowed: {sorted(allowed)})")
+
+    def render(self, **values) -> str:
+        return self.text.format(**values)
+
+
+_templates: Dict[Tuple[str, int], PromptTemplate] = {}
+_templates_lock = threading.Lock()
+
+
+def load_template(spec: Optional[str], default_name: str, allowed=USER_FIELDS) -> PromptTemplate:
+    """Template from a file path, inline text, or prompts/<default_name> when spec is empty.
+
+    Files are read and parsed once per version (path, mtime).
+    """
+    if not spec:
+        path = os.path.join(PROMPT_DIR, default_name)
+    elif os.path.isfile(spec):
+        path = spec
+    else:
+        return PromptTemplate(spec, allowed=allowed)
+    key = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is None:
+            with open(path, encoding='utf-8') as f:
+                template = _templates[key] = PromptTemplate(f.read(), path, allowed)
+        return template
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+class ContextCache:
+    """Server-side cached copies of the shared instructions, per API key and model.
+
+    get() returns the cachedContents name to pass as cached_content, creating
+    it on first use and again shortly before it expires. Prefixes shorter than
+    min_tokens (below the API's minimum for explicit caching), models that
+    reject caching and failed creates return None for the rest of the TTL,
+    and the instructions are sent with the request instead. With a database,
+    names are kept in prompt_caches so later scheduler runs reuse them.
+    """
+    def __init__(self, db: 'Database' = None, ttl: int = 3600, min_tokens: int = 1024):
+        self.db = db
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self._entries: Dict[Tuple[str, str, str], Tuple[Optional[str], float]] = {}  # -> (name, expires unix)
+        self._lock = threading.Lock()
+
+    def get(self, client, key_id: str, model: str, text: str) -> Optional[str]:
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+        key = (key_id, model, digest)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key) or self._load(key)
+            if entry and entry[1] > now + 60:  # keep a minute's margin before expiry
+                return entry[0]
+            name = None
+            if estimate_tokens(text) >= self.min_tokens:
+                try:
+                    name = client.caches.create(model=model, config={
+                        'system_instruction': text, 'ttl': f'{self.ttl}s', 'display_name': f'income-bot-{digest}'}).name
+                except Exception:
+                    name = None
+            self._entries[key] = (name, now + self.ttl)
+            if name and self.db:
+                with self.db.lock:
+                    self.db.conn.execute(
+                        "INSERT OR REPLACE INTO prompt_caches (key_id, model, digest, name, expires_at) VALUES (?, ?, ?, ?, ?)",
+                        (key_id, model, digest, name, now + self.ttl)
+                    )
+                    self.db.conn.commit()
+            return name
+
+    def _load(self, key) -> Optional[Tuple[Optional[str], float]]:
+        if not self.db:
+            return None
+        with self.db.lock:
+            row = self.db.conn.execute(
+                "SELECT name, expires_at FROM prompt_caches WHERE key_id = ? AND model = ? AND digest = ?", key
+            ).fetchone()
+        return (row['name'], row['expires_at']) if row else None
+
+
+class PromptSet:
+    """The shared (per-niche) instructions and the per-keyword template of one niche.
+
+    prompts.system_template / prompts.user_template set the defaults; a
+    niche can override them with system_prompt / prompt_template. The
+    system text is rendered once, so every article of the niche shares an
+    identical prefix that can be cached.
+    """
+    def __init__(self, config: Dict[str, Any]):
+        settings = config.get('prompts') or {}
+        niche = config.get('niche') or {}
+        self.niche = niche.get('name') or ''
+        self.system = load_template(niche.get('system_prompt') or settings.get('system_template'),
+                                    'article_system.txt', SYSTEM_FIELDS).render(niche=self.niche)
+        self.user = load_template(niche.get('prompt_template') or settings.get('user_template'),
+                                  'article_user.txt', USER_FIELDS)
+
+    def render(self, keyword: str, products_text: str) -> str:
+        return self.user.render(keyword=keyword, topic=keyword.replace('_', ' '), products=products_text,
+                                niche=self.niche)
@@ -1,36 +1,114 @@
 import os
+import re
 import subprocess
 from datetime import datetime
-import re
+from contextlib import nullcontext
+from .dedup import DuplicateContentError, DuplicateIndex
+from .related import RelatedIndex, strip_related
+from .site_index import FRONT_MATTER_RE, content_hash, post_key
+
+DATE_LINE_RE = re.compile(r'^date:.*$', re.M)
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _keep_date(content, date):
+    """content with its front-matter date set to date (a re-published post keeps its original date)."""
+    match = FRONT_MATTER_RE.match(content)
+    if not match or not date:
+        return content
+    return DATE_LINE_RE.sub(f'date: {date}', match.group(0), count=1) + content[match.end():]
+
 
 class Publisher:
-    def __init__(self, config, db: 'Database' = None):
+    def __init__(self, config, db: 'Database' = None, timer: 'StageTimer' = None):
+        self.config = config
+        self.timer = timer
         self.repo_path = config['repo_path']
         self.branch = 'main'  # or gh-pages for some setups
         self.db = db
 
-    def publish_article(self, filename, content, category='pet-care'):
+    def publish_article(self, filename, content, category='pet-care', extra_files=None):
+        """Write the article and commit it, along with any extra_files (e.g. local images).
+
+        Content identical to what the manifest says was already pushed is a
+        no-op (a re-published post keeps its original date, and the related
+        section, which changes as other posts arrive, is left out of the
+        comparison); changed posts are updated in place; if nothing ends up
+        staged no commit is made. Returns the commit that holds the content.
+        Raises DuplicateContentError, before anything is written, when the
+        content is a near-duplicate of another published post. A "Related
+        reviews" section linking the most similar posts is appended first.
+        """
         # Ensure posts directory exists
         posts_dir = os.path.join(self.repo_path, '_posts', category)
         os.makedirs(posts_dir, exist_ok=True)
         filepath = os.path.join(posts_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
+        rel = os.path.relpath(filepath, self.repo_path).replace(os.sep, '/')
+        slug = post_key(category, os.path.splitext(filename)[0])  # the same keyword may be in several niches
+        dedup, fingerprint = self._check_duplicate(slug, content)
+        related = self._related_index()
+        if related:
+            content = related.inject(slug, content)
+        index = self._site_index()
+        entry = index.get_entry(slug) if index else None
+        if entry:
+            content = _keep_date(content, entry['date'])
+        new_hash = content_hash(content)
+        disk = _read(filepath)
+        disk_hash = content_hash(disk) if disk is not None else None
+        if entry and entry['hash'] != disk_hash:
+            # Edited or removed outside the bot since it was last published
+            self._log('manifest_drift', f'{rel}: manifest {entry["hash"][:12]}, working tree '
+                      f'{disk_hash[:12] if disk_hash else "missing"}', level='warning')
+        if (entry and entry.get('commit_sha') and entry['path'] == rel and entry['hash'] == disk_hash
+                and strip_related(content) == strip_related(disk)):
+            print(f"[OK] Unchanged {filename}")
+            if self.db:
+                self.db.log_publish(article_id=None, commit_sha=entry['commit_sha'], status='unchanged')
+            return entry['commit_sha']
+        is_new = entry is None and disk_hash is None
+        if disk_hash != new_hash:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.write(content)
+        index_pages = self._update_site_index(slug, category, filepath, content)
+        if index:
+            index_pages += index.page_paths(index.get_entry(slug))  # pages left uncommitted by a failed run
         # Git operations
         try:
-            subprocess.run(['git', 'add', filepath], cwd=self.repo_path, check=True, capture_output=True)
-            subprocess.run(['git', 'commit', '-m', f'Add article {filename}'], cwd=self.repo_path, check=True, capture_output=True)
-            result = subprocess.run(['git', 'push', 'origin', self.branch], cwd=self.repo_path, check=True, capture_output=True, text=True)
-            commit_sha_match = re.search(r'[a-f0-9]{7,40}', result.stdout)
-            commit_sha = commit_sha_match.group(0) if commit_sha_match else None
+            paths = [filepath] + sorted(set(extra_files or []) | set(index_pages))
+            with self._stage('git_commit'):
+                self._git('add', '--', *paths)
+                staged = subprocess.run(['git', 'diff', '--cached', '--quiet'], cwd=self.repo_path).returncode != 0
+                if staged:
+                    verb = 'Add' if is_new else 'Update'
+                    self._git('commit', '-m', f'{verb} article {filename}')
+                commit_sha = self._git('rev-parse', 'HEAD').strip()
+            # Push when we committed, or when an earlier run committed but failed to push
+            if staged or self._unpushed():
+                with self._stage('git_push'):
+                    self._git('push', 'origin', self.branch)
+            if index:
+                index.mark_published(slug, commit_sha)
+            if dedup:
+                dedup.add(slug, rel, content, fingerprint)
+            if related:
+                related.add(slug, category, content)
             if self.db:
-                # Get keyword from filename to link article
-                kw = filename.replace('.md', '').replace('-', '_')
-                from .database import get_or_create_keyword
-                kw_id = get_or_create_keyword(self.db, kw)
-                self.db.add_article(kw_id, filename, title='TBD', tokens=0)
-                self.db.log_publish(article_id=None, commit_sha=commit_sha, status='success')
-            print(f"[OK] Published {filename}")
+                if is_new:
+                    # Get keyword from filename to link article
+                    kw = filename.replace('.md', '').replace('-', '_')
+                    from .database import get_or_create_keyword
+                    kw_id = get_or_create_keyword(self.db, kw)
+                    self.db.add_article(kw_id, filename, title='TBD', tokens=0)
+                self.db.log_publish(article_id=None, commit_sha=commit_sha, status='success' if staged else 'unchanged')
+            print(f"[OK] Published {filename}" if staged else f"[OK] Unchanged {filename}")
             return commit_sha
         except subprocess.CalledProcessError as e:
             error_msg = f"Git error: {e.stderr if e.stderr else str(e)}"
@@ -38,4 +116,59 @@ class Publisher:
                 self.db.record_error()
                 self.db.log('publisher', 'publish_failed', error_msg, level='error')
             print(f"[ERROR] {error_msg}")
-            raise
\ No newline at end of file
+            raise
+
+    def _git(self, *args):
+        return subprocess.run(['git', *args], cwd=self.repo_path, check=True, capture_output=True, text=True).stdout
+
+    def _unpushed(self):
+        try:
+            return int(self._git('rev-list', '--count', f'origin/{self.branch}..HEAD').strip() or 0) > 0
+        except subprocess.CalledProcessError:
+            return True  # no remote-tracking ref yet
+
+    def _site_index(self):
+        if not self.db:
+            return None
+        from .site_index import SiteIndex
+        return SiteIndex(self.config, self.db)
+
+    def _check_duplicate(self, slug, content):
+        """(index, fingerprint) for a post that may be published; (None, None) with dedup off."""
+        settings = self.config.get('dedup') or {}
+        if not self.db or not settings.get('enabled', True):
+            return None, None
+        dedup = DuplicateIndex(self.config, self.db)
+        fingerprint = dedup.fingerprint(content)
+        matches = dedup.query(fingerprint, exclude=slug)
+        if matches:
+            match, distance = matches[0]
+            self._log('near_duplicate', f'{slug}: {distance} bits from {match}', level='warning')
+            if settings.get('action', 'block') == 'block':
+                print(f"[WARN] Not publishing {slug}: near-duplicate of {match}")
+                raise DuplicateContentError(slug, match, distance)
+        return dedup, fingerprint
+
+    def _related_index(self):
+        if not self.db or not (self.config.get('related') or {}).get('enabled', True):
+            return None
+        return RelatedIndex(self.config, self.db)
+
+    def _log(self, action, details, level='info'):
+        if self.db:
+            self.db.log('publisher', action, details, level=level)
+
+    def _stage(self, name):
+        return self.timer.stage(name) if self.timer else nullcontext()
+
+    def _update_site_index(self, slug, category, filepath, content):
+        """Update the article manifest and rewrite only the listing pages this post appears on."""
+        if not self.db:
+            return []
+        from .site_index import SiteIndex
+        try:
+            rel = os.path.relpath(filepath, self.repo_path).replace(os.sep, '/')
+            return SiteIndex(self.config, self.db).update(slug, category, rel, content)
+        except Exception as e:
+            self.db.log('publisher', 'site_index_failed', str(e), level='warning')
+            return []
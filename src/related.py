@@ -0,0 +1,176 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+from .site_index import FRONT_MATTER_RE, SiteIndex, parse_front_matter, post_key
+from .utils import stable_hash
+
+DIM = 1 << 20  # hashed term space
+HEADING = '## Related reviews'
+RELATED_RE = re.compile(r'\n*^' + re.escape(HEADING) + r'\n.*?(?=^#{1,2} |\Z)', re.S | re.M)
+LINK_RE = re.compile(r'!?\[([^\]]*)\]\([^)]*\)')
+WORD_RE = re.compile(r'[a-z][a-z0-9]+')
+STOPWORDS = frozenset('''
+    a about after all also an and any are as at be because been but by can do does for from has have how if in
+    into is it its it's more most not of on or our so some than that the their them then there these they this
+    to up was we were what when which while who will with you your
+'''.split())
+
+
+def strip_related(content: str) -> str:
+    """Content without a previously injected related section."""
+    return RELATED_RE.sub('', content).rstrip('\n') + '\n'
+
+
+def term_counts(content: str, title: str = '', tags: List[str] = ()) -> Counter:
+    """Hashed term counts of a post; title terms count three times and tags twice."""
+    body = LINK_RE.sub(r'\1', FRONT_MATTER_RE.sub('', content, count=1)).lower()
+    counts = Counter()
+    for text, boost in ((body, 1), (title.lower(), 3), (' '.join(tags).lower().replace('-', ' '), 2)):
+        for word in WORD_RE.findall(text):
+            if word not in STOPWORDS:
+                counts[stable_hash(word) % DIM] += boost
+    return counts
+
+
+class RelatedIndex:
+    """Hashed TF-IDF vectors of published posts, for "Related reviews" links.
+
+    Each post keeps only its top_terms heaviest terms (sublinear tf x idf,
+    L2-normalised) in related_postings, an inverted index keyed by term, so
+    neighbours are found with one indexed join over the query's heaviest
+    terms rather than a scan of every post. Document frequencies in related_terms are
+    updated as posts are added, replaced or removed; weights use the idf at
+    the time a post was indexed, and sync() re-weights any post whose file
+    changed.
+    """
+    def __init__(self, config: Dict[str, Any], db: 'Database'):
+        settings = config.get('related') or {}
+        self.db = db
+        self.config = config
+        self.repo_path = config['repo_path']
+        self.count = int(settings.get('count', 5))
+        self.min_score = float(settings.get('min_score', 0.05))
+        self.top_terms = int(settings.get('top_terms', 48))
+        self.query_terms = int(settings.get('query_terms', 24))
+
+    def _docs(self) -> int:
+        return self.db.conn.execute("SELECT COUNT(*) FROM related_docs").fetchone()[0]
+
+    def vector(self, counts: Counter) -> Dict[int, float]:
+        """Top terms of counts weighted by the corpus idf, L2-normalised."""
+        if not counts:
+            return {}
+        n = self._docs() + 1
+        terms = list(counts)
+        df = {}
+        for i in range(0, len(terms), 500):  # stay under SQLite's variable limit
+            chunk = terms[i:i + 500]
+            df.update(self.db.conn.execute(
+                f"SELECT term, df FROM related_terms WHERE term IN ({','.join('?' * len(chunk))})", chunk).fetchall())
+        weights = {t: (1 + math.log(c)) * (1 + math.log((n + 1) / (df.get(t, 0) + 1))) for t, c in counts.items()}
+        top = sorted(weights.items(), key=lambda tw: tw[1], reverse=True)[:self.top_terms]
+        norm = math.sqrt(sum(w * w for _t, w in top)) or 1.0
+        return {t: w / norm for t, w in top if w > 0}
+
+    def neighbours(self, vector: Dict[int, float], exclude: str = None, k: int = None) -> List[Tuple[str, float]]:
+        """(slug, cosine score) of the k most similar indexed posts.
+
+        Only the query's query_terms heaviest (rarest) terms are looked up;
+        they carry most of the score and have the shortest posting lists.
+        """
+        terms = sorted(vector.items(), key=lambda tw: tw[1], reverse=True)[:self.query_terms]
+        if not terms:
+            return []
+        values = ','.join('(?, ?)' for _ in terms)
+        params = [x for tw in terms for x in tw]
+        rows = self.db.conn.execute(
+            f"WITH q(term, weight) AS (VALUES {values}) "
+            "SELECT p.slug, SUM(p.weight * q.weight) AS score FROM q JOIN related_postings p ON p.term = q.term "
+            "WHERE p.slug != ? GROUP BY p.slug HAVING score >= ? ORDER BY score DESC, p.slug LIMIT ?",
+            params + [exclude or '', self.min_score, k or self.count]
+        ).fetchall()
+        return [(r['slug'], r['score']) for r in rows]
+
+    def related(self, slug: str, content: str) -> List[Dict[str, Any]]:
+        """Entries (slug, title, category, score) to link from this post."""
+        fm = parse_front_matter(content)
+        vector = self.vector(term_counts(strip_related(content), str(fm.get('title') or ''), _tags(fm)))
+        hits = self.neighbours(vector, exclude=slug)
+        if not hits:
+            return []
+        meta = {r['slug']: dict(r) for r in self.db.conn.execute(
+            f"SELECT slug, title, category FROM related_docs WHERE slug IN ({','.join('?' * len(hits))})",
+            [s for s, _score in hits])}
+        return [dict(meta[s], score=score) for s, score in hits if s in meta]
+
+    def inject(self, slug: str, content: str) -> str:
+        """content with its "Related reviews" section (re)written from the current index."""
+        content = strip_related(content)
+        entries = self.related(slug, content)
+        if not entries:
+            return content
+        site = SiteIndex(self.config, self.db)
+        links = [f"- [{e['title']}]({site.url_for(e)})" for e in entries]
+        return content + '\n' + '\n'.join([HEADING, ''] + links) + '\n'
+
+    def add(self, slug: str, category: str, content: str, commit: bool = True):
+        """Index (or re-index) one post."""
+        content = strip_related(content)
+        fm = parse_front_matter(content)
+        title = str(fm.get('title') or slug.rsplit('/', 1)[-1].replace('-', ' ').title())
+        counts = term_counts(content, title, _tags(fm))
+        self._remove(slug)
+        self.db.conn.executemany(
+            "INSERT INTO related_terms (term, df) VALUES (?, 1) ON CONFLICT(term) DO UPDATE SET df = df + 1",
+            [(t,) for t in counts])
+        vector = self.vector(counts)
+        self.db.conn.execute(
+            "INSERT INTO related_docs (slug, title, category, terms, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (slug, title, category, json.dumps(sorted(counts)), datetime.now().isoformat()))
+        self.db.conn.executemany("INSERT INTO related_postings (term, slug, weight) VALUES (?, ?, ?)",
+                                 [(t, slug, w) for t, w in vector.items()])
+        if commit:
+            self.db.conn.commit()
+
+    def _remove(self, slug: str):
+        row = self.db.conn.execute("SELECT terms FROM related_docs WHERE slug = ?", (slug,)).fetchone()
+        if not row:
+            return
+        self.db.conn.executemany("UPDATE related_terms SET df = df - 1 WHERE term = ?",
+                                 [(t,) for t in json.loads(row['terms'])])
+        self.db.conn.execute("DELETE FROM related_postings WHERE slug = ?", (slug,))
+        self.db.conn.execute("DELETE FROM related_docs WHERE slug = ?", (slug,))
+
+    def sync(self) -> int:
+        """Index posts under _posts/** changed since they were indexed and drop removed ones. Returns posts indexed."""
+        indexed = {r['slug']: r['updated_at'] for r in self.db.conn.execute("SELECT slug, updated_at FROM related_docs")}
+        posts_dir = os.path.join(self.repo_path, '_posts')
+        seen, changed = set(), 0
+        for root, _dirs, files in os.walk(posts_dir):
+            for name in sorted(files):
+                if not name.endswith('.md'):
+                    continue
+                category = os.path.relpath(root, posts_dir).replace(os.sep, '/')
+                slug = post_key(category, os.path.splitext(name)[0])
+                seen.add(slug)
+                full = os.path.join(root, name)
+                modified = datetime.fromtimestamp(os.path.getmtime(full)).isoformat()
+                if slug in indexed and indexed[slug] >= modified:
+                    continue
+                with open(full, encoding='utf-8') as f:
+                    self.add(slug, category, f.read(), commit=False)
+                changed += 1
+        for slug in indexed:
+            if slug not in seen:
+                self._remove(slug)
+        self.db.conn.commit()
+        return changed
+
+
+def _tags(fm: Dict[str, Any]) -> List[str]:
+    tags = fm.get('tags') or []
+    return [tags] if isinstance(tags, str) else [str(t) for t in tags]
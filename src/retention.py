@@ -0,0 +1,98 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+# table -> (age column, extra condition, config key for the retention in days, default days)
+POLICIES = {
+    'audit_log': ('timestamp', None, 'audit_log_days', 30),
+    'job_queue': ('completed_at', "status IN ('completed', 'failed')", 'job_queue_days', 14),
+    'model_calls': ('timestamp', None, 'model_calls_days', 30),
+}
+
+
+class Compactor:
+    """Archives and deletes rows older than the retention policy.
+
+    Expired rows are read in id order, appended to a gzipped JSONL archive
+    and deleted in batches of `batch_size`, committing after every batch so
+    the write lock is only held briefly. Freed pages are then returned to the
+    filesystem with incremental vacuum.
+    """
+    def __init__(self, config: Dict[str, Any], db: 'Database'):
+        self.db = db
+        self.settings = config.get('retention') or {}
+        self.archive_dir = self.settings.get('archive_dir', 'data/archive')
+        self.batch_size = int(self.settings.get('batch_size', 500))
+        self.vacuum_pages = int(self.settings.get('vacuum_pages', 2000))
+
+    def retention_days(self, table: str) -> Optional[int]:
+        """Days to keep; 0/None disables the policy for that table."""
+        _col, _cond, key, default = POLICIES[table]
+        days = self.settings.get(key, default)
+        return int(days) if days else None
+
+    def compact(self, now: datetime = None) -> Dict[str, int]:
+        """Apply every policy. Returns rows archived per table."""
+        now = now or datetime.now()
+        stamp = now.strftime('%Y%m%dT%H%M%S')
+        archived = {}
+        for table in POLICIES:
+            days = self.retention_days(table)
+            if days:
+                archived[table] = self._compact_table(table, (now - timedelta(days=days)).isoformat(), stamp)
+        self.vacuum()
+        self.db.set_maintenance_run('compact', now.isoformat())
+        return archived
+
+    def _compact_table(self, table: str, cutoff: str, stamp: str) -> int:
+        column, condition, _key, _days = POLICIES[table]
+        where = f"{column} < ?" + (f" AND {condition}" if condition else "")
+        cursor = self.db.conn.cursor()
+        total, last_id, out = 0, 0, None
+        try:
+            while True:
+                cursor.execute(
+                    f"SELECT * FROM {table} WHERE id > ? AND {where} ORDER BY id LIMIT ?",
+                    (last_id, cutoff, self.batch_size)
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                if out is None:
+                    os.makedirs(self.archive_dir, exist_ok=True)
+                    out = gzip.open(os.path.join(self.archive_dir, f'{table}-{stamp}.jsonl.gz'), 'ab')
+                out.write(b''.join(json.dumps(dict(r), default=str).encode('utf-8') + b'\n' for r in rows))
+                out.flush()  # archived before it is deleted
+                ids = [r['id'] for r in rows]
+                cursor.execute(f"DELETE FROM {table} WHERE id IN ({','.join('?' * len(ids))})", ids)
+                self.db.conn.commit()
+                total += len(ids)
+                last_id = ids[-1]
+        finally:
+            if out is not None:
+                out.close()
+        return total
+
+    def vacuum(self):
+        """Release free pages. Switches an existing database to incremental auto-vacuum once."""
+        conn = self.db.conn
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")  # required for the mode change to take effect
+        conn.execute(f"PRAGMA incremental_vacuum({self.vacuum_pages})")
+        conn.commit()
+
+
+def maybe_compact(config: Dict[str, Any], db: 'Database', now: datetime = None) -> Optional[Dict[str, int]]:
+    """Run compaction if retention.compact_interval_hours have passed since the last run."""
+    settings = config.get('retention') or {}
+    hours = settings.get('compact_interval_hours', 24)
+    if not hours:
+        return None
+    now = now or datetime.now()
+    last = db.get_maintenance_run('compact')
+    if last and datetime.fromisoformat(last) > now - timedelta(hours=float(hours)):
+        return None
+    return Compactor(config, db).compact(now)
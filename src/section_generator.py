@@ -0,0 +1,138 @@
+import json
+import re
+from typing import Any, Dict, List, Tuple
+from .parallel import parallel_map
+from .prompts import USER_FIELDS, estimate_tokens, load_template
+
+OUTLINE_FIELDS = USER_FIELDS
+SECTION_FIELDS = USER_FIELDS | {'section', 'instructions', 'outline'}
+
+
+def affiliate_placeholder(name: str) -> str:
+    return f"[AMAZON_LINK_{name.upper().replace(' ', '_')}]"
+
+
+def comparison_table(products: List[Dict[str, Any]]) -> str:
+    rows = ['| Product | Price | Rating | Link |', '|---------|-------|--------|------|']
+    rows += [f"| {p['name']} | ${p['price']:.2f} | {p['rating']}/5 | [Check price]({affiliate_placeholder(p['name'])}) |"
+             for p in products]
+    return '\n'.join(rows)
+
+
+def parse_outline(text: str, topic: str) -> Dict[str, Any]:
+    """Outline JSON from the model; tolerates code fences and falls back to a plain title."""
+    outline = {'title': topic.title(), 'angle': '', 'faq': []}
+    match = re.search(r'\{.*\}', text or '', re.S)
+    if match:
+        try:
+            data = json.loads(match.group(0))
+        except ValueError:
+            data = {}
+        if isinstance(data, dict):
+            outline['title'] = str(data.get('title') or outline['title']).strip()
+            outline['angle'] = str(data.get('angle') or '').strip()
+            outline['faq'] = [str(q).strip() for q in data.get('faq') or [] if str(q).strip()]
+    return outline
+
+
+def _clean(text: str) -> str:
+    """Drop headings the model added despite instructions; the assembler writes its own."""
+    lines = (text or '').strip().splitlines()
+    while lines and (lines[0].lstrip().startswith('#') or not lines[0].strip()):
+        lines.pop(0)
+    return '\n'.join(lines).strip()
+
+
+class SectionGenerator:
+    """Builds an article from one outline call and concurrent section calls.
+
+    The outline (title, angle, FAQ questions) is requested first and handed
+    to every section so they stay consistent. The intro, "why it matters",
+    one review per product, methodology, FAQ and conclusion are then
+    generated in parallel, as many at a time as the generator's Gemini
+    limiter allows, through its key pool and model router; sections that fail are retried, up to
+    section_retries more rounds, without regenerating the ones that
+    succeeded. The comparison table is built from the product data, and
+    the sections are assembled in a fixed order.
+    """
+    def __init__(self, generator: 'ContentGenerator', config: Dict[str, Any]):
+        settings = config.get('generation') or {}
+        self.generator = generator
+        self.retries = int(settings.get('section_retries', 2))
+        self.outline_template = load_template(settings.get('outline_template'), 'article_outline.txt', OUTLINE_FIELDS)
+        self.section_template = load_template(settings.get('section_template'), 'article_section.txt', SECTION_FIELDS)
+        self.last_calls = 0
+
+    def _sections(self, products: List[Dict[str, Any]], outline: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """(section name, instructions) in article order."""
+        faq = '; '.join(outline['faq']) or 'the four questions readers ask most'
+        sections = [
+            ('Introduction', 'Open with a short anecdote, state who the article is for and what it compares. 150-200 words.'),
+            ('Why It Matters', 'Explain why this choice matters to the reader and what to look for. 200-250 words.'),
+        ]
+        for p in products:
+            sections.append((p['name'], f"Review {p['name']} (${p['price']:.2f}, rated {p['rating']}/5): who it suits, "
+                                        f"pros and cons as bullet lists, and a verdict. End with the affiliate link "
+                                        f"placeholder {affiliate_placeholder(p['name'])}. 250-350 words."))
+        sections += [
+            ('How We Tested', 'Describe the hands-on testing methodology and criteria. 150-200 words.'),
+            ('Frequently Asked Questions', f'Answer these questions, each as a bold question and a short answer: {faq}.'),
+            ('Conclusion', 'Recommend the best pick for the main reader and close with a call to action. 120-150 words.'),
+        ]
+        return sections
+
+    def _call(self, prompt: str, kind: str = 'section') -> Tuple[str, int, int]:
+        """(text, tokens billed at the full rate, cached tokens) of one request."""
+        text, cached = self.generator._generate_routed(prompt, kind)
+        system = self.generator.prompts.system
+        return text, estimate_tokens(system) + estimate_tokens(prompt) + estimate_tokens(text) - cached, cached
+
+    def generate(self, keyword: str, products: List[Dict[str, Any]], products_text: str) -> Tuple[str, int, int]:
+        """(markdown body, tokens used, cached tokens)."""
+        niche = self.generator.prompts.niche
+        topic = keyword.replace('_', ' ')
+        values = {'keyword': keyword, 'topic': topic, 'products': products_text, 'niche': niche}
+        tokens = cached = calls = 0
+        try:
+            text, used, hit = self._call(self.outline_template.render(**values), 'outline')
+            tokens, cached, calls = used, hit, 1
+            outline = parse_outline(text, topic)
+        except Exception:
+            outline = parse_outline('', topic)  # sections can still be written without the model's plan
+        plan = f"Title: {outline['title']}\nAngle: {outline['angle'] or '-'}"
+        sections = self._sections(products, outline)
+        prompts = [self.section_template.render(section=name, instructions=instructions, outline=plan, **values)
+                   for name, instructions in sections]
+
+        results: List[Any] = [None] * len(sections)
+        pending = list(range(len(sections)))
+        for _round in range(1 + self.retries):
+            # One thread per section up to the limiter's ceiling; the limiter decides how many run at once
+            outputs = parallel_map(lambda i: self._call(prompts[i]), pending,
+                                   max_workers=min(self.generator.limiter.max_limit, len(pending)))
+            for i, out in zip(pending, outputs):
+                calls += 1
+                if out is not None:
+                    results[i] = out
+                    tokens += out[1]
+                    cached += out[2]
+            pending = [i for i in pending if results[i] is None]
+            if not pending:
+                break
+        self.last_calls = calls
+        if pending:
+            raise RuntimeError(f"Sections failed after {1 + self.retries} attempts: "
+                               + ', '.join(sections[i][0] for i in pending))
+        return self._assemble(outline, products, [_clean(r[0]) for r in results]), tokens, cached
+
+    def _assemble(self, outline: Dict[str, Any], products: List[Dict[str, Any]], texts: List[str]) -> str:
+        intro, why, reviews, (method, faq, conclusion) = texts[0], texts[1], texts[2:-3], texts[-3:]
+        parts = [f"# {outline['title']}", '', intro, '', '## Why It Matters', '', why, '',
+                 '## Comparison Table', '', comparison_table(products), '']
+        for p, review in zip(products, reviews):
+            parts += [f"## {p['name']}", '', f"![{p['name']}](image_url)", '', review, '']
+            if affiliate_placeholder(p['name']) not in review:
+                parts += [f"[Check price on Amazon]({affiliate_placeholder(p['name'])})", '']
+        parts += ['## How We Tested', '', method, '', '## Frequently Asked Questions', '', faq, '',
+                  '## Conclusion', '', conclusion, '']
+        return '\n'.join(parts)
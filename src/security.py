@@ -1,10 +1,27 @@
+import json
 import os
+import re
 import stat
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, List, Optional, Set
 import yaml
 from cryptography.fernet import Fernet
 import base64
 
+REDACTED = '***REDACTED***'
+# Config/log keys whose string values are secrets (matched against the whole key)
+SECRET_KEY_RE = r'(?:[\w.-]*_)?(?:api_?keys?|token|password|passwd|secret|webhook_url|fernet_key|authorization)'
+# Well-known credential shapes, caught even when they aren't in the config
+SECRET_PATTERNS = [
+    r'AIza[0-9A-Za-z_\-]{35}',                                                   # Google API key
+    r'https://(?:ptb\.|canary\.)?discord(?:app)?\.com/api/webhooks/[^\s"\'<>]+',   # Discord webhook
+    r'gAAAAA[0-9A-Za-z_\-]{40,}={0,2}',                                            # Fernet token
+]
+# Substrings at least one of which must occur for any pattern above to match
+SECRET_ANCHORS = ('AIza', 'discord', 'gAAAAA', 'Bearer ', 'key"', 'keys"', 'token"', 'password"', 'passwd"',
+                  'secret"', 'webhook_url"', 'authorization"')
+SECRET_ENV_VARS = ('GEMINI_API_KEY', 'GEMINI_BACKUP_API_KEY', 'DISCORD_WEBHOOK_URL', 'FERNET_KEY')
+MIN_SECRET_LENGTH = 8
+
 class ConfigSecurity:
     @staticmethod
     def enforce_file_permissions(path: str):
@@ -39,11 +56,104 @@ class ConfigSecurity:
 
     @staticmethod
     def redact_secrets(log_data: Dict[str, Any], secret_keys: list = None) -> Dict[str, Any]:
-        """Redact sensitive fields from log data."""
+        """Redact sensitive fields from log data, including in nested dicts and lists."""
         if secret_keys is None:
             secret_keys = ['api_key', 'gemini_api_key', 'password', 'token', 'webhook_url', 'amazon_tracking_id']
-        redacted = log_data.copy()
-        for key in secret_keys:
-            if key in redacted:
-                redacted[key] = '***REDACTED***'
-        return redacted
\ No newline at end of file
+        def walk(value):
+            if isinstance(value, dict):
+                return {k: REDACTED if k in secret_keys else walk(v) for k, v in value.items()}
+            if isinstance(value, list):
+                return [walk(v) for v in value]
+            return value
+        return walk(log_data)
+
+
+class SecretScrubber:
+    """Masks secrets in serialized log text.
+
+    Built once from the configured secret values (any string under a
+    secret-looking key, plus the usual environment variables), well-known
+    credential shapes, bearer tokens and "secret_key": "value" pairs, all
+    compiled into one alternation. Each value is also matched in the forms
+    JSON serializers escape it to (quotes, backslashes, slashes, non-ASCII),
+    since log lines are scrubbed after serialization. Text containing none
+    of the anchor substrings (the common case) is returned after a few
+    substring checks.
+    """
+    def __init__(self, secrets: Iterable[str] = ()):
+        raw = {v for v in secrets if v and len(v) >= MIN_SECRET_LENGTH}
+        values = sorted({form for v in raw for form in _json_forms(v)}, key=len, reverse=True)
+        pattern = '|'.join([
+            rf'(?P<keep>"{SECRET_KEY_RE}"\s*:\s*|Bearer )(?:"(?:[^"\\]|\\.)*"|(?<=Bearer )[\w.~+/-]{{8,}}=*)',
+        ] + [re.escape(v) for v in values] + SECRET_PATTERNS)
+        self._re = re.compile(pattern)
+        self._anchors = SECRET_ANCHORS + tuple(values)
+        self.secret_count = len(raw)
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> 'SecretScrubber':
+        return cls(collect_secrets(config or {}) + [os.getenv(name) for name in SECRET_ENV_VARS])
+
+    def scrub(self, text: str) -> str:
+        if not text:
+            return text
+        for anchor in self._anchors:
+            if anchor in text:
+                return self._re.sub(self._mask, text)
+        return text
+
+    def scrub_bytes(self, data: bytes) -> bytes:
+        # str substring checks are several times faster than bytes ones
+        text = data.decode('utf-8', 'replace')
+        scrubbed = self.scrub(text)
+        return data if scrubbed is text else scrubbed.encode('utf-8')
+
+    @staticmethod
+    def _mask(m):
+        keep = m.group('keep')
+        if not keep:
+            return REDACTED
+        return keep + (f'"{REDACTED}"' if m.group(0)[len(keep):].startswith('"') else REDACTED)
+
+
+def _json_forms(value: str) -> Set[str]:
+    """value as it appears in text, and inside JSON strings from json.dumps (ASCII or not) or orjson."""
+    forms = {value}
+    for escaped in (json.dumps(value)[1:-1], json.dumps(value, ensure_ascii=False)[1:-1]):
+        forms.update((escaped, escaped.replace('/', '\\/')))
+    return forms
+
+
+def collect_secrets(config: Dict[str, Any]) -> List[str]:
+    """String values stored under secret-looking keys anywhere in the config."""
+    key_re = re.compile(SECRET_KEY_RE + '$', re.I)
+    found = []
+    def walk(value, secret=False):
+        if isinstance(value, dict):
+            for k, v in value.items():
+                walk(v, secret or bool(key_re.match(str(k))))
+        elif isinstance(value, list):
+            for v in value:
+                walk(v, secret)
+        elif secret and isinstance(value, str):
+            found.append(value)
+    walk(config)
+    return found
+
+
+_scrubber = SecretScrubber.from_config({})
+
+
+def install_scrubber(config: Optional[Dict[str, Any]]) -> SecretScrubber:
+    """Make a scrubber for this config's secrets the process-wide one used by every log sink."""
+    global _scrubber
+    _scrubber = SecretScrubber.from_config(config)
+    return _scrubber
+
+
+def get_scrubber() -> SecretScrubber:
+    return _scrubber
+
+
+def scrub(text: str) -> str:
+    return _scrubber.scrub(text)
\ No newline at end of file
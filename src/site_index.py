@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from xml.sax.saxutils import escape
+import yaml
+from .utils import slugify
+
+FRONT_MATTER_RE = re.compile(r'\A---\s*\n(.*?)\n---\s*\n', re.S)
+
+
+def parse_front_matter(content: str) -> Dict[str, Any]:
+    match = FRONT_MATTER_RE.match(content)
+    if not match:
+        return {}
+    try:
+        data = yaml.safe_load(match.group(1))
+    except yaml.YAMLError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def post_key(category: str, slug: str) -> str:
+    """Key of a post in the manifest and the dedup and related indexes; slugs are only unique per category."""
+    return f'{category}/{slug}'
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class SiteIndex:
+    """Article manifest (keyed by post_key(), category/slug) plus the listing pages generated from it.
+
+    The manifest lives in the article_manifest/article_tags tables, so
+    updating one post touches only its own rows and rewrites only the pages
+    it appears on: its month's page of its category and of each tag, its
+    month's sitemap shard and the small sitemap index. A category or tag
+    landing page lists its month pages and is rewritten only when a month
+    page appears or empties. The sitemap index is built from sitemap_months
+    (latest update day per month) and rewritten only when a month appears,
+    empties or gets a later lastmod. Nothing here re-reads other posts.
+    Sitemaps need absolute URLs, so they are only written when site.url is set.
+    """
+    def __init__(self, config, db: 'Database'):
+        self.db = db
+        self.repo_path = config['repo_path']
+        site = config.get('site') or {}
+        self.site_url = site.get('url', '').rstrip('/')
+        self.permalink = site.get('permalink', '/{category}/{slug}/')
+
+    # --- manifest -------------------------------------------------------
+
+    def get_entry(self, slug: str) -> Optional[Dict[str, Any]]:
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT * FROM article_manifest WHERE slug = ?", (slug,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        entry = dict(row)
+        entry['tags'] = json.loads(entry['tags'] or '[]')
+        return entry
+
+    def build_entry(self, slug: str, category: str, path: str, content: str) -> Dict[str, Any]:
+        fm = parse_front_matter(content)
+        tags = fm.get('tags') or []
+        if isinstance(tags, str):
+            tags = [tags]
+        date = fm.get('date') or datetime.now().strftime('%Y-%m-%d')
+        return {
+            'slug': slug,
+            'title': str(fm.get('title') or slug.rsplit('/', 1)[-1].replace('_', ' ').title()),
+            'date': str(date)[:10],
+            'category': category,
+            'tags': sorted({slugify(str(t)) for t in tags if slugify(str(t))}),
+            'path': path,
+            'hash': content_hash(content),
+        }
+
+    def update(self, slug: str, category: str, path: str, content: str) -> List[str]:
+        """Record one article and regenerate the pages it affects. Returns the files written."""
+        new = self.build_entry(slug, category, path, content)
+        old = self.get_entry(slug)
+        if old and all(old[k] == new[k] for k in ('title', 'date', 'category', 'tags', 'path', 'hash')):
+            return []
+        new['updated_at'] = datetime.now().isoformat()
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO article_manifest (slug, title, date, category, tags, path, hash, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (slug, new['title'], new['date'], category, json.dumps(new['tags']), path, new['hash'], new['updated_at'])
+        )
+        cursor.execute("DELETE FROM article_tags WHERE slug = ?", (slug,))
+        cursor.executemany("INSERT INTO article_tags (slug, tag) VALUES (?, ?)", [(slug, t) for t in new['tags']])
+        index_changed = self._touch_months(new, old)
+        self.db.conn.commit()
+
+        categories = {new['category']}
+        tags = set(new['tags'])
+        months = {new['date'][:7]}
+        if old:
+            categories.add(old['category'])
+            tags.update(old['tags'])
+            months.add(old['date'][:7])
+        return self._write_pages(categories, tags, months, index_changed)
+
+    def _touch_months(self, new: Dict[str, Any], old: Optional[Dict[str, Any]]) -> bool:
+        """Keep sitemap_months in step with one manifest change. Returns whether any month's row changed."""
+        cursor = self.db.conn.cursor()
+        month, day = new['date'][:7], new['updated_at'][:10]
+        changed = False
+        row = cursor.execute("SELECT lastmod FROM sitemap_months WHERE month = ?", (month,)).fetchone()
+        if row is None or row['lastmod'] < day:
+            cursor.execute("INSERT OR REPLACE INTO sitemap_months (month, lastmod) VALUES (?, ?)", (month, day))
+            changed = True
+        if old and old['date'][:7] != month:
+            # The post left its old month: that month's lastmod may drop or the month may empty
+            prev = old['date'][:7]
+            row = cursor.execute("SELECT MAX(updated_at) AS lastmod FROM article_manifest WHERE date >= ? AND date < ?",
+                                 (prev, prev + '~')).fetchone()
+            if row['lastmod'] is None:
+                cursor.execute("DELETE FROM sitemap_months WHERE month = ?", (prev,))
+            else:
+                cursor.execute("UPDATE sitemap_months SET lastmod = ? WHERE month = ?", (row['lastmod'][:10], prev))
+            changed = True
+        return changed
+
+    def mark_published(self, slug: str, commit_sha: str):
+        self.db.conn.execute("UPDATE article_manifest SET commit_sha = ? WHERE slug = ?", (commit_sha, slug))
+        self.db.conn.commit()
+
+    def page_paths(self, entry: Dict[str, Any]) -> List[str]:
+        """Existing listing pages that include this entry."""
+        month = entry['date'][:7]
+        rels = [f"categories/{entry['category']}.md", f"categories/{entry['category']}/{month}.md",
+                f"sitemaps/{month}.xml", 'sitemap.xml']
+        rels += [rel for t in entry['tags'] for rel in (f'tags/{t}.md', f'tags/{t}/{month}.md')]
+        paths = [os.path.join(self.repo_path, rel) for rel in rels]
+        return [p for p in paths if os.path.exists(p)]
+
+    def rebuild(self) -> List[str]:
+        """Full re-scan of _posts/** (recovery path; normal publishes use update())."""
+        posts_dir = os.path.join(self.repo_path, '_posts')
+        written = []
+        for root, _dirs, files in os.walk(posts_dir):
+            for name in sorted(files):
+                if not name.endswith('.md'):
+                    continue
+                full = os.path.join(root, name)
+                with open(full, encoding='utf-8') as f:
+                    content = f.read()
+                category = os.path.relpath(root, posts_dir).replace(os.sep, '/')
+                rel = os.path.relpath(full, self.repo_path).replace(os.sep, '/')
+                written.extend(self.update(post_key(category, os.path.splitext(name)[0]), category, rel, content))
+        return sorted(set(written))
+
+    # --- page generation ------------------------------------------------
+
+    def url_for(self, entry: Dict[str, Any]) -> str:
+        slug = entry['slug'].rsplit('/', 1)[-1]  # manifest keys are category/slug
+        return self.site_url + self.permalink.format(category=entry['category'], slug=slug)
+
+    def _rows(self, sql: str, params: tuple) -> List[Dict[str, Any]]:
+        cursor = self.db.conn.cursor()
+        cursor.execute(sql, params)
+        return [dict(r) for r in cursor.fetchall()]
+
+    def _write(self, relpath: str, text: str) -> Optional[str]:
+        path = os.path.join(self.repo_path, relpath)
+        try:
+            with open(path, encoding='utf-8') as f:
+                if f.read() == text:
+                    return None
+        except OSError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def _listing(self, title: str, permalink: str, rows: List[Dict[str, Any]]) -> str:
+        lines = ['---', 'layout: page', f'title: {json.dumps(title)}', f'permalink: {permalink}', '---', '']
+        for r in rows:
+            lines.append(f"- [{r['title']}]({self.url_for(r)}) — {r['date']}")
+        return '\n'.join(lines) + '\n'
+
+    def _archive(self, title: str, permalink: str, months: List[str]) -> str:
+        lines = ['---', 'layout: page', f'title: {json.dumps(title)}', f'permalink: {permalink}', '---', '']
+        for month in months:
+            lines.append(f"- [{datetime.strptime(month, '%Y-%m').strftime('%B %Y')}]({permalink}{month}/)")
+        return '\n'.join(lines) + '\n'
+
+    def _write_listing(self, base: str, title: str, month: str, rows_sql: str, months_sql: str,
+                       key: str) -> List[Optional[str]]:
+        """Rewrite one month page of a category or tag, and its landing page if the month appeared or emptied."""
+        rows = self._rows(rows_sql, (key, month, month + '~'))  # '~' sorts after any YYYY-MM-DD
+        existed = os.path.exists(os.path.join(self.repo_path, f'{base}/{month}.md'))
+        if not rows and not existed:
+            return []
+        written = [self._write(f'{base}/{month}.md',
+                               self._listing(f'{title} — {month}', f'/{base}/{month}/', rows))]
+        landing = os.path.join(self.repo_path, f'{base}.md')
+        if existed != bool(rows) or not os.path.exists(landing):
+            months = [r['month'] for r in self._rows(months_sql, (key,))]
+            written.append(self._write(f'{base}.md', self._archive(title, f'/{base}/', months)))
+        return written
+
+    def _write_pages(self, categories: Set[str], tags: Set[str], months: Set[str],
+                     index_changed: bool = True) -> List[str]:
+        written = []
+        for cat in sorted(categories):
+            for month in sorted(months):
+                written += self._write_listing(
+                    f'categories/{cat}', cat.replace('-', ' ').title(), month,
+                    "SELECT slug, title, date, category FROM article_manifest "
+                    "WHERE category = ? AND date >= ? AND date < ? ORDER BY date DESC, slug",
+                    "SELECT DISTINCT substr(date, 1, 7) AS month FROM article_manifest "
+                    "WHERE category = ? ORDER BY month DESC", cat)
+        for tag in sorted(tags):
+            for month in sorted(months):
+                written += self._write_listing(
+                    f'tags/{tag}', f'Tag: {tag}', month,
+                    "SELECT m.slug, m.title, m.date, m.category FROM article_tags t "
+                    "JOIN article_manifest m ON m.slug = t.slug WHERE t.tag = ? AND m.date >= ? AND m.date < ? "
+                    "ORDER BY m.date DESC, m.slug",
+                    "SELECT DISTINCT substr(m.date, 1, 7) AS month FROM article_tags t "
+                    "JOIN article_manifest m ON m.slug = t.slug WHERE t.tag = ? ORDER BY month DESC", tag)
+        if self.site_url:
+            for month in sorted(months):
+                rows = self._rows("SELECT slug, date, category, updated_at FROM article_manifest "
+                                  "WHERE date >= ? AND date < ? ORDER BY slug", (month, month + '~'))
+                written.append(self._write(f'sitemaps/{month}.xml', self._urlset(rows)))
+            if index_changed or not os.path.exists(os.path.join(self.repo_path, 'sitemap.xml')):
+                written.append(self._write('sitemap.xml', self._sitemap_index()))
+        return [w for w in written if w]
+
+    def _urlset(self, rows: List[Dict[str, Any]]) -> str:
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for r in rows:
+            lines.append(f"  <url><loc>{escape(self.url_for(r))}</loc><lastmod>{r['updated_at'][:10]}</lastmod></url>")
+        lines.append('</urlset>')
+        return '\n'.join(lines) + '\n'
+
+    def _sitemap_index(self) -> str:
+        rows = self._rows("SELECT month, lastmod FROM sitemap_months ORDER BY month", ())
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for r in rows:
+            lines.append(f"  <sitemap><loc>{escape(self.site_url)}/sitemaps/{r['month']}.xml</loc>"
+                         f"<lastmod>{r['lastmod'][:10]}</lastmod></sitemap>")
+        lines.append('</sitemapindex>')
+        return '\n'.join(lines) + '\n'
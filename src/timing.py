@@ -0,0 +1,116 @@
+import math
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class StageTimer:
+    """Collects per-stage wall-clock samples for one run.
+
+    Samples are kept in memory (a tuple append per stage) and written to
+    the stage_timings table in one executemany() by flush(), so timing
+    costs a couple of perf_counter() calls per stage.
+    """
+    def __init__(self, db: 'Database' = None, run_id: str = None):
+        self.db = db
+        self.run_id = run_id or new_run_id()
+        self.samples: List[Tuple[str, int, int]] = []  # (stage, unix_ts, duration_us)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name: str = None):
+        """Decorator form of stage(); defaults to the function name."""
+        def decorator(func):
+            stage_name = name or func.__name__
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name: str, seconds: float):
+        self.samples.append((name, int(time.time()), int(seconds * 1_000_000)))
+
+    def summary(self) -> Dict[str, float]:
+        """Total seconds per stage for this run."""
+        totals: Dict[str, float] = {}
+        for name, _ts, us in self.samples:
+            totals[name] = totals.get(name, 0.0) + us / 1_000_000
+        return totals
+
+    def flush(self):
+        if not self.db or not self.samples:
+            return
+        cursor = self.db.conn.cursor()
+        cursor.executemany(
+            "INSERT INTO stage_timings (run_id, stage, ts, duration_us) VALUES (?, ?, ?, ?)",
+            [(self.run_id, name, ts, us) for name, ts, us in self.samples]
+        )
+        self.db.conn.commit()
+        self.samples = []
+
+
+def parse_since(value: Optional[str]) -> Optional[datetime]:
+    """Accepts '24h', '7d', '30m' or an ISO date/datetime."""
+    if not value:
+        return None
+    units = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+    if value[-1] in units and value[:-1].isdigit():
+        return datetime.now() - timedelta(**{units[value[-1]]: int(value[:-1])})
+    return datetime.fromisoformat(value)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def stage_stats(db: 'Database', since: datetime = None, until: datetime = None) -> List[Dict[str, Any]]:
+    """Per-stage count and latency percentiles (milliseconds) over a time range."""
+    clauses, params = [], []
+    if since:
+        clauses.append("ts >= ?")
+        params.append(int(since.timestamp()))
+    if until:
+        clauses.append("ts < ?")
+        params.append(int(until.timestamp()))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    cursor = db.conn.cursor()
+    cursor.execute(f"SELECT stage, duration_us FROM stage_timings {where} ORDER BY stage, duration_us", params)
+    by_stage: Dict[str, List[float]] = {}
+    for stage, us in cursor.fetchall():
+        by_stage.setdefault(stage, []).append(us / 1000)
+    cursor.execute(f"SELECT COUNT(DISTINCT run_id) FROM stage_timings {where}", params)
+    runs = cursor.fetchone()[0]
+    stats = []
+    for stage, values in by_stage.items():
+        stats.append({
+            'stage': stage,
+            'runs': runs,
+            'count': len(values),
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'max': values[-1],
+            'total': sum(values),
+        })
+    stats.sort(key=lambda s: s['total'], reverse=True)
+    return stats
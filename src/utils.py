@@ -1,7 +1,12 @@
 import re
+import hashlib
 
 def slugify(text):
     text = text.lower()
     text = re.sub(r'[^a-z0-9]+', '-', text)
     text = text.strip('-')
-    return text
\ No newline at end of file
+    return text
+
+def stable_hash(text):
+    """64-bit hash that is identical across processes (unlike built-in hash(), which is salted per run)."""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
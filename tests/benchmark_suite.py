@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for Income Bot.
+
+Runs fully offline: Gemini is replaced by tests.fakes.FakeGeminiClient and the
+publish target is a throwaway git repo pushing to a local bare remote.
+Results are compared against tests/benchmarks/baseline.json and the run
+fails (exit 1) when any benchmark's throughput drops by more than --threshold.
+
+Usage:
+  python tests/benchmark_suite.py                    # compare against baseline
+  python tests/benchmark_suite.py --update-baseline  # record a new baseline
+  python tests/benchmark_suite.py --only ttl_cache_get_set --threshold 0.3 --latency 0.05
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+from unittest.mock import patch
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from src.database import Database
+from src.job_queue import JobQueue
+from src.cache import TTLCache
+from src.parallel import parallel_map
+from tests.fakes import FakeGeminiClient
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'benchmarks', 'baseline.json')
+BENCHMARKS = {}
+
+
+def benchmark(name, unit):
+    """Register a benchmark. The function returns (operations, elapsed_seconds)."""
+    def decorator(func):
+        BENCHMARKS[name] = (func, unit)
+        return func
+    return decorator
+
+
+@contextmanager
+def temp_dir():
+    path = tempfile.mkdtemp(prefix='income_bot_bench_')
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _git(cwd, *args):
+    subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True)
+
+
+def make_publish_repo(base):
+    """Working clone on branch main with a local bare 'origin' so git push succeeds offline."""
+    remote = os.path.join(base, 'remote.git')
+    repo = os.path.join(base, 'site')
+    _git(base, 'init', '--bare', '-b', 'main', remote)
+    _git(base, 'init', '-b', 'main', repo)
+    _git(repo, 'config', 'user.email', 'bench@example.com')
+    _git(repo, 'config', 'user.name', 'bench')
+    _git(repo, 'remote', 'add', 'origin', remote)
+    with open(os.path.join(repo, 'index.md'), 'w') as f:
+        f.write('# Bench site\n')
+    _git(repo, 'add', 'index.md')
+    _git(repo, 'commit', '-m', 'init')
+    _git(repo, 'push', 'origin', 'main')
+    return repo
+
+
+# --- component benchmarks ------------------------------------------------
+
+@benchmark('db_get_next_keywords', 'keywords/s')
+def bench_get_next_keywords(opts):
+    n = 5000
+    with temp_dir() as d:
+        db = Database(os.path.join(d, 'bench.db'))
+        db.add_keywords([f'keyword_{i}' for i in range(n)])
+        start = time.perf_counter()
+        claimed = 0
+        while claimed < n:
+            claimed += len(db.get_next_keywords(10))
+        elapsed = time.perf_counter() - start
+        db.close()
+    return n, elapsed
+
+
+@benchmark('job_queue_roundtrip', 'jobs/s')
+def bench_job_queue(opts):
+    n = 2000
+    with temp_dir() as d:
+        db = Database(os.path.join(d, 'bench.db'))
+        queue = JobQueue(db)
+        start = time.perf_counter()
+        for i in range(n):
+            queue.enqueue('generate_article', {'keyword': f'kw_{i}'})
+        for _ in range(n):
+            job = queue.dequeue()
+            queue.complete(job['id'], result={'ok': True})
+        elapsed = time.perf_counter() - start
+        db.close()
+    return n, elapsed
+
+
+@benchmark('ttl_cache_get_set', 'ops/s')
+def bench_ttl_cache(opts):
+    n = 200000
+    cache = TTLCache(ttl_seconds=3600)
+    keys = [f'k{i % 1000}' for i in range(n)]
+    start = time.perf_counter()
+    for k in keys:
+        cache.set(k, 1)
+        cache.get(k)
+    return n * 2, time.perf_counter() - start
+
+
+@benchmark('parallel_map_overhead', 'items/s')
+def bench_parallel_map(opts):
+    items = list(range(2000))
+    start = time.perf_counter()
+    for _ in range(5):
+        parallel_map(lambda x: x, items, max_workers=4)
+    return len(items) * 5, time.perf_counter() - start
+
+
+@benchmark('placeholder_substitution', 'articles/s')
+def bench_placeholders(opts):
+    from scheduler import apply_product_placeholders
+    from src.product_fetcher import ProductFetcher
+    from tests.fakes import fake_article
+    products = ProductFetcher({'amazon_tracking_id': 'bench-20'}).fetch_products('hip_supplements_for_dogs')
+    prompt = '\n'.join(f"- {p['name']}: ${p['price']:.2f}" for p in products)
+    article = fake_article(prompt)
+    images = [{'markup': f"![{p['name']}](https://example.com/{i}.webp)", 'files': []} for i, p in enumerate(products)]
+    n = 5000
+    start = time.perf_counter()
+    for _ in range(n):
+        apply_product_placeholders(article, products, images)
+    return n, time.perf_counter() - start
+
+
+@benchmark('dedup_query_100k', 'queries/s')
+def bench_dedup_query(opts):
+    import random
+    from src.dedup import DuplicateIndex, _signed
+    rng = random.Random(0)
+    with temp_dir() as d:
+        db = Database(os.path.join(d, 'bench.db'))
+        index = DuplicateIndex({'repo_path': d}, db)
+        fps = [rng.getrandbits(64) for _ in range(100000)]
+        db.conn.executemany("INSERT INTO post_fingerprints (slug, simhash) VALUES (?, ?)",
+                            [(f'post-{i}', _signed(fp)) for i, fp in enumerate(fps)])
+        db.conn.executemany("INSERT INTO fingerprint_bands (band, value, slug) VALUES (?, ?, ?)",
+                            [(b, v, f'post-{i}') for i, fp in enumerate(fps) for b, v in index._band_values(fp)])
+        db.conn.commit()
+        probes = [fp ^ (1 << rng.randrange(64)) for fp in rng.sample(fps, 1000)]
+        start = time.perf_counter()
+        for fp in probes:
+            if not index.query(fp):
+                raise RuntimeError('near-duplicate not found')
+        elapsed = time.perf_counter() - start
+        db.close()
+    return len(probes), elapsed
+
+
+@benchmark('related_query_50k', 'queries/s')
+def bench_related_query(opts):
+    import random
+    from src.related import RelatedIndex
+    import math
+    from collections import Counter
+    from itertools import accumulate
+    rng = random.Random(0)
+    n = 50000
+    vocab = list(range(50000))
+    zipf = list(accumulate(1 / (i + 1) for i in range(len(vocab))))
+    docs = [Counter(rng.choices(vocab, cum_weights=zipf, k=300)) for _ in range(n)]
+    df = Counter(t for doc in docs for t in doc)
+    with temp_dir() as d:
+        db = Database(os.path.join(d, 'bench.db'))
+        index = RelatedIndex({'repo_path': d}, db)
+        vectors = []
+        for doc in docs:  # same weighting as RelatedIndex.vector: top terms by tf-idf, L2-normalised
+            weights = {t: (1 + math.log(c)) * (1 + math.log((n + 1) / (df[t] + 1))) for t, c in doc.items()}
+            top = sorted(weights.items(), key=lambda tw: tw[1], reverse=True)[:index.top_terms]
+            norm = math.sqrt(sum(w * w for _t, w in top))
+            vectors.append({t: w / norm for t, w in top})
+        db.conn.executemany("INSERT INTO related_docs (slug, title, category) VALUES (?, ?, 'bench')",
+                            [(f'post-{i}', f'Post {i}') for i in range(len(vectors))])
+        db.conn.executemany("INSERT INTO related_postings (term, slug, weight) VALUES (?, ?, ?)",
+                            [(t, f'post-{i}', w) for i, v in enumerate(vectors) for t, w in v.items()])
+        db.conn.commit()
+        probes = rng.sample(vectors, 200)
+        start = time.perf_counter()
+        for v in probes:
+            if not index.neighbours(v):
+                raise RuntimeError('no neighbours found')
+        elapsed = time.perf_counter() - start
+        db.close()
+    return len(probes), elapsed
+
+
+# --- end-to-end ----------------------------------------------------------
+
+@benchmark('scheduler_main', 'runs/s')
+def bench_scheduler_main(opts):
+    import scheduler
+    runs = opts.runs
+    with temp_dir() as d:
+        repo = make_publish_repo(d)
+        db_path = os.path.join(d, 'bench.db')
+        config = {
+            'gemini_api_key': 'bench-key',
+            'repo_path': repo,
+            'niche': {'name': 'Bench Niche', 'seed_keywords': [f'bench_keyword_{i}' for i in range(runs)]},
+            'amazon_tracking_id': 'bench-20',
+            'discord_webhook_url': None,
+            'obsidian_vault_path': None,
+        }
+        cwd = os.getcwd()
+        os.chdir(d)  # logs/ and reports/ land in the temp dir
+        try:
+            with patch('scheduler.load_config', return_value=config), \
+                 patch('scheduler.Database', lambda *a, **kw: Database(db_path)), \
+                 patch('google.genai.Client', FakeGeminiClient.factory(latency=opts.latency)), \
+                 redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                done = 0
+                for _ in range(runs):
+                    if scheduler.main():
+                        done += 1
+                elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+    if done != runs:
+        raise RuntimeError(f'scheduler.main processed {done}/{runs} keywords')
+    return runs, elapsed
+
+
+# --- runner --------------------------------------------------------------
+
+def run_benchmarks(opts):
+    results = {}
+    for name, (func, unit) in BENCHMARKS.items():
+        if opts.only and name not in opts.only:
+            continue
+        best = 0.0
+        for _ in range(opts.repeat):
+            ops, elapsed = func(opts)
+            best = max(best, ops / elapsed if elapsed > 0 else float('inf'))
+        results[name] = {'throughput': round(best, 2), 'unit': unit}
+        print(f"{name:<28}{best:>14.1f} {unit}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return the list of benchmarks whose throughput fell below baseline * (1 - threshold)."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = result['throughput'] / base['throughput'] if base['throughput'] else 1.0
+        status = 'REGRESSION' if ratio < 1 - threshold else 'ok'
+        print(f"  {name:<28}{ratio:>7.2f}x baseline  {status}")
+        if status != 'ok':
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Income Bot performance benchmarks')
+    parser.add_argument('--update-baseline', action='store_true', help='Write results as the new baseline')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline JSON path')
+    parser.add_argument('--threshold', type=float, default=0.3, help='Allowed fractional throughput drop (default 0.3)')
+    parser.add_argument('--latency', type=float, default=0.05, help='Fake Gemini latency per call in seconds')
+    parser.add_argument('--runs', type=int, default=5, help='scheduler.main runs per repetition')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per benchmark (best is kept)')
+    parser.add_argument('--only', nargs='*', help='Run only these benchmarks')
+    opts = parser.parse_args(argv)
+
+    print("=== BENCHMARKS ===")
+    results = run_benchmarks(opts)
+
+    if opts.update_baseline or not os.path.exists(opts.baseline):
+        baseline = {}
+        if os.path.exists(opts.baseline):
+            with open(opts.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        os.makedirs(os.path.dirname(opts.baseline), exist_ok=True)
+        with open(opts.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline written to {opts.baseline}")
+        return 0
+
+    with open(opts.baseline) as f:
+        baseline = json.load(f)
+    print(f"\nComparing against {opts.baseline} (threshold {opts.threshold:.0%}):")
+    regressions = compare(results, baseline, opts.threshold)
+    if regressions:
+        print(f"\n[ERROR] Throughput regression in: {', '.join(regressions)}")
+        return 1
+    print("\n[OK] No regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
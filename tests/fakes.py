@@ -0,0 +1,145 @@
+"""
+In-process stand-ins for external services, used by the benchmark and tests.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import zlib
+
+FILLER_WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore '
+                'et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip '
+                'ex ea commodo consequat duis aute irure in reprehenderit voluptate velit esse cillum fugiat nulla '
+                'pariatur excepteur sint occaecat cupidatat non proident sunt culpa qui officia deserunt mollit anim '
+                'id est laborum').split()
+
+
+class FakeResponse:
+    def __init__(self, text, prompt_tokens=0, output_tokens=0, cached_tokens=None):
+        self.text = text
+        self.usage_metadata = type('UsageMetadata', (), {
+            'prompt_token_count': prompt_tokens,
+            'candidates_token_count': output_tokens,
+            'total_token_count': prompt_tokens + output_tokens,
+            'cached_content_token_count': cached_tokens,
+        })()
+
+
+class _FakeModels:
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None):
+        return self._client._generate(model, contents, config)
+
+    def generate_content_stream(self, model, contents, config=None):
+        response = self._client._generate(model, contents, config)
+        for i in range(0, len(response.text), 400):
+            yield FakeResponse(response.text[i:i + 400])
+
+
+class _FakeCaches:
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, model, config=None):
+        config = config or {}
+        store = FakeGeminiClient.server_caches
+        with self._client._lock:
+            name = f'cachedContents/{len(store) + 1}'
+            store[name] = {'model': model, 'system_instruction': config.get('system_instruction'),
+                           'ttl': config.get('ttl')}
+            self._client.cached.append(name)
+        return type('CachedContent', (), {'name': name, 'model': model})()
+
+
+class FakeGeminiClient:
+    """Drop-in for google.genai.Client: sleeps for a configurable latency and
+    returns a well-formed article built from the products in the prompt.
+
+    token_latency adds seconds per output token, so long answers take longer
+    than short ones as they do with a real model. Outline prompts get JSON
+    and section prompts a single section."""
+
+    # cachedContents outlive a client, as they do server-side
+    server_caches = {}
+
+    def __init__(self, api_key=None, latency=0.0, jitter=0.0, words=1800, seed=0, token_latency=0.0):
+        self.api_key = api_key
+        self.latency = latency
+        self.token_latency = token_latency
+        self.jitter = jitter
+        self.words = words
+        self.models = _FakeModels(self)
+        self.caches = _FakeCaches(self)
+        self.cached = []  # cachedContents names created through this client
+        self.calls = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def factory(cls, **kwargs):
+        """Return a callable usable with patch('google.genai.Client', ...)."""
+        return lambda *args, **kw: cls(api_key=kw.get('api_key'), **kwargs)
+
+    def _generate(self, model, contents, config):
+        with self._lock:
+            self.calls.append({'model': model, 'contents': contents, 'config': config})
+            delay = self.latency + (self._rng.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        prompt = contents if isinstance(contents, str) else str(contents)
+        text = fake_text(prompt, self.words)
+        delay += self.token_latency * len(text) / 4
+        if delay > 0:
+            time.sleep(delay)
+        config = config or {}
+        system = config.get('system_instruction') or ''
+        cached = None
+        if config.get('cached_content'):
+            system = self.server_caches[config['cached_content']]['system_instruction']
+            cached = len(system) // 4
+        return FakeResponse(text, prompt_tokens=(len(system) + len(prompt)) // 4, output_tokens=len(text) // 4,
+                            cached_tokens=cached)
+
+
+def fake_text(prompt, words=1800):
+    """Reply to an outline, section or whole-article prompt."""
+    if 'Respond with JSON only' in prompt:
+        return fake_outline(prompt)
+    if 'Write only the "' in prompt:
+        return fake_section(prompt)
+    return fake_article(prompt, words)
+
+
+def fake_article(prompt, words=1800):
+    """Markdown article with the image and affiliate placeholders the pipeline expects."""
+    names = re.findall(r'^- (.+?): \$', prompt, flags=re.M)
+    # Filler varies with the prompt so different keywords don't look like near-duplicates
+    rng = random.Random(zlib.crc32(prompt.encode('utf-8')))
+    filler = ' '.join(rng.choices(FILLER_WORDS, k=max(50, words // max(1, len(names) + 2))))
+    parts = ['# Review', '', '## Introduction', filler, '', '## Comparison Table',
+             '| Product | Link |', '|---------|------|']
+    parts += [f"| {n} | [AMAZON_LINK_{n.upper().replace(' ', '_')}] |" for n in names]
+    for n in names:
+        parts += ['', f'## {n}', f'![{n}](image_url)', filler,
+                  f"[Buy on Amazon]([AMAZON_LINK_{n.upper().replace(' ', '_')}])"]
+    parts += ['', '## Conclusion', filler, '']
+    return '\n'.join(parts)
+
+
+def fake_outline(prompt):
+    topic = re.search(r'for (.+?) \(keyword:', prompt)
+    topic = topic.group(1) if topic else 'products'
+    return json.dumps({'title': f'Best {topic.title()} Reviewed', 'angle': f'Hands-on picks for {topic}.',
+                       'faq': [f'What is the best {topic}?', 'How much should I spend?']})
+
+
+def fake_section(prompt, words=250):
+    """Body of the one section named in a section prompt."""
+    section = re.search(r'Write only the "(.+?)" section', prompt).group(1)
+    link = re.search(r'placeholder (\[AMAZON_LINK_\w+\])', prompt)
+    # Seeded by the prompt, like fake_article, so sections of different keywords differ
+    rng = random.Random(zlib.crc32(prompt.encode('utf-8')))
+    body = f"{section}: " + ' '.join(rng.choices(FILLER_WORDS, k=words))
+    return body + (f"\n\n[Buy on Amazon]({link.group(1)})" if link else '')
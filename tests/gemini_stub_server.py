@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini generate-content API.
+
+Speaks the subset ContentGenerator uses:
+  POST /{version}/models/{model}:generateContent
+  POST /{version}/models/{model}:streamGenerateContent?alt=sse
+  POST /{version}/cachedContents, GET and DELETE /{version}/cachedContents/{id}
+
+Replies follow the prompt: JSON outlines and single sections for
+generation.mode: sections, whole articles otherwise. Requests naming a
+cachedContent are served its system instruction and report it under
+cachedContentTokenCount; unknown or expired names get a 404.
+
+Latency, streaming chunk size and fault injection (429, 5xx, malformed JSON)
+are configurable; every request is recorded for later inspection. Point the
+bot at it with `gemini_base_url: "http://127.0.0.1:<port>"` in config.
+
+Usage:
+  python tests/gemini_stub_server.py --port 8765 --latency lognormal:0.2:0.5 --rate-429 0.05
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tests.fakes import fake_text
+
+PATH_RE = re.compile(r'^/(?P<version>[^/]+)/models/(?P<model>[^:/]+):(?P<method>generateContent|streamGenerateContent)')
+CACHE_RE = re.compile(r'^/(?P<version>[^/]+)/cachedContents(?:/(?P<id>[^/?]+))?(?:\?.*)?$')
+
+
+def parse_latency(spec):
+    """'0.2' (fixed), 'uniform:LO:HI' or 'lognormal:MEDIAN:SIGMA' -> callable returning seconds."""
+    if spec is None:
+        return lambda rng: 0.0
+    if isinstance(spec, (int, float)):
+        return lambda rng: float(spec)
+    kind, _, rest = str(spec).partition(':')
+    if not rest:
+        value = float(kind)
+        return lambda rng: value
+    a, b = (float(x) for x in rest.split(':'))
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(a, b)
+    if kind == 'lognormal':
+        mu = math.log(a)
+        return lambda rng: rng.lognormvariate(mu, b)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubConfig:
+    def __init__(self, latency=None, rate_429=0.0, rate_5xx=0.0, rate_malformed=0.0,
+                 chunk_chars=400, chunk_delay=0.0, words=1800, seed=0):
+        self.latency = parse_latency(latency)
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.rate_malformed = rate_malformed
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+        self.words = words
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def draw(self):
+        """Pick (latency, outcome) for one request under the lock so seeded runs are reproducible."""
+        with self.lock:
+            delay = max(0.0, self.latency(self.rng))
+            r = self.rng.random()
+        if r < self.rate_429:
+            return delay, 429
+        r -= self.rate_429
+        if r < self.rate_5xx:
+            return delay, 503
+        r -= self.rate_5xx
+        if r < self.rate_malformed:
+            return delay, 'malformed'
+        return delay, 200
+
+
+class GeminiStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, config=None):
+        super().__init__((host, port), _Handler)
+        self.config = config or StubConfig()
+        self.requests = []
+        self.counts = {}
+        self.caches = {}  # cachedContents/<id> -> resource, including its systemInstruction
+        self._record_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def record(self, entry, outcome):
+        with self._record_lock:
+            self.requests.append(entry)
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+    def create_cache(self, body):
+        ttl = float(str(body.get('ttl') or '3600s').rstrip('s'))
+        now = time.time()
+        system = _text(body.get('systemInstruction'))
+        with self._record_lock:
+            name = f'cachedContents/stub-{len(self.caches) + 1}'
+            self.caches[name] = {
+                'name': name,
+                'model': body.get('model'),
+                'displayName': body.get('displayName', ''),
+                'createTime': _timestamp(now),
+                'expireTime': _timestamp(now + ttl),
+                'usageMetadata': {'totalTokenCount': len(system) // 4},
+                'systemInstruction': body.get('systemInstruction'),
+                'expires': now + ttl,
+            }
+        return self.caches[name]
+
+    def get_cache(self, name):
+        """The live cache resource called name, or None if unknown or expired."""
+        with self._record_lock:
+            cache = self.caches.get(name)
+        return cache if cache and cache['expires'] > time.time() else None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, code, status, message):
+        self._send_json(code, {'error': {'code': code, 'message': message, 'status': status}})
+
+    def _cache_resource(self, cache):
+        return {k: v for k, v in cache.items() if k not in ('systemInstruction', 'expires')}
+
+    def _cache_request(self, method, match, body):
+        server = self.server
+        server.record({'time': time.time(), 'path': self.path, 'model': None, 'method': f'{method} cachedContents',
+                       'api_key': self.headers.get('x-goog-api-key'), 'body': body, 'outcome': 'cache',
+                       'latency': 0.0}, 'cache')
+        name = f"cachedContents/{match.group('id')}" if match.group('id') else None
+        if method == 'POST' and not name:
+            if body is None or not body.get('model'):
+                self._error(400, 'INVALID_ARGUMENT', 'cachedContents.create needs a model')
+                return
+            self._send_json(200, self._cache_resource(server.create_cache(body)))
+            return
+        cache = server.get_cache(name) if name else None
+        if cache is None:
+            self._error(404, 'NOT_FOUND', f'{name or "cachedContents"} not found')
+        elif method == 'DELETE':
+            with server._record_lock:
+                server.caches.pop(name, None)
+            self._send_json(200, {})
+        else:
+            self._send_json(200, self._cache_resource(cache))
+
+    def do_GET(self):
+        match = CACHE_RE.match(self.path)
+        if not match:
+            self._error(404, 'NOT_FOUND', 'Unsupported path')
+            return
+        self._cache_request('GET', match, None)
+
+    def do_DELETE(self):
+        match = CACHE_RE.match(self.path)
+        if not match:
+            self._error(404, 'NOT_FOUND', 'Unsupported path')
+            return
+        self._cache_request('DELETE', match, None)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        match = PATH_RE.match(self.path)
+        try:
+            body = json.loads(raw or b'{}')
+        except ValueError:
+            body = None
+        cache_match = CACHE_RE.match(self.path)
+        if cache_match:
+            self._cache_request('POST', cache_match, body)
+            return
+        delay, outcome = server.config.draw()
+        server.record({
+            'time': time.time(),
+            'path': self.path,
+            'model': match.group('model') if match else None,
+            'method': match.group('method') if match else None,
+            'api_key': self.headers.get('x-goog-api-key'),
+            'body': body,
+            'outcome': outcome,
+            'latency': delay,
+        }, outcome)
+        if not match or body is None:
+            self._error(400, 'INVALID_ARGUMENT', 'Unsupported path or invalid JSON body')
+            return
+        if delay:
+            time.sleep(delay)
+        if outcome == 429:
+            self._error(429, 'RESOURCE_EXHAUSTED', 'Quota exceeded (injected by stub)')
+            return
+        if outcome == 503:
+            self._error(503, 'UNAVAILABLE', 'The model is overloaded (injected by stub)')
+            return
+        if outcome == 'malformed':
+            payload = b'{"candidates": [{"content": {"parts": [{"text": "trunc'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        prompt = _prompt_text(body)
+        system = _text(body.get('systemInstruction'))
+        cached = None
+        if body.get('cachedContent'):
+            cache = server.get_cache(body['cachedContent'])
+            if cache is None:
+                self._error(404, 'NOT_FOUND', f"{body['cachedContent']} not found or expired")
+                return
+            system = _text(cache['systemInstruction'])
+            cached = len(system) // 4
+        text = fake_text(prompt, server.config.words)
+        usage = {'promptTokenCount': (len(system) + len(prompt)) // 4, 'candidatesTokenCount': len(text) // 4,
+                 'totalTokenCount': (len(system) + len(prompt) + len(text)) // 4}
+        if cached is not None:
+            usage['cachedContentTokenCount'] = cached
+        if match.group('method') == 'generateContent':
+            self._send_json(200, _response(text, usage, match.group('model')))
+            return
+        self._stream(text, usage, match.group('model'))
+
+    def _stream(self, text, usage, model):
+        cfg = self.server.config
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        chunks = [text[i:i + cfg.chunk_chars] for i in range(0, len(text), cfg.chunk_chars)] or ['']
+        for i, chunk in enumerate(chunks):
+            last = i == len(chunks) - 1
+            event = _response(chunk, usage if last else None, model, finish=last)
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+            if cfg.chunk_delay and not last:
+                time.sleep(cfg.chunk_delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def _text(content):
+    """Text of one Content ({'parts': [{'text': ...}]}), '' if absent."""
+    return '\n'.join(part['text'] for part in (content or {}).get('parts') or [] if 'text' in part)
+
+
+def _prompt_text(body):
+    return '\n'.join(_text(content) for content in body.get('contents') or [])
+
+
+def _timestamp(seconds):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(seconds))
+
+
+def _response(text, usage, model, finish=True):
+    candidate = {'content': {'parts': [{'text': text}], 'role': 'model'}, 'index': 0}
+    if finish:
+        candidate['finishReason'] = 'STOP'
+    payload = {'candidates': [candidate], 'modelVersion': model}
+    if usage:
+        payload['usageMetadata'] = usage
+    return payload
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local Gemini generate-content and cachedContents stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='0', help="Seconds, 'uniform:LO:HI' or 'lognormal:MEDIAN:SIGMA'")
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--rate-5xx', type=float, default=0.0)
+    parser.add_argument('--rate-malformed', type=float, default=0.0)
+    parser.add_argument('--chunk-chars', type=int, default=400)
+    parser.add_argument('--chunk-delay', type=float, default=0.0)
+    opts = parser.parse_args(argv)
+    config = StubConfig(opts.latency, opts.rate_429, opts.rate_5xx, opts.rate_malformed,
+                        opts.chunk_chars, opts.chunk_delay)
+    server = GeminiStubServer(opts.host, opts.port, config)
+    print(f"Gemini stub listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,9 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from src.database import Database
 from src.cache import TTLCache
 from src.parallel import parallel_map
+from src.keyword_expander import KeywordExpander
+from src.product_fetcher import ProductFetcher
+from src.product_providers import StubProductProvider
 
 def test_database_connection():
     """Test that we can create a DB and tables."""
@@ -70,5 +73,1121 @@ def test_parallel_map():
     results = parallel_map(square, [1, 2, 3, 4], max_workers=2)
     assert results == [1, 4, 9, 16]
 
+def test_keyword_expander_suppresses_near_duplicates():
+    config = {'niche': {'seed_keywords': ['hip_supplements_for_german_shepherds'],
+                        'expansion': {'modifiers': ['best'], 'breeds': ['german shepherds', 'labradors']}}}
+    exp = KeywordExpander(config)
+    exp.add_existing(['hip-supplements-for-german-shepherds'])
+    accepted = exp.expand()
+    assert accepted == ['hip_supplements_for_labradors', 'best_hip_supplements_for_german_shepherds',
+                        'best_hip_supplements_for_labradors']
+    assert exp.suppressed == 1
+    assert exp.add_candidates(['hip_supplements_for_labrador', 'best_hip_supplements_for_labradors_dogs']) == []
+
+def test_keyword_expander_keeps_default_modifier_variants():
+    exp = KeywordExpander({'niche': {'seed_keywords': ['hip_supplements_for_german_shepherds', 'dog_beds']}})
+    accepted = exp.expand()
+    assert 'vet_recommended_hip_supplements_for_labradors' in accepted
+    assert 'organic_dog_beds_for_puppies' in accepted
+    assert len(accepted) == 2 * 21 * 7
+
+def test_keyword_expander_dedups_large_input_quickly():
+    import time
+    seeds = [f'supplement{i}_chews_for_dogs' for i in range(700)]
+    exp = KeywordExpander({'niche': {'seed_keywords': seeds}})
+    candidates = list(exp.generate())
+    assert len(candidates) > 100000
+    start = time.perf_counter()
+    accepted = exp.add_candidates(candidates)
+    assert time.perf_counter() - start < 10
+    assert len(accepted) == 700 * 21 * 7
+
+def test_keyword_expander_bulk_queue():
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        db_path = tmp.name
+    try:
+        db = Database(db_path)
+        exp = KeywordExpander({'niche': {}})
+        accepted = exp.add_candidates(f'supplement_{i}_for_breed_{i}' for i in range(1000))
+        assert len(accepted) == 1000
+        assert db.add_keywords(accepted) == 1000
+        assert db.add_keywords(accepted) == 0
+        db.close()
+    finally:
+        os.unlink(db_path)
+
+def test_product_asins_stable_across_processes():
+    import subprocess
+    code = "from src.product_fetcher import ProductFetcher; print(ProductFetcher({}).fetch_products('dog_beds')[0]['asin'])"
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    asins = set()
+    for seed in ('1', '2'):
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        out = subprocess.run([sys.executable, '-c', code], cwd=root, env=env, capture_output=True, text=True, check=True)
+        asins.add(out.stdout.strip())
+    assert len(asins) == 1
+    assert len(asins.pop()) == 10
+
+def test_product_fetcher_batches_and_caches():
+    provider = StubProductProvider(batch_size=10)
+    pf = ProductFetcher({'amazon_tracking_id': 'tag-20'}, provider=provider)
+    keywords = [f'kw_{i}' for i in range(25)]
+    results = pf.fetch_products_batch(keywords)
+    assert provider.round_trips == 3
+    assert all(len(results[k]) == 3 for k in keywords)
+    assert results['kw_0'][0]['url'].endswith('?tag=tag-20')
+    pf.fetch_products_batch(keywords)
+    assert provider.round_trips == 3
+
+def test_image_fetcher_local_pipeline():
+    pytest.importorskip('requests')
+    Image = pytest.importorskip('PIL.Image')
+    import io
+    import threading
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from src.image_fetcher import ImageFetcher
+
+    buf = io.BytesIO()
+    Image.new('RGB', (1000, 750), 'orange').save(buf, 'PNG')
+    png = buf.getvalue()
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(png)))
+            self.end_headers()
+            self.wfile.write(png)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    repo = tempfile.mkdtemp()
+    try:
+        config = {'repo_path': repo, 'images': {
+            'local': True, 'source_url': f'http://127.0.0.1:{server.server_port}/{{query}}.png'}}
+        images = ImageFetcher(config).resolve_images(['Dog Bed', 'Chew Toy'])
+        assert len(hits) == 2
+        assert 'srcset=' in images[0]['markup'] and '400w' in images[0]['markup']
+        assert all(os.path.exists(f) for f in images[0]['files'])
+        ImageFetcher(config).resolve_images(['Dog Bed'])
+        assert len(hits) == 2
+    finally:
+        server.shutdown()
+        shutil.rmtree(repo)
+
+def _post(title, tags, body='Body'):
+    return f'---\ntitle: "{title}"\ndate: 2026-03-01\ntags: {tags}\n---\n{body}\n'
+
+def test_site_index_incremental_pages():
+    from src.site_index import SiteIndex
+    repo = tempfile.mkdtemp()
+    try:
+        db = Database(os.path.join(repo, 'test.db'))
+        index = SiteIndex({'repo_path': repo, 'site': {'url': 'https://example.com'}}, db)
+        index.update('dog-beds', 'pet-care', '_posts/pet-care/dog-beds.md', _post('Dog Beds', ['beds']))
+        written = index.update('cat-toys', 'cat-care', '_posts/cat-care/cat-toys.md', _post('Cat Toys', ['toys']))
+        names = sorted(os.path.relpath(p, repo) for p in written)
+        assert names == ['categories/cat-care.md', 'categories/cat-care/2026-03.md', 'sitemaps/2026-03.xml',
+                         'tags/toys.md', 'tags/toys/2026-03.md']
+        # Another post in the same month rewrites only that month's pages
+        written = index.update('cat-trees', 'cat-care', '_posts/cat-care/cat-trees.md', _post('Cat Trees', ['toys']))
+        assert sorted(os.path.relpath(p, repo) for p in written) == [
+            'categories/cat-care/2026-03.md', 'sitemaps/2026-03.xml', 'tags/toys/2026-03.md']
+        # A new month adds a page and a link on the landing page
+        written = index.update('cat-beds', 'cat-care', '_posts/cat-care/cat-beds.md',
+                               _post('Cat Beds', ['beds']).replace('2026-03-01', '2026-04-02'))
+        assert 'categories/cat-care.md' in [os.path.relpath(p, repo) for p in written]
+        with open(os.path.join(repo, 'categories', 'cat-care.md')) as f:
+            landing = f.read()
+        assert '- [April 2026](/categories/cat-care/2026-04/)' in landing and 'March 2026' in landing
+        with open(os.path.join(repo, 'categories', 'cat-care', '2026-03.md')) as f:
+            assert 'Cat Toys' in f.read()
+        with open(os.path.join(repo, 'sitemaps', '2026-03.xml')) as f:
+            sitemap = f.read()
+        assert 'https://example.com/pet-care/dog-beds/' in sitemap
+        assert 'https://example.com/cat-care/cat-toys/' in sitemap
+        with open(os.path.join(repo, 'sitemap.xml')) as f:
+            assert '/sitemaps/2026-04.xml' in f.read()
+        assert index.update('cat-toys', 'cat-care', '_posts/cat-care/cat-toys.md', _post('Cat Toys', ['toys'])) == []
+        # Moving the only April post back to March drops April from sitemap_months and the sitemap index
+        written = index.update('cat-beds', 'cat-care', '_posts/cat-care/cat-beds.md', _post('Cat Beds', ['beds']))
+        assert 'sitemap.xml' in [os.path.relpath(p, repo) for p in written]
+        assert [r['month'] for r in db.conn.execute("SELECT month FROM sitemap_months")] == ['2026-03']
+        with open(os.path.join(repo, 'sitemap.xml')) as f:
+            assert '2026-04' not in f.read()
+        # Without site.url there are no absolute URLs for the sitemaps
+        bare = SiteIndex({'repo_path': repo}, db)
+        written = bare.update('bird-toys', 'birds', '_posts/birds/bird-toys.md', _post('Bird Toys', ['toys']))
+        assert not any(p.endswith('.xml') for p in written)
+        db.close()
+    finally:
+        shutil.rmtree(repo)
+
+def test_keywords_and_post_keys_are_namespaced_by_niche():
+    import sqlite3
+    from src.keyword_researcher import KeywordResearcher
+    from src.site_index import SiteIndex
+    tmp = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmp, 'test.db')
+        # A keywords table from before niches, where the keyword alone was unique
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE keywords (id INTEGER PRIMARY KEY AUTOINCREMENT, keyword TEXT UNIQUE NOT NULL, "
+                     "status TEXT DEFAULT 'pending', added_date TEXT, assigned_date TEXT, completed_date TEXT, error TEXT)")
+        conn.execute("INSERT INTO keywords (keyword, added_date) VALUES ('toys', '2026-01-01')")
+        conn.commit()
+        conn.close()
+        db = Database(db_path)
+        db.assign_unscoped_keywords('Dogs')
+        assert db.add_keywords(['toys', 'beds'], 'Cats') == 2
+        assert db.add_keywords(['toys'], 'Cats') == 0 and db.add_keywords(['chews']) + db.add_keywords(['chews']) == 1
+        dogs = KeywordResearcher({'niche': {'name': 'Dogs'}}, db, niche='Dogs')
+        cats = KeywordResearcher({'niche': {'name': 'Cats'}}, db, niche='Cats')
+        dogs.mark_completed('toys')
+        cats.mark_failed('toys', 'No products found')
+        assert db.get_keyword_by_text('toys', 'Dogs')['status'] == 'completed'
+        assert db.get_keyword_by_text('toys', 'Cats')['status'] == 'failed'
+        # Manifest keys written before they were namespaced gain their category
+        index = SiteIndex({'repo_path': tmp, 'site': {'url': 'https://example.com'}}, db)
+        index.update('dogs/toys', 'dogs', '_posts/dogs/toys.md', _post('Toys', ['toys']))
+        db.conn.execute("UPDATE article_manifest SET slug = 'toys'")
+        db.conn.execute("UPDATE article_tags SET slug = 'toys'")
+        db.conn.execute("DELETE FROM maintenance_runs WHERE task = 'post_keys'")
+        db.conn.commit()
+        db.close()
+        db = Database(db_path)
+        index = SiteIndex({'repo_path': tmp, 'site': {'url': 'https://example.com'}}, db)
+        assert index.get_entry('dogs/toys')['path'] == '_posts/dogs/toys.md'
+        assert db.conn.execute("SELECT slug FROM article_tags").fetchone()[0] == 'dogs/toys'
+        # The same slug in another category is a separate post with its own URL
+        index.update('cats/toys', 'cats', '_posts/cats/toys.md', _post('Toys', ['toys']))
+        with open(os.path.join(tmp, 'tags', 'toys', '2026-03.md')) as f:
+            page = f.read()
+        assert 'https://example.com/dogs/toys/' in page and 'https://example.com/cats/toys/' in page
+        db.close()
+    finally:
+        shutil.rmtree(tmp)
+
+def test_stage_timer_stats():
+    from src.timing import StageTimer, stage_stats
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        db_path = tmp.name
+    try:
+        db = Database(db_path)
+        timer = StageTimer(db)
+        for ms in range(1, 101):
+            timer.record('generate', ms / 1000)
+        with timer.stage('publish'):
+            pass
+        timer.flush()
+        stats = {s['stage']: s for s in stage_stats(db)}
+        assert stats['generate']['count'] == 100
+        assert stats['generate']['p50'] == 50
+        assert stats['generate']['p95'] == 95
+        assert stats['publish']['count'] == 1
+        db.close()
+    finally:
+        os.unlink(db_path)
+
+def test_profile_call_writes_reports():
+    from src.profiler import profile_call
+    report_dir = tempfile.mkdtemp()
+    try:
+        def work():
+            sorted(str(i) for i in range(20000))
+            return 'dog_beds'
+        assert profile_call(work, 'abc123', memory=True, report_dir=report_dir) == 'dog_beds'
+        names = sorted(os.listdir(report_dir))
+        assert names == ['profile-abc123-dog-beds.alloc.txt', 'profile-abc123-dog-beds.collapsed',
+                         'profile-abc123-dog-beds.pstats', 'profile-abc123-dog-beds.txt']
+        with open(os.path.join(report_dir, 'profile-abc123-dog-beds.collapsed')) as f:
+            lines = f.read().splitlines()
+        assert lines and all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+        assert any('work (test_suite.py' in line for line in lines)
+    finally:
+        shutil.rmtree(report_dir)
+
+def test_profile_call_tags_failed_runs():
+    import subprocess
+    from src.profile_tags import tag_run
+    from src.profiler import profile_call
+    # Tagging is always on, so the entry points must not pull in cProfile/tracemalloc unless profiling
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    code = "import sys, scheduler, run; assert not {'cProfile', 'pstats', 'tracemalloc'} & set(sys.modules)"
+    subprocess.run([sys.executable, '-c', code], cwd=root, check=True, capture_output=True)
+    report_dir = tempfile.mkdtemp()
+    try:
+        def work():
+            tag_run('dog_beds')
+            raise RuntimeError('generation failed')
+        with pytest.raises(RuntimeError):
+            profile_call(work, 'abc123', report_dir=report_dir)
+        assert sorted(os.listdir(report_dir)) == ['profile-abc123-dog-beds-failed.collapsed',
+                                                  'profile-abc123-dog-beds-failed.pstats',
+                                                  'profile-abc123-dog-beds-failed.txt']
+        with open(os.path.join(report_dir, 'profile-abc123-dog-beds-failed.txt')) as f:
+            assert f.readline() == '# Run abc123: dog_beds (failed)\n'
+
+        def batch():
+            tag_run('cat_beds')
+            tag_run('cat_beds', 'duplicate')
+            tag_run('dog_crates')
+            tag_run('dog_crates', 'skipped')
+        profile_call(batch, 'def456', report_dir=report_dir)
+        with open(os.path.join(report_dir, 'profile-def456.txt')) as f:
+            assert f.readline() == '# Run def456: cat_beds (duplicate), dog_crates (skipped)\n'
+
+        # The return value is only a fallback: outcomes the run tagged itself stand
+        def duplicate():
+            tag_run('cat_beds', 'duplicate')
+            return 'dog_crates'
+        profile_call(duplicate, 'ghi789', report_dir=report_dir)
+        with open(os.path.join(report_dir, 'profile-ghi789-cat-beds-duplicate.txt')) as f:
+            assert f.readline() == '# Run ghi789: cat_beds (duplicate)\n'
+        tag_run('not_profiled', 'failed')  # no-op outside profile_call
+    finally:
+        shutil.rmtree(report_dir)
+
+def test_content_generator_against_gemini_stub():
+    pytest.importorskip('google.genai')
+    from src.content_generator import ContentGenerator
+    from tests.gemini_stub_server import GeminiStubServer, StubConfig
+    server = GeminiStubServer(config=StubConfig(chunk_chars=200)).start()
+    try:
+        products = [{'name': 'Dog Bed', 'price': 10.0, 'rating': 4.5}]
+        config = {'gemini_api_key': 'stub-key', 'gemini_base_url': server.base_url, 'gemini_stream': True}
+        article = ContentGenerator(config).generate_article('dog_beds', products)
+        assert '[AMAZON_LINK_DOG_BED]' in article
+        server.config.rate_429 = 1.0
+        article = ContentGenerator(config).generate_article('dog_beds', products)
+        assert 'placeholder article' in article
+        assert server.counts == {200: 1, 429: 1}
+        assert server.requests[0]['method'] == 'streamGenerateContent'
+        assert server.requests[0]['api_key'] == 'stub-key'
+    finally:
+        server.stop()
+
+def test_gemini_stub_serves_sections_and_cached_contents():
+    pytest.importorskip('google.genai')
+    from src.content_generator import ContentGenerator
+    from tests.gemini_stub_server import GeminiStubServer
+    server = GeminiStubServer().start()
+    try:
+        products = [{'name': 'Dog Bed', 'price': 10.0, 'rating': 4.5}, {'name': 'Cat Bed', 'price': 12.0, 'rating': 4.1}]
+        config = {'gemini_api_key': 'stub-key', 'gemini_base_url': server.base_url,
+                  'models': {'tiers': [{'name': 'gemini-2.5-flash'}]}, 'generation': {'mode': 'sections'},
+                  'prompts': {'min_cache_tokens': 1}}
+        cg = ContentGenerator(config)
+        article = cg.generate_article('dog_beds', products)
+        assert '# Best Dog Beds Reviewed' in article
+        assert '[AMAZON_LINK_DOG_BED]' in article and 'placeholder article' not in article
+        assert list(server.caches) == ['cachedContents/stub-1']
+        generated = [r for r in server.requests if r['method'] == 'generateContent']
+        assert len(generated) == 1 + 5 + len(products)  # outline, fixed sections, one per product
+        assert all(r['body']['cachedContent'] == 'cachedContents/stub-1' for r in generated)
+        assert cg.last_cached_tokens > 0
+
+        from google import genai
+        client = genai.Client(api_key='stub-key', http_options={'base_url': server.base_url})
+        assert client.caches.get(name='cachedContents/stub-1').model == 'models/gemini-2.5-flash'
+        client.caches.delete(name='cachedContents/stub-1')
+        with pytest.raises(Exception):
+            client.models.generate_content(model='gemini-2.5-flash', contents='hi',
+                                           config={'cached_content': 'cachedContents/stub-1'})
+    finally:
+        server.stop()
+
+def test_jsonl_writer_concurrent_and_rotation():
+    import gzip
+    import json
+    import threading
+    from src.log_writer import JsonlWriter
+    log_dir = tempfile.mkdtemp()
+    try:
+        writer = JsonlWriter(log_dir, buffer_bytes=512, flush_interval=0, max_bytes=8 * 1024)
+        def worker(n):
+            for i in range(500):
+                writer.write({'thread': n, 'i': i, 'msg': 'x' * 20})
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        writer.close()
+        writer.wait_for_compression()
+        lines = []
+        for name in sorted(os.listdir(log_dir)):
+            path = os.path.join(log_dir, name)
+            opener = gzip.open if name.endswith('.gz') else open
+            with opener(path, 'rt', encoding='utf-8') as f:
+                lines += f.read().splitlines()
+        names = os.listdir(log_dir)
+        assert any(n.endswith('.1.jsonl.gz') for n in names)
+        assert not any(n.endswith('.tmp') for n in names)
+        entries = [json.loads(line) for line in lines]
+        assert len(entries) == 2000
+        assert {(e['thread'], e['i']) for e in entries} == {(n, i) for n in range(4) for i in range(500)}
+    finally:
+        shutil.rmtree(log_dir)
+
+def test_log_index_incremental_across_rotation():
+    from src.log_index import LogIndex
+    from src.log_writer import JsonlWriter
+    log_dir = tempfile.mkdtemp()
+    try:
+        writer = JsonlWriter(log_dir, buffer_bytes=1, flush_interval=0, max_bytes=4 * 1024)
+        for i in range(30):
+            writer.write({'timestamp': f'2026-01-01T00:00:{i:02d}', 'level': 'INFO', 'module': 'scheduler',
+                          'message': f'Processing keyword: kw_{i}', 'keyword': f'kw_{i}', 'pad': 'x' * 100})
+        index = LogIndex(log_dir)
+        assert index.refresh() == 30
+        writer.write({'timestamp': '2026-01-02T00:00:00', 'level': 'ERROR', 'module': 'publisher',
+                      'message': 'Publish failed', 'keyword': 'kw_7', 'error': 'git push timed out'})
+        for i in range(30, 60):
+            writer.write({'timestamp': f'2026-01-03T00:00:{i:02d}', 'level': 'INFO', 'module': 'scheduler',
+                          'message': 'Run completed successfully', 'pad': 'y' * 100})
+        writer.close()
+        writer.wait_for_compression()
+        assert any(n.endswith('.jsonl.gz') for n in os.listdir(log_dir))
+        assert index.refresh() == 31
+        assert index.refresh() == 0
+        rows = index.query(keyword='kw_7')
+        assert [r['message'] for r in rows] == ['Publish failed', 'Processing keyword: kw_7']
+        assert [r['module'] for r in index.query(level='warning')] == ['publisher']
+        assert len(index.query(text='timed out')) == 1
+        assert len(index.query(text='"unbalanced')) == 0
+        from datetime import datetime
+        assert len(index.query(since=datetime(2026, 1, 3), limit=1000)) == 30
+        index.close()
+    finally:
+        shutil.rmtree(log_dir)
+
+def test_compactor_archives_and_deletes_expired_rows():
+    import gzip
+    import json
+    from datetime import datetime, timedelta
+    from src.job_queue import JobQueue
+    from src.retention import Compactor, maybe_compact
+    tmp = tempfile.mkdtemp()
+    try:
+        db = Database(os.path.join(tmp, 'test.db'))
+        old = (datetime.now() - timedelta(days=60)).isoformat()
+        db.conn.executemany("INSERT INTO audit_log (timestamp, module, action) VALUES (?, 'm', ?)",
+                            [(old, f'old_{i}') for i in range(1200)])
+        db.log('m', 'recent')
+        queue = JobQueue(db)
+        for i in range(3):
+            queue.enqueue('generate_article', {'i': i})
+        done = queue.dequeue()
+        queue.complete(done['id'], result={'ok': True})
+        db.conn.execute("UPDATE job_queue SET completed_at = ? WHERE id = ?", (old, done['id']))
+        db.conn.execute("UPDATE job_queue SET created_at = ? WHERE status = 'pending'", (old,))
+        db.conn.commit()
+        config = {'retention': {'archive_dir': os.path.join(tmp, 'archive'), 'batch_size': 500}}
+        archived = Compactor(config, db).compact()
+        assert archived == {'audit_log': 1200, 'job_queue': 1, 'model_calls': 0}
+        assert [r[0] for r in db.conn.execute("SELECT action FROM audit_log")] == ['recent']
+        assert queue.get_pending_count() == 2
+        rows = []
+        for name in os.listdir(config['retention']['archive_dir']):
+            with gzip.open(os.path.join(config['retention']['archive_dir'], name), 'rt') as f:
+                rows += [json.loads(line) for line in f]
+        assert len(rows) == 1201
+        assert db.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        assert maybe_compact(config, db) is None  # interval not yet elapsed
+        assert maybe_compact(config, db, now=datetime.now() + timedelta(days=2)) == {'audit_log': 0, 'job_queue': 0, 'model_calls': 0}
+        db.close()
+    finally:
+        shutil.rmtree(tmp)
+
+def test_metric_rollups_and_snapshot():
+    import json
+    from datetime import datetime
+    from src.metrics import MetricsCollector
+    tmp = tempfile.mkdtemp()
+    try:
+        db = Database(os.path.join(tmp, 'test.db'))
+        db.increment_metric(date='2025-12-30', articles_published=2, tokens_used=100)  # pre-rollup history
+        db.conn.execute("DELETE FROM metric_rollups")
+        db.conn.commit()
+        metrics = MetricsCollector(db)  # backfills overall rollups once
+        db.increment_metric(date='2026-01-02', niche='Dogs', model='gemma', articles_published=1, tokens_used=50)
+        db.increment_metric(date='2026-01-03', niche='Cats', model='gemma', errors=1)
+        assert [(r['bucket'], r['articles_published']) for r in db.get_rollups('week')] == [('2026-W01', 3)]
+        assert [(r['bucket'], r['tokens_used']) for r in db.get_rollups('month')] == [('2025-12', 100), ('2026-01', 50)]
+        by_niche = db.get_rollups('month', 'niche', bucket='2026-01')
+        assert [(r['value'], r['articles_published'], r['errors']) for r in by_niche] == [('Cats', 0, 1), ('Dogs', 1, 0)]
+        assert db.get_rollups('month', 'model', bucket='2026-01')[0]['tokens_used'] == 50
+        metrics.record_article_published(tokens_used=10, niche='Dogs', model='gemma')
+        path = os.path.join(tmp, 'dashboard_data.json')
+        metrics.write_dashboard_snapshot(path)
+        with open(path) as f:
+            data = json.load(f)
+        assert data['metrics']['totals']['articles_published'] == 1
+        assert data['by_niche'] == db.get_rollups('month', 'niche', bucket=datetime.now().strftime('%Y-%m'))
+        assert data['monthly'][-1]['bucket'] == datetime.now().strftime('%Y-%m')
+        db.close()
+    finally:
+        shutil.rmtree(tmp)
+
+def test_health_checks_concurrent_timeout_and_cache():
+    import time
+    import health_check
+    tmp = tempfile.mkdtemp()
+    calls = []
+    def slow(ctx):
+        time.sleep(2)
+        return {'name': 'Slow', 'status': 'GREEN', 'details': ''}
+    def posts(ctx):
+        calls.append(1)
+        return {'name': 'Posts', 'status': 'GREEN',
+                'details': str(sum(len(files) for _r, _d, files in os.walk(os.path.join(ctx['repo_path'], '_posts'))))}
+    health_check.register_check('test_slow', slow, timeout=0.2)
+    health_check.register_check('test_posts', posts, cacheable=True)
+    try:
+        os.makedirs(os.path.join(tmp, '_posts', 'dogs'))
+        config = {'repo_path': tmp, 'health': {'cache_path': os.path.join(tmp, 'cache.json')}}
+        start = time.monotonic()
+        results = health_check.run_health_check(config, checks=['test_slow', 'test_posts'])
+        assert time.monotonic() - start < 1.5
+        assert results[0]['status'] == 'RED' and 'Timed out' in results[0]['details']
+        assert health_check.run_health_check(config, checks=['test_posts'])[0]['details'] == '0'
+        assert len(calls) == 1  # served from cache
+        time.sleep(0.01)
+        with open(os.path.join(tmp, '_posts', 'dogs', 'a.md'), 'w') as f:  # a category directory changes
+            f.write('x')
+        assert health_check.run_health_check(config, checks=['test_posts'])[0]['details'] == '1'
+        assert len(calls) == 2
+        # Breaker state persisted by the bot's key pool is visible to the separate health-check process
+        from src.key_pool import ApiKey, KeyPool
+        db_path = os.path.join(tmp, 'test.db')
+        db = Database(db_path)
+        pool = KeyPool([ApiKey('k1')], lambda key: object(), db)
+        assert health_check.check_circuit_breakers(db_path)['status'] == 'GREEN'
+        def broken(client):
+            raise RuntimeError('500 Internal error')
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                pool.call(broken)
+        result = health_check.check_circuit_breakers(db_path)
+        assert result['status'] == 'RED' and f'gemini_key_{pool.keys[0].key_id}=OPEN' in result['details']
+        db.close()
+    finally:
+        health_check.CHECKS.pop('test_slow', None)
+        health_check.CHECKS.pop('test_posts', None)
+        shutil.rmtree(tmp)
+
+def test_publisher_skips_unchanged_and_updates_in_place():
+    import subprocess
+    from src.publisher import Publisher
+    from tests.benchmark_suite import make_publish_repo
+    tmp = tempfile.mkdtemp()
+    try:
+        repo = make_publish_repo(tmp)
+        db = Database(os.path.join(tmp, 'test.db'))
+        pub = Publisher({'repo_path': repo}, db)
+        count = lambda: int(subprocess.run(['git', 'rev-list', '--count', 'HEAD'], cwd=repo,
+                                           capture_output=True, text=True).stdout)
+        post = '---\ntitle: "Dog Beds"\ndate: 2026-01-05\ntags: [beds]\n---\nBody\n'
+        sha = pub.publish_article('dog-beds.md', post, category='dogs')
+        assert count() == 2
+        assert pub.publish_article('dog-beds.md', post, category='dogs') == sha
+        assert count() == 2
+        # A rerun on a later day, after a related post appeared, is still a no-op
+        pub.publish_article('dog-mats.md', '---\ntitle: "Dog Mats"\ndate: 2026-01-06\ntags: [beds]\n---\n'
+                            'Washable beds and mats for crates, tested on muddy paws.\n', category='dogs')
+        assert pub.publish_article('dog-beds.md', post.replace('2026-01-05', '2026-02-09'), category='dogs') == sha
+        assert count() == 3
+        sha2 = pub.publish_article('dog-beds.md', post.replace('Body', 'New body'), category='dogs')
+        assert sha2 != sha and count() == 4
+        log = subprocess.run(['git', 'log', '-1', '--format=%s'], cwd=repo, capture_output=True, text=True).stdout
+        assert log.strip() == 'Update article dog-beds.md'
+        path = os.path.join(repo, '_posts', 'dogs', 'dog-beds.md')
+        with open(path, 'w') as f:
+            f.write('hand edit\n')
+        assert pub.publish_article('dog-beds.md', post.replace('Body', 'New body'), category='dogs') == sha2
+        assert count() == 4  # working tree restored; git already had this content
+        with open(path) as f:
+            text = f.read()
+        assert 'New body' in text and 'date: 2026-01-05' in text  # updates keep the original date
+        assert db.conn.execute("SELECT COUNT(*) FROM audit_log WHERE action = 'manifest_drift'").fetchone()[0] == 1
+        assert db.conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0] == 2
+        db.close()
+    finally:
+        shutil.rmtree(tmp)
+
+def test_near_duplicate_posts_are_blocked_and_clustered():
+    from src.dedup import DuplicateContentError, DuplicateIndex
+    from src.publisher import Publisher
+    from tests.benchmark_suite import make_publish_repo
+    from tests.fakes import fake_article
+    tmp = tempfile.mkdtemp()
+    try:
+        repo = make_publish_repo(tmp)
+        db = Database(os.path.join(tmp, 'test.db'))
+        pub = Publisher({'repo_path': repo}, db)
+        products = '- Bed A: $10\n- Bed B: $20\n'
+        beds = '---\ntitle: "Dog Beds"\n---\nBest dog beds. ' + fake_article(products)
+        pub.publish_article('dog-beds.md', beds, category='dogs')
+        # Same article with only the keyword changed
+        with pytest.raises(DuplicateContentError) as err:
+            pub.publish_article('cat-beds.md', beds.replace('Dog', 'Cat').replace('dog', 'cat'), category='cats')
+        assert err.value.match == 'dogs/dog-beds' and err.value.distance <= 3
+        assert not os.path.exists(os.path.join(repo, '_posts', 'cats', 'cat-beds.md'))
+        # A different article, and a revision of the same post, go through
+        pub.publish_article('dog-toys.md', fake_article('- Ball: $5\n- Rope: $7\n'), category='dogs')
+        pub.publish_article('dog-beds.md', beds + '\nUpdated.\n', category='dogs')
+        # Bulk mode picks up posts copied in outside the bot
+        for name in ('puppy-beds', 'senior-dog-beds'):
+            with open(os.path.join(repo, '_posts', 'dogs', name + '.md'), 'w') as f:
+                f.write(beds.replace('Dog Beds', name))
+        index = DuplicateIndex({'repo_path': repo}, db)
+        assert index.sync() == 2
+        clusters = index.clusters()
+        assert [[p['slug'] for p in c] for c in clusters] == [['dogs/dog-beds', 'dogs/puppy-beds', 'dogs/senior-dog-beds']]
+        # Re-banding for a different threshold keeps the index usable
+        wide = DuplicateIndex({'repo_path': repo, 'dedup': {'max_distance': 7}}, db)
+        assert wide.check('new', beds)[0] == 'dogs/dog-beds'
+        assert db.conn.execute("SELECT MAX(band) FROM fingerprint_bands").fetchone()[0] == 7
+        db.close()
+    finally:
+        shutil.rmtree(tmp)
+
+def test_placeholder_articles_for_different_keywords_are_near_duplicates():
+    from src.content_generator import ContentGenerator
+    from src.dedup import DuplicateIndex
+    tmp = tempfile.mkdtemp()
+    try:
+        db = Database(os.path.join(tmp, 'test.db'))
+        index = DuplicateIndex({'repo_path': tmp}, db)
+        cg = ContentGenerator({'gemini_api_key': 'k', 'niche': {'name': 'Outdoors'}})
+        products = [{'name': 'Acme Tent', 'price': 99.0, 'rating': 4.4}, {'name': 'Bolt Tent', 'price': 149.0, 'rating': 4.2}]
+        stub = lambda keyword: cg._add_front_matter(keyword, cg._generate_stub(keyword, products, error='quota exhausted'))
+        index.add('best_tents', '_posts/best_tents.md', stub('best_tents'))
+        assert index.check('best_hiking_tents_for_kids', stub('best_hiking_tents_for_kids'))[0] == 'best_tents'
+        assert index.check('bed', stub('bed'))[0] == 'best_tents'
+        db.close()
+    finally:
+        shutil.rmtree(tmp)
+
+def test_related_reviews_link_similar_posts():
+    from src.dedup import DuplicateIndex
+    from src.publisher import Publisher
+    from src.related import HEADING, RelatedIndex, term_counts
+    from tests.benchmark_suite import make_publish_repo
+    tmp = tempfile.mkdtemp()
+    try:
+        repo = make_publish_repo(tmp)
+        db = Database(os.path.join(tmp, 'test.db'))
+        config = {'repo_path': repo, 'site': {'url': 'https://example.com'}}
+        pub = Publisher(config, db)
+        post = lambda title, tags, body: f'---\ntitle: "{title}"\ntags: {tags}\n---\n{body}\n'
+        pub.publish_article('orthopedic-dog-beds.md', post('Orthopedic Dog Beds', '[beds]',
+                            'Memory foam orthopedic mattress beds ease joint pain in arthritic older dogs.'), 'dogs')
+        pub.publish_article('chew-toys.md', post('Chew Toys', '[toys]',
+                            'Durable rubber chew toys and squeaky balls keep puppies busy.'), 'dogs')
+        pub.publish_article('catnip-toys.md', post('Catnip Toys', '[cats]',
+                            'Catnip mice and feather wands for indoor cats.'), 'cats')
+        content = post('Beds For Senior Dogs', '[beds]',
+                       'Supportive foam beds for senior dogs with joint pain and arthritis.')
+        pub.publish_article('senior-dog-beds.md', content, 'dogs')
+        with open(os.path.join(repo, '_posts', 'dogs', 'senior-dog-beds.md')) as f:
+            published = f.read()
+        section = published.split(HEADING, 1)[1]
+        links = [line for line in section.splitlines() if line.startswith('- [')]
+        assert links[0] == '- [Orthopedic Dog Beds](https://example.com/dogs/orthopedic-dog-beds/)'
+        assert 'Catnip' not in section
+        # Republishing rewrites the section instead of appending another
+        pub.publish_article('senior-dog-beds.md', published, 'dogs')
+        with open(os.path.join(repo, '_posts', 'dogs', 'senior-dog-beds.md')) as f:
+            republished = f.read()
+        assert republished.count(HEADING) == 1
+        # The stored fingerprint is the one the file on disk hashes to
+        dedup = DuplicateIndex(config, db)
+        stored = db.conn.execute("SELECT simhash FROM post_fingerprints WHERE slug = 'dogs/senior-dog-beds'").fetchone()[0]
+        assert stored % (1 << 64) == dedup.fingerprint(republished) == dedup.fingerprint(content)
+        index = RelatedIndex(config, db)
+        hits = index.neighbours(index.vector(term_counts('catnip feather wands')))
+        assert [slug for slug, _score in hits] == ['cats/catnip-toys']
+        # Removed posts leave the index (and their terms' document frequencies)
+        os.remove(os.path.join(repo, '_posts', 'cats', 'catnip-toys.md'))
+        index.sync()
+        assert db.conn.execute("SELECT COUNT(*) FROM related_docs").fetchone()[0] == 3
+        assert db.conn.execute("SELECT MIN(df) FROM related_terms").fetchone()[0] == 0
+        db.close()
+    finally:
+        shutil.rmtree(tmp)
+
+def test_run_once_marks_near_duplicate_keyword_failed():
+    from unittest.mock import patch
+    import run
+    from src.logger import StructuredLogger
+    from src.metrics import MetricsCollector
+    from tests.benchmark_suite import make_publish_repo
+    from tests.fakes import FakeGeminiClient, fake_article
+    tmp = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        repo = make_publish_repo(tmp)
+        os.chdir(tmp)
+        db = Database(os.path.join(tmp, 'test.db'))
+        config = {'gemini_api_key': 'k', 'repo_path': repo, 'amazon_tracking_id': 't-20',
+                  'niche': {'name': 'Dogs', 'seed_keywords': ['dog_beds', 'dog_crates']},
+                  'models': {'catalog_path': os.path.join(tmp, 'catalog.json')},
+                  'dashboard_snapshot': os.path.join(tmp, 'dashboard.json')}
+        logger, metrics = StructuredLogger(config, db), MetricsCollector(db)
+        # Every keyword gets the same article body
+        same = fake_article('- Bed: $10\n')
+        with patch('google.genai.Client', FakeGeminiClient.factory()), \
+             patch('tests.fakes.fake_article', lambda prompt, words=1800: same), \
+             patch('src.model_router.ModelRouter.refresh_catalog', return_value=True) as refresh:
+            assert run.run_once(config, db, logger, metrics) == 'dog_beds'
+            assert run.run_once(config, db, logger, metrics) is None
+        status = {r['keyword']: (r['status'], r['error']) for r in db.conn.execute("SELECT * FROM keywords")}
+        assert status['dog_beds'][0] == 'completed'
+        assert status['dog_crates'][0] == 'failed' and 'near-duplicate of dogs/dog_beds' in status['dog_crates'][1]
+        # --once goes through the key pool and model router like the scheduler
+        assert db.conn.execute("SELECT COUNT(*) FROM model_calls").fetchone()[0] >= 2
+        assert db.conn.execute("SELECT SUM(requests) FROM api_key_usage").fetchone()[0] >= 2
+        assert refresh.called
+        db.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+
+def test_obsidian_journal_batches_and_rolls_over():
+    from datetime import datetime
+    from unittest.mock import patch
+    from src.obsidian_logger import ObsidianJournal
+    vault = tempfile.mkdtemp()
+    try:
+        clock = [datetime(2026, 3, 1, 23, 59)]
+        fake = type('FakeDatetime', (datetime,), {'now': classmethod(lambda cls: clock[0])})
+        with patch('src.obsidian_logger.datetime', fake):
+            journal = ObsidianJournal(vault, 'IncomeBot', flush_interval=0)
+            journal.write('first')
+            journal.write('second')
+            assert not os.path.exists(os.path.join(vault, 'IncomeBot', '2026-03-01.md'))
+            clock[0] = datetime(2026, 3, 2, 0, 1)
+            journal.write('third')
+            journal.close()
+            journal.write('dropped after close')
+        with open(os.path.join(vault, 'IncomeBot', '2026-03-01.md')) as f:
+            day1 = f.read()
+        with open(os.path.join(vault, 'IncomeBot', '2026-03-02.md')) as f:
+            day2 = f.read()
+        assert day1 == '## 23:59\n\nfirst\n\n---\n\n## 23:59\n\nsecond\n\n---\n\n'
+        assert day2 == '## 00:01\n\nthird\n\n---\n\n'
+    finally:
+        shutil.rmtree(vault)
+
+def test_config_service_hot_reload_and_encryption():
+    import yaml
+    from src.config import ConfigService, ConfigError, parse
+    from src.security import ConfigSecurity
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'config.yaml')
+        with open(path, 'w') as f:
+            f.write('repo_path: /site\nniche:\n  name: Dogs\n  seed_keywords: [a, b]\n')
+        service = ConfigService(path, check_interval=0)
+        first = service.get()
+        assert service.get() is first and service.version == 1
+        assert service.settings.niche_name == 'Dogs' and service.settings.seed_keywords == ['a', 'b']
+        with open(path, 'w') as f:
+            f.write('repo_path: /site\nniche:\n  name: Cats Now\n')
+        assert service.get()['niche']['name'] == 'Cats Now' and service.version == 2
+        with open(path, 'w') as f:
+            f.write('repo_path: [not, a, string]\n')
+        assert service.get()['niche']['name'] == 'Cats Now'  # previous snapshot kept
+        assert isinstance(service.last_error, ConfigError)
+        key = ConfigSecurity.generate_key()
+        token = ConfigSecurity.encrypt_config({'gemini_api_key': 'secret-key'}, key).decode()
+        config = parse(yaml.safe_dump({'encrypt_config': True, 'fernet_key': key, 'encrypted': token}))
+        assert config['gemini_api_key'] == 'secret-key' and 'encrypted' not in config
+    finally:
+        shutil.rmtree(tmp)
+
+def test_secret_scrubber_masks_every_sink():
+    import json
+    from src.database import Database
+    from src.log_writer import JsonlWriter
+    from src.security import REDACTED, install_scrubber
+    tmp = tempfile.mkdtemp()
+    hook = 'https://discord.com/api/webhooks/123/abcdefghijkl'
+    try:
+        scrubber = install_scrubber({'gemini_api_key': 'sk-live-1234567890', 'images': {'api_key': 'img-secret-99'},
+                                     'discord_webhook_url': hook})
+        assert scrubber.scrub('keyword research done') == 'keyword research done'
+        assert 'sk-live' not in scrubber.scrub('call failed for key sk-live-1234567890')
+        assert 'abcdefghijkl' not in scrubber.scrub('posting to https://discord.com/api/webhooks/9/other-token-1')
+        assert 'ghi' not in scrubber.scrub('Authorization: Bearer abcdefghi123')
+        writer = JsonlWriter(tmp, flush_interval=0)
+        writer.write({'message': 'retry', 'extra': {'token': 'img-secret-99', 'url': hook}})
+        writer.close()
+        with open(os.path.join(tmp, os.listdir(tmp)[0])) as f:
+            line = f.read()
+        assert 'img-secret-99' not in line and 'abcdefghijkl' not in line and REDACTED in line
+        db = Database(os.path.join(tmp, 'test.db'))
+        db.log('gemini', 'request failed', 'key=sk-live-1234567890', 'ERROR')
+        details = db.conn.execute("SELECT details FROM audit_log").fetchone()[0]
+        assert 'sk-live' not in details
+        db.close()
+        # Secrets with characters JSON escapes are matched in their escaped form too
+        tricky = 'pa"ss\\w/ord-é-42'
+        install_scrubber({'smtp_password': tricky})
+        for serializer in ('json', 'orjson'):
+            if serializer == 'orjson':
+                pytest.importorskip('orjson')
+            log_dir = os.path.join(tmp, serializer)
+            writer = JsonlWriter(log_dir, flush_interval=0, serializer=serializer)
+            writer.write({'message': f'login failed with {tricky}', 'extra': {'url': 'https://example.com/a/b'}})
+            writer.close()
+            with open(os.path.join(log_dir, os.listdir(log_dir)[0]), encoding='utf-8') as f:
+                entry = json.loads(f.read())
+            assert entry['message'] == f'login failed with {REDACTED}'
+            assert entry['extra']['url'] == 'https://example.com/a/b'
+    finally:
+        install_scrubber({})
+        shutil.rmtree(tmp)
+
+def test_niche_scheduler_weighted_fair_share():
+    from src.config import ConfigError, validate
+    from src.database import Database
+    from src.niches import NicheScheduler, load_niches
+    tmp = tempfile.mkdtemp()
+    try:
+        db = Database(os.path.join(tmp, 'test.db'))
+        db.add_keyword('legacy keyword')  # added before niches existed
+        config = {'niches': [{'name': 'Dog Supplements', 'weight': 2}, {'name': 'Cat Toys', 'category': 'cats'}]}
+        niches = load_niches(config)
+        assert [n.category for n in niches] == ['dog-supplements', 'cats']
+        db.add_keywords([f'dog {i}' for i in range(20)], 'Dog Supplements')
+        db.add_keywords([f'cat {i}' for i in range(20)], 'Cat Toys')
+        fair = NicheScheduler(niches, db)
+        assert db.get_keyword_by_text('legacy keyword')['niche'] == 'Dog Supplements'
+        served = []
+        for _ in range(9):
+            niche = fair.pick()
+            assert db.get_next_keywords(1, niche.name)[0]['niche'] == niche.name
+            fair.charge(niche, 1000)
+            served.append(niche.name)
+        assert served.count('Dog Supplements') == 6 and served.count('Cat Toys') == 3
+        # A niche that joins late starts at the current clock instead of catching up
+        niches = load_niches({'niches': config['niches'] + [{'name': 'Birds'}]})
+        db.add_keywords([f'bird {i}' for i in range(20)], 'Birds')
+        fair = NicheScheduler(niches, db)
+        served = []
+        for _ in range(8):
+            niche = fair.pick()
+            db.get_next_keywords(1, niche.name)
+            fair.charge(niche, 1000)
+            served.append(niche.name)
+        assert served.count('Birds') == 2 and served.count('Dog Supplements') == 4
+        assert fair.pick(exclude=['Dog Supplements', 'Cat Toys']).name == 'Birds'
+        db.close()
+        try:
+            validate({'niches': [{'name': 'A', 'weight': 0}, {'name': 'A'}]})
+            assert False, 'expected ConfigError'
+        except ConfigError as e:
+            assert 'weight' in str(e) and 'duplicate' in str(e)
+    finally:
+        shutil.rmtree(tmp)
+
+def test_scheduler_fetches_products_for_the_claimed_batch_at_once():
+    from contextlib import redirect_stdout
+    from unittest.mock import patch
+    import io
+    import scheduler
+    from src.product_providers import StubProductProvider
+    from tests.benchmark_suite import make_publish_repo
+    from tests.fakes import FakeGeminiClient
+    tmp = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        repo = make_publish_repo(tmp)
+        os.chdir(tmp)
+        db_path = os.path.join(tmp, 'test.db')
+        config = {'gemini_api_key': 'k', 'repo_path': repo, 'amazon_tracking_id': 't-20',
+                  'models': {'catalog_path': os.path.join(tmp, 'catalog.json')},
+                  'niches': [{'name': 'Dogs', 'seed_keywords': ['dog_beds', 'dog_crates', 'dog_bowls']},
+                             {'name': 'Cats', 'seed_keywords': ['cat_trees', 'cat_toys']}]}
+        lookups = []
+        original = StubProductProvider.lookup
+        def lookup(self, keywords):
+            lookups.append(list(keywords))
+            return original(self, keywords)
+        with patch('scheduler.load_config', return_value=config), \
+             patch('scheduler.Database', lambda *a, **kw: Database(db_path)), \
+             patch('google.genai.Client', FakeGeminiClient.factory()), \
+             patch.object(StubProductProvider, 'lookup', lookup), redirect_stdout(io.StringIO()):
+            assert scheduler.main(count=4)
+        assert len(lookups) == 1 and len(lookups[0]) == 4
+        assert sum(kw.startswith('dog') for kw in lookups[0]) == 2
+        db = Database(db_path)
+        assert db.conn.execute("SELECT COUNT(*) FROM keywords WHERE status = 'completed'").fetchone()[0] == 4
+        db.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+
+def test_key_pool_routes_by_capacity_and_benches_failing_keys():
+    from src.database import Database
+    from src.key_pool import KeyPool, NoKeyAvailable
+    from tests.fakes import FakeGeminiClient
+    class QuotaError(Exception):
+        code = 429
+    tmp = tempfile.mkdtemp()
+    try:
+        db = Database(os.path.join(tmp, 'test.db'))
+        config = {'gemini_api_keys': [{'key': 'key-a', 'rpm': 2}, {'key': 'key-b', 'rpm': 3}],
+                  'gemini_api_key': 'key-c', 'gemini_backup_api_key': 'key-a',
+                  'free_tier_limits': {'gemini_max_key_wait': 0}}
+        pool = KeyPool.from_config(config, lambda key: FakeGeminiClient(api_key=key), db)
+        assert [k.rpm for k in pool.keys] == [2, 3, 15]  # duplicate backup key dropped
+        generate = lambda client: client.models.generate_content('m', '- Toy: $1').text
+        used = [pool.call(lambda c: c.api_key, tokens=lambda _r: 100) for _ in range(20)]
+        assert used.count('key-a') == 2 and used.count('key-b') == 3 and used.count('key-c') == 15
+        try:
+            pool.call(generate)
+            assert False, 'expected NoKeyAvailable'
+        except NoKeyAvailable:
+            pass
+        assert tuple(db.conn.execute("SELECT SUM(requests), SUM(tokens_used) FROM api_key_usage").fetchone()) == (20, 2000)
+        # models.list doesn't need a request slot: any_client() reserves none, even with every minute used up
+        assert pool.any_client() is not None and sum(len(k.requests) for k in pool.keys) == 20
+        # A 429 benches the key and the call moves on; an auth error removes the key
+        pool = KeyPool.from_config(config, lambda key: FakeGeminiClient(api_key=key))
+        def flaky(client):
+            if client.api_key == 'key-c':
+                raise QuotaError('RESOURCE_EXHAUSTED')
+            if client.api_key == 'key-a':
+                raise RuntimeError('400 API key not valid. Please pass a valid API key.')
+            return client.api_key
+        assert [pool.call(flaky) for _ in range(3)] == ['key-b'] * 3
+        status = pool.status()
+        assert status[0]['rejected'] and status[2]['cooldown'] > 0 and status[1]['requests_last_minute'] == 3
+        assert pool.any_client().api_key == 'key-b'
+        pool.keys[1].rejected = True
+        assert pool.any_client() is None
+        from src.model_router import ModelRouter
+        assert ModelRouter({}, db).refresh_catalog(pool.any_client()) is False  # no key: keep the cached catalog
+        db.close()
+    finally:
+        shutil.rmtree(tmp)
+
+def test_model_router_falls_back_on_latency_and_errors():
+    from unittest.mock import patch
+    from src.content_generator import ContentGenerator
+    from src.database import Database
+    from src.model_router import ModelCatalog, ModelRouter, model_call_stats
+    from tests.fakes import FakeGeminiClient
+    tmp = tempfile.mkdtemp()
+    try:
+        db = Database(os.path.join(tmp, 'test.db'))
+        config = {'gemini_api_key': 'k', 'models': {
+            'tiers': [{'name': 'big', 'max_p95_ms': 1000}, {'name': 'cheap', 'tier': 1, 'cost_per_1k_tokens': 0.1},
+                      {'name': 'free', 'tier': 1}, {'name': 'retired'}],
+            'min_samples': 3, 'catalog_path': os.path.join(tmp, 'catalog.json')}}
+        router = ModelRouter(config, db)
+        assert router.choose()[0] == 'big'
+        for _ in range(3):
+            router.record('big', 2.5, True, 500)
+        model, reason = router.choose()
+        assert model == 'cheap' and 'benched big (p95 2500ms > 1000ms)' in reason  # tier 1, cost unknown yet
+        for _ in range(3):
+            router.record('cheap', 0.2, True, 1000)
+        assert router.choose()[0] == 'free'  # same tier, lower observed cost
+        # Samples survive a restart through model_calls; the catalog hides models the API no longer offers
+        client = type('Client', (), {'models': type('Models', (), {'list': lambda self: [
+            type('M', (), {'name': f'models/{n}'}) for n in ('big', 'cheap', 'free')]})()})()
+        ModelCatalog(config['models']['catalog_path']).refresh(client)
+        router = ModelRouter(config, db)
+        assert router.choose(exclude=['cheap', 'free'])[0] == 'big'  # 'retired' filtered, 'big' least degraded
+        assert {s['model']: s['calls'] for s in model_call_stats(db)} == {'big': 3, 'cheap': 3}
+        # ContentGenerator records every call and retries a failing model on the router's next choice
+        class FlakyClient(FakeGeminiClient):
+            def _generate(self, model, contents, config):
+                if model == 'free':
+                    raise RuntimeError('500 INTERNAL')
+                return super()._generate(model, contents, config)
+        with patch('google.genai.Client', FlakyClient.factory()):
+            cg = ContentGenerator(config, db, router=router)
+            article = cg.generate_article('dog_beds', [{'name': 'Dog Bed', 'price': 10.0, 'rating': 4.5}])
+        assert '[AMAZON_LINK_DOG_BED]' in article and cg.last_model == 'cheap'
+        rows = db.conn.execute("SELECT model, ok FROM model_calls ORDER BY id DESC LIMIT 2").fetchall()
+        assert [tuple(r) for r in rows] == [('cheap', 1), ('free', 0)]
+        db.close()
+    finally:
+        shutil.rmtree(tmp)
+
+def test_prompt_templates_and_context_cache():
+    from unittest.mock import patch
+    from src.content_generator import ContentGenerator
+    from src.database import Database
+    from src.prompts import PromptTemplate
+    from tests.fakes import FakeGeminiClient
+    tmp = tempfile.mkdtemp()
+    try:
+        db = Database(os.path.join(tmp, 'test.db'))
+        products = [{'name': 'Dog Bed', 'price': 10.0, 'rating': 4.5}]
+        config = {'gemini_api_key': 'k', 'niche': {'name': 'Dogs'},
+                  'models': {'tiers': ['gemini-2.5-flash'], 'catalog_path': os.path.join(tmp, 'catalog.json')},
+                  'prompts': {'min_cache_tokens': 10}}
+        clients = []
+        def factory(*args, **kw):
+            clients.append(FakeGeminiClient(api_key=kw.get('api_key')))
+            return clients[-1]
+        with patch('google.genai.Client', factory):
+            cg = ContentGenerator(config, db)
+            for keyword in ('dog_beds', 'dog_toys'):
+                assert '[AMAZON_LINK_DOG_BED]' in cg.generate_article(keyword, products)
+                assert cg.last_cached_tokens == len(cg.prompts.system) // 4
+            # One cache for the niche's instructions; each request only carries the keyword part
+            assert len(clients[0].cached) == 1
+            calls = clients[0].calls
+            name = clients[0].cached[0]
+            assert all(c['config'] == {'cached_content': name} for c in calls)
+            assert calls[1]['contents'].startswith('Write a 2000-word article comparing these products for dog toys.')
+            assert 'Structure:' not in calls[1]['contents']
+            # A later run reuses the stored cache name instead of creating another
+            assert 'placeholder article' not in ContentGenerator(config, db).generate_article('dog_crates', products)
+            assert len(clients) == 2 and not clients[1].cached
+            assert clients[1].calls[0]['config'] == {'cached_content': name}
+            assert db.get_metric_totals(1)['tokens_cached'] == 3 * (len(cg.prompts.system) // 4)
+            # Gemma takes no system instruction, so the instructions are sent inline
+            gemma = dict(config, models=dict(config['models'], tiers=['gemma-3-4b-it']))
+            cg = ContentGenerator(gemma)
+            cg.generate_article('dog_beds', products)
+            assert clients[-1].calls[0]['config'] is None and cg.last_cached_tokens == 0
+            assert clients[-1].calls[0]['contents'].startswith(cg.prompts.system)
+        inline = dict(config, niche={'name': 'Cats', 'prompt_template': 'Review for {niche}: {topic}\n{products}'})
+        with patch('google.genai.Client', factory):
+            assert ContentGenerator(inline)._build_prompt('cat_toys', products) == \
+                'Review for Cats: cat toys\n- Dog Bed: $10.00, rating 4.5/5'
+        with pytest.raises(ValueError):
+            PromptTemplate('{keyword} {price}')
+        db.close()
+    finally:
+        shutil.rmtree(tmp)
+
+def test_section_mode_generates_sections_concurrently_and_retries_failures():
+    import time
+    from unittest.mock import patch
+    from src.concurrency import AdaptiveLimiter
+    from src.content_generator import ContentGenerator
+    from src.database import Database
+    from tests.fakes import FakeGeminiClient
+    tmp = tempfile.mkdtemp()
+    try:
+        db = Database(os.path.join(tmp, 'test.db'))
+        products = [{'name': f'Bed {c}', 'price': 20.0 + i, 'rating': 4.5} for i, c in enumerate('ABC')]
+        config = {'gemini_api_key': 'k', 'niche': {'name': 'Dogs'},
+                  'models': {'tiers': ['gemini-2.5-flash'], 'catalog_path': os.path.join(tmp, 'catalog.json')},
+                  'prompts': {'context_cache': False}}
+        clients = []
+        def factory(*args, **kw):
+            clients.append(FakeGeminiClient(api_key=kw.get('api_key'), token_latency=0.0005))
+            return clients[-1]
+        with patch('google.genai.Client', factory):
+            start = time.perf_counter()
+            whole = ContentGenerator(config, db).generate_article('dog_beds', products)
+            whole_time = time.perf_counter() - start
+            cg = ContentGenerator(dict(config, generation={'mode': 'sections'}), db,
+                                  limiter=AdaptiveLimiter('gemini', initial=8, max_limit=8))
+            generate, failed = FakeGeminiClient._generate, []
+            def flaky(self, model, contents, config):
+                if 'Write only the "Bed B"' in contents and not failed:
+                    failed.append(contents)
+                    raise RuntimeError('503 unavailable')
+                return generate(self, model, contents, config)
+            with patch.object(FakeGeminiClient, '_generate', flaky):
+                start = time.perf_counter()
+                article = cg.generate_article('dog_beds', products)
+                sections_time = time.perf_counter() - start
+            client = clients[-1]
+        assert 'placeholder article' not in whole and 'placeholder article' not in article
+        body = article.split('---\n', 2)[2]
+        headings = [line for line in body.splitlines() if line.startswith('#')]
+        assert headings == ['# Best Dog Beds Reviewed', '## Why It Matters', '## Comparison Table', '## Bed A',
+                            '## Bed B', '## Bed C', '## How We Tested', '## Frequently Asked Questions',
+                            '## Conclusion']
+        assert '| Bed B | $21.00 | 4.5/5 | [Check price]([AMAZON_LINK_BED_B]) |' in body
+        assert all(f'![Bed {c}](image_url)' in body for c in 'ABC')
+        # The outline's FAQ questions are handed to the FAQ section
+        assert any('How much should I spend?' in c['contents'] for c in client.calls)
+        # Only the failed section was sent again: outline + 8 sections + 1 retry
+        sections = [c['contents'] for c in client.calls if c['contents'].startswith('Write only the "')]
+        assert len(client.calls) == 9 and len(sections) == 8
+        assert sum(1 for c in sections if c.startswith('Write only the "Bed B"')) == 1 and len(failed) == 1
+        assert cg.sections.last_calls == 10
+        assert sections_time * 2 < whole_time
+        db.close()
+    finally:
+        shutil.rmtree(tmp)
+
+def test_adaptive_limiter_backs_off_on_429_and_latency_spikes():
+    import threading
+    import time
+    from src.concurrency import AdaptiveLimiter, classify_outcome, get_limiter
+    from src.metrics import MetricsCollector
+    limiter = AdaptiveLimiter('upstream', initial=2, max_limit=16)
+    capacity, active, peak = 4, [0], [0]
+    lock = threading.Lock()
+    def upstream():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            over = active[0] > capacity
+        try:
+            time.sleep(0.005)
+            if over:
+                raise RuntimeError('429 Too Many Requests')
+        finally:
+            with lock:
+                active[0] -= 1
+    def worker():
+        for _ in range(40):
+            try:
+                limiter.call(upstream)
+            except RuntimeError:
+                pass
+    threads = [threading.Thread(target=worker) for _ in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = limiter.snapshot()
+    # Grew past the initial limit, backed off at the upstream's capacity, and mostly stayed under it
+    assert stats['increases'] >= 2 and stats['decreases'] >= 1 and stats['throttled'] > 0
+    assert stats['throttled'] < 0.3 * stats['ok'] and peak[0] <= 8 and stats['limit'] <= 8
+    assert stats['inflight'] == 0
+    assert any(d['action'] == 'decrease' and d['reason'] == 'throttled' for d in stats['decisions'])
+    # A latency spike against a kind's baseline halves the limit; other kinds keep their own baseline
+    spiky = AdaptiveLimiter('spiky', initial=4, max_limit=4)
+    for _ in range(3):
+        spiky.call(time.sleep, 0.002, kind='short')
+    spiky.call(time.sleep, 0.03, kind='long')
+    assert spiky.current == 4
+    spiky.call(time.sleep, 0.03, kind='short')
+    assert spiky.current == 2 and spiky.decisions[-1]['reason'].startswith('latency')
+    assert classify_outcome(TimeoutError()) == 'timeout'
+    assert classify_outcome(RuntimeError('RESOURCE_EXHAUSTED')) == 'throttled'
+    assert classify_outcome(ValueError('bad')) == 'error'
+    # Shared per-process limiters are exposed in the dashboard data
+    tmp = tempfile.mkdtemp()
+    try:
+        get_limiter('gemini', {})
+        db = Database(os.path.join(tmp, 'test.db'))
+        assert 'limit' in MetricsCollector(db).generate_dashboard_data()['concurrency']['gemini']
+        db.close()
+    finally:
+        shutil.rmtree(tmp)
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
\ No newline at end of file